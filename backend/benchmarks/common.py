@@ -0,0 +1,136 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run against a throwaway test database created from the
+configured DATABASES setting, so they never touch real data:
+
+    python -m benchmarks.spatial --sites 100000
+
+Pass `--database sqlite` to the scripts that accept it to run against a
+temporary SQLite file instead of the configured (MySQL) server.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+import django
+import numpy as np
+import pandas as pd
+
+REGIONS = ['Tamil Nadu', 'Karnataka', 'Kerala', 'Andhra Pradesh', 'Maharashtra', 'Gujarat', 'Rajasthan']
+LAND_TYPES = ['Agricultural', 'Industrial', 'Barren', 'Commercial', 'Residential']
+
+
+def setup_django(database=None):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "solar_analyzer.settings")
+    if database == 'sqlite':
+        from django.conf import settings
+
+        path = os.path.join(tempfile.gettempdir(), 'solar_analyzer_benchmark.sqlite3')
+        settings.DATABASES['default'] = {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': path, 'TEST': {'NAME': path},
+            # Writers from several worker processes queue on the file lock
+            # instead of failing when a read transaction upgrades to a write
+            'OPTIONS': {'timeout': 120, 'transaction_mode': 'IMMEDIATE'},
+        }
+    django.setup()
+
+
+@contextmanager
+def benchmark_database():
+    """Create a fresh test database for the duration of the block"""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def synthetic_sites(count, seed=0):
+    """A DataFrame of `count` plausible sites spread over southern and western India"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'site_name': [f'Synthetic Site {i}' for i in range(count)],
+        'latitude': rng.uniform(8.0, 30.0, count).round(7),
+        'longitude': rng.uniform(68.0, 88.0, count).round(7),
+        'area_sqm': rng.integers(1000, 120000, count),
+        'solar_irradiance_kwh': rng.uniform(2.5, 7.0, count).round(2),
+        'grid_distance_km': rng.uniform(0.1, 30.0, count).round(2),
+        'slope_degrees': rng.uniform(0.0, 25.0, count).round(2),
+        'road_distance_km': rng.uniform(0.0, 8.0, count).round(2),
+        'elevation_m': rng.integers(0, 1500, count),
+        'land_type': rng.choice(LAND_TYPES, count),
+        'region': rng.choice(REGIONS, count),
+    })
+
+
+def write_synthetic_csv(path, count, seed=0):
+    """Write `count` synthetic sites to a CSV in the sample data layout"""
+    frame = synthetic_sites(count, seed)
+    frame.index += 1
+    frame.to_csv(path, index_label='site_id')
+    return path
+
+
+def load_synthetic_sites(count, seed=0, chunk_size=10000):
+    """Insert `count` synthetic sites with analysis results through the bulk import path"""
+    from sites.ingest import clean_chunk, write_sites
+    from sites.runs import start_run
+    from sites.utils import SuitabilityCalculator, DEFAULT_WEIGHTS
+
+    calculator = SuitabilityCalculator()
+    run = start_run(DEFAULT_WEIGHTS, 'import')
+    frame = synthetic_sites(count, seed)
+    for start in range(0, count, chunk_size):
+        clean, _ = clean_chunk(frame.iloc[start:start + chunk_size])
+        total, scores = calculator.calculate_batch(clean, DEFAULT_WEIGHTS)
+        write_sites(clean, total, scores, run)
+    return frame
+
+
+def timed(func, repeat=5, warmup=1):
+    """Run `func` and return timing statistics in milliseconds"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - started) * 1000)
+    timing = {
+        'min_ms': round(min(samples), 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'max_ms': round(max(samples), 3),
+        'repeat': repeat,
+    }
+    if isinstance(result, int):
+        timing['rows'] = result
+    return timing
+
+
+def argument_parser(description, default_sites=100000):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--sites', type=int, default=default_sites)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the JSON report to this file as well")
+    return parser
+
+
+def emit(report, output=None):
+    text = json.dumps(report, indent=2, default=str)
+    print(text)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
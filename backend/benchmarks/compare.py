@@ -0,0 +1,83 @@
+"""
+Compare two benchmark JSON reports, case by case on the median time,
+and exit non-zero if any case got slower than the thresholds allow:
+
+    python -m benchmarks.compare before.json after.json --threshold 0.15
+
+Works with the report of any benchmark script; cases present in only
+one of the reports are listed but never count as regressions.
+"""
+import argparse
+import json
+import sys
+
+
+def timings(report, prefix=''):
+    """Flatten a report into {'path/to/case': median_ms}"""
+    cases = {}
+    for key, value in report.items():
+        if not isinstance(value, dict):
+            continue
+        path = f'{prefix}{key}'
+        if 'median_ms' in value:
+            cases[path] = value['median_ms']
+        else:
+            cases.update(timings(value, f'{path}/'))
+    return cases
+
+
+def compare(base, other, threshold, min_delta_ms=0.0):
+    """Rows of (case, base ms, other ms, ratio, status) and the regression count"""
+    base_cases, other_cases = timings(base), timings(other)
+    rows = []
+    regressions = 0
+    for case in sorted(base_cases.keys() | other_cases.keys()):
+        before, after = base_cases.get(case), other_cases.get(case)
+        if before is None or after is None:
+            rows.append((case, before, after, None, 'only in base' if after is None else 'new'))
+            continue
+        ratio = after / before if before else None
+        if ratio is None:
+            status = ''
+        elif ratio > 1 + threshold and after - before > min_delta_ms:
+            status = 'SLOWER'
+            regressions += 1
+        elif ratio < 1 - threshold:
+            status = 'faster'
+        else:
+            status = ''
+        rows.append((case, before, after, ratio, status))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base', help="Report of the baseline commit")
+    parser.add_argument('other', help="Report to compare against it")
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="Relative slowdown of the median that counts as a regression")
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help="Ignore slowdowns smaller than this many milliseconds")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.other) as f:
+        other = json.load(f)
+
+    rows, regressions = compare(base, other, args.threshold, args.min_delta_ms)
+    print(f"{base.get('commit') or args.base} -> {other.get('commit') or args.other}")
+    width = max([len(row[0]) for row in rows] + [4])
+    print(f"{'case':<{width}}  {'base ms':>10}  {'other ms':>10}  {'ratio':>6}")
+    for case, before, after, ratio, status in rows:
+        print(
+            f"{case:<{width}}  {'-' if before is None else f'{before:.3f}':>10}  "
+            f"{'-' if after is None else f'{after:.3f}':>10}  "
+            f"{'-' if ratio is None else f'{ratio:.2f}':>6}  {status}".rstrip()
+        )
+    print(f"{regressions} regression(s) over {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Concurrent-request load test of the WSGI and ASGI deployments.
+
+Start both servers against the same populated database, e.g.
+
+    gunicorn solar_analyzer.wsgi:application --bind :8000 --workers 4
+    uvicorn solar_analyzer.asgi:application --port 8001 --workers 4
+
+then fire the same request mix at each:
+
+    python -m benchmarks.loadtest --wsgi http://localhost:8000 --asgi http://localhost:8001
+
+The WSGI server is hit on the DRF endpoints under /api/ and the ASGI
+server on their async versions under /api/async/. Either URL may be
+left out to measure one deployment alone.
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+from urllib.error import HTTPError, URLError
+from urllib.request import urlopen
+
+import numpy as np
+
+from .common import emit
+
+# Endpoint name -> path below /api/ or /api/async/
+ENDPOINTS = {
+    'sites': 'sites/?limit=50',
+    'site_detail': 'sites/{site_id}/',
+    'results': 'analysis-results/?limit=50',
+    'results_score_range': 'analysis-results/?min_score=40&max_score=80&limit=50',
+    'top_sites': 'analysis-results/top_sites/?limit=50',
+    'statistics': 'analysis-results/statistics/',
+    'statistics_score_range': 'analysis-results/statistics/?min_score=40&max_score=80',
+}
+
+
+def site_ids(base_url, count=200):
+    with urlopen(f'{base_url}/api/sites/?limit={count}', timeout=30) as response:
+        return [site['site_id'] for site in json.load(response)['results']]
+
+
+def request_urls(base_url, prefix, names, ids, total):
+    """`total` URLs cycling through the named endpoints and known site ids"""
+    ids = cycle(ids or [1])
+    paths = cycle(ENDPOINTS[name] for name in names)
+    return [f'{base_url}/api/{prefix}{next(paths).format(site_id=next(ids))}' for _ in range(total)]
+
+
+def fetch(url, timeout):
+    started = time.perf_counter()
+    try:
+        with urlopen(url, timeout=timeout) as response:
+            response.read()
+            ok = response.status == 200
+    except (HTTPError, URLError, OSError):
+        ok = False
+    return (time.perf_counter() - started) * 1000, ok
+
+
+def load(urls, concurrency, timeout):
+    """Issue every URL with `concurrency` requests in flight at once"""
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        outcomes = list(pool.map(lambda url: fetch(url, timeout), urls))
+        elapsed = time.perf_counter() - started
+    latencies = np.array([ms for ms, ok in outcomes if ok])
+    report = {
+        'requests': len(urls),
+        'errors': sum(1 for _, ok in outcomes if not ok),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+    }
+    if len(latencies):
+        report.update({
+            'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+            'p90_ms': round(float(np.percentile(latencies, 90)), 2),
+            'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+            'max_ms': round(float(latencies.max()), 2),
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--wsgi', help="Base URL of the WSGI (gunicorn) deployment")
+    parser.add_argument('--asgi', help="Base URL of the ASGI deployment")
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000, help="Requests per endpoint and deployment")
+    parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--output', help="Write the JSON report to this file as well")
+    args = parser.parse_args()
+    if not args.wsgi and not args.asgi:
+        parser.error('give --wsgi, --asgi or both')
+
+    targets = {name: (url.rstrip('/'), prefix) for name, url, prefix in (
+        ('wsgi', args.wsgi, ''), ('asgi', args.asgi, 'async/')) if url}
+    ids = site_ids(next(iter(targets.values()))[0])
+
+    report = {
+        'benchmark': 'loadtest',
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+        'results': {},
+    }
+    for endpoint in [*args.endpoints, 'mixed']:
+        names = args.endpoints if endpoint == 'mixed' else [endpoint]
+        results = {}
+        for target, (base_url, prefix) in targets.items():
+            urls = request_urls(base_url, prefix, names, ids, args.requests)
+            fetch(urls[0], args.timeout)
+            results[target] = load(urls, args.concurrency, args.timeout)
+        if len(results) == 2 and results['wsgi']['throughput_rps']:
+            results['asgi_throughput_ratio'] = round(
+                results['asgi']['throughput_rps'] / results['wsgi']['throughput_rps'], 2
+            )
+            if 'p99_ms' in results['wsgi'] and 'p99_ms' in results['asgi']:
+                results['asgi_p99_ratio'] = round(results['asgi']['p99_ms'] / results['wsgi']['p99_ms'], 2)
+        report['results'][endpoint] = results
+
+    emit(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
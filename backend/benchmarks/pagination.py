@@ -0,0 +1,75 @@
+"""
+List endpoint latency at page 1 vs a deep page: limit/offset with full
+serializers (the previous setup) against keyset pagination, with and
+without the lean .values() payload path.
+
+    python -m benchmarks.pagination --sites 100000 --page 5000
+"""
+from .common import argument_parser, benchmark_database, emit, load_synthetic_sites, setup_django, timed
+
+PAGE_SIZE = 20
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--page', type=int, default=5000)
+    args = parser.parse_args()
+    setup_django()
+
+    from rest_framework.pagination import LimitOffsetPagination
+    from rest_framework.test import APIRequestFactory
+
+    from sites.models import AnalysisResult, Site
+    from sites.pagination import ResultKeysetPagination, SiteKeysetPagination, encode_cursor
+    from sites.views import AnalysisResultViewSet, SiteViewSet
+
+    factory = APIRequestFactory()
+    setups = {
+        'results': (AnalysisResultViewSet, ResultKeysetPagination, AnalysisResult.objects.all()),
+        'sites': (SiteViewSet, SiteKeysetPagination, Site.objects.all()),
+    }
+
+    def run(view, params):
+        def request():
+            response = view(factory.get('/', params))
+            assert response.status_code == 200, response.data
+            return len(response.data['results'])
+        return request
+
+    report = {'benchmark': 'pagination', 'sites': args.sites, 'page_size': PAGE_SIZE, 'results': {}}
+    with benchmark_database() as connection:
+        load_synthetic_sites(args.sites, args.seed)
+        report['database'] = connection.vendor
+        deep_page = max(1, min(args.page, args.sites // PAGE_SIZE))
+        report['deep_page'] = deep_page
+
+        for name, (viewset, keyset, queryset) in setups.items():
+            offset = (deep_page - 1) * PAGE_SIZE
+            fields = [field.lstrip('-') for field in keyset.ordering]
+            before = queryset.order_by(*keyset.ordering).values_list(*fields)[offset - 1] if offset else None
+            deep_cursor = {'cursor': encode_cursor(list(before))} if before else {}
+
+            offset_view = viewset.as_view({'get': 'list'}, pagination_class=LimitOffsetPagination, lean_list=False)
+            keyset_view = viewset.as_view({'get': 'list'}, lean_list=False)
+            lean_view = viewset.as_view({'get': 'list'})
+
+            report['results'][name] = {
+                'limit_offset_serializer': {
+                    'page_1': timed(run(offset_view, {'limit': PAGE_SIZE}), args.repeat),
+                    f'page_{deep_page}': timed(run(offset_view, {'limit': PAGE_SIZE, 'offset': offset}), args.repeat),
+                },
+                'keyset_serializer': {
+                    'page_1': timed(run(keyset_view, {'limit': PAGE_SIZE}), args.repeat),
+                    f'page_{deep_page}': timed(run(keyset_view, {'limit': PAGE_SIZE, **deep_cursor}), args.repeat),
+                },
+                'keyset_values': {
+                    'page_1': timed(run(lean_view, {'limit': PAGE_SIZE}), args.repeat),
+                    f'page_{deep_page}': timed(run(lean_view, {'limit': PAGE_SIZE, **deep_cursor}), args.repeat),
+                },
+            }
+
+    emit(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
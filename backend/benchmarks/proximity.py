@@ -0,0 +1,78 @@
+"""
+Spatial index queries per installed backend, and one full
+update_proximity pass over synthetic substations and roads.
+
+    python -m benchmarks.proximity --sites 100000 --substations 3000 --roads 2000
+"""
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from .common import argument_parser, benchmark_database, emit, load_synthetic_sites, setup_django, timed
+
+
+def write_datasets(directory, substations, roads, seed):
+    """Synthetic substation points and 10-vertex road lines over the synthetic site area"""
+    rng = np.random.default_rng(seed + 1)
+    points = os.path.join(directory, 'substations.csv')
+    pd.DataFrame({
+        'latitude': rng.uniform(8.0, 30.0, substations),
+        'longitude': rng.uniform(68.0, 88.0, substations),
+    }).to_csv(points, index=False)
+
+    # Random walks of ~2 km steps
+    starts = np.column_stack([rng.uniform(8.0, 30.0, roads), rng.uniform(68.0, 88.0, roads)])
+    walks = starts[:, None, :] + np.cumsum(rng.normal(0, 0.02, (roads, 10, 2)), axis=1)
+    lines = os.path.join(directory, 'roads.csv')
+    pd.DataFrame({
+        'road_id': np.repeat(np.arange(roads), 10),
+        'latitude': walks[:, :, 0].ravel(),
+        'longitude': walks[:, :, 1].ravel(),
+    }).to_csv(lines, index=False)
+    return points, lines
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--substations', type=int, default=3000)
+    parser.add_argument('--roads', type=int, default=2000)
+    parser.add_argument('--database', choices=['configured', 'sqlite'], default='configured',
+                        help="Use the configured DATABASES or a temporary SQLite file")
+    args = parser.parse_args()
+    setup_django(args.database)
+
+    from sites.proximity import INDEX_BACKENDS, FeatureIndex, PointIndex, load_features, update_proximity
+
+    report = {'benchmark': 'proximity', 'sites': args.sites, 'indexes': {}}
+    with benchmark_database() as connection, tempfile.TemporaryDirectory() as directory:
+        frame = load_synthetic_sites(args.sites, args.seed)
+        report['database'] = connection.vendor
+        latitudes, longitudes = frame['latitude'].to_numpy(), frame['longitude'].to_numpy()
+        substations, roads = write_datasets(directory, args.substations, args.roads, args.seed)
+        segments = load_features(roads)
+        report['road_segments'] = len(segments[0])
+
+        for backend in INDEX_BACKENDS:
+            try:
+                sites = PointIndex(latitudes, longitudes, backend)
+            except ImportError:
+                continue
+            network = FeatureIndex(*segments, backend)
+            report['indexes'][backend] = {
+                'build_sites': timed(lambda: PointIndex(latitudes, longitudes, backend).size, args.repeat),
+                'build_roads': timed(lambda: len(FeatureIndex(*segments, backend).a), args.repeat),
+                'nearest_road': timed(lambda: len(network.nearest(latitudes, longitudes)), args.repeat),
+                'nearest_site': timed(lambda: len(sites.nearest_other()[0]), args.repeat),
+                'pairs_5km': timed(lambda: len(sites.pairs_within(5.0)[0]), args.repeat),
+            }
+
+        # Writes and rescores every site once, so it runs once
+        report['update_proximity'] = update_proximity(substations, roads)
+
+    emit(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Scaling of the sharded rescore over worker processes.
+
+    python -m benchmarks.rescore --sites 100000 --workers 1 2 4
+
+Every worker count rescores the same synthetic dataset, so the speedup
+is against the single-process sharded run. SQLite serializes writers;
+measure on the configured MySQL server for real scaling figures.
+"""
+from .common import argument_parser, benchmark_database, emit, load_synthetic_sites, setup_django, timed
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    parser.add_argument('--database', choices=['configured', 'sqlite'], default='configured',
+                        help="Use the configured DATABASES or a temporary SQLite file")
+    args = parser.parse_args()
+    setup_django(args.database)
+
+    from sites.services import rescore_sites, rescore_sites_sharded
+
+    report = {'benchmark': 'rescore', 'sites': args.sites, 'results': {}}
+    with benchmark_database() as connection:
+        load_synthetic_sites(args.sites, args.seed)
+        report['database'] = connection.vendor
+        report['results']['rescore_sites'] = timed(
+            lambda: rescore_sites(chunk_size=args.chunk_size)['processed'], args.repeat, warmup=0,
+        )
+        for workers in args.workers:
+            report['results'][f'workers_{workers}'] = timed(
+                lambda: rescore_sites_sharded(chunk_size=args.chunk_size, workers=workers)['processed'],
+                args.repeat, warmup=0,
+            )
+
+    baseline = report['results'].get('workers_1')
+    if baseline:
+        for workers in args.workers:
+            timing = report['results'][f'workers_{workers}']
+            timing['speedup'] = round(baseline['median_ms'] / max(timing['median_ms'], 1e-3), 2)
+
+    emit(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Pareto front and budgeted portfolio requests over every site, read from
+the database and from the in-memory snapshot.
+
+    python -m benchmarks.selection --sites 100000
+"""
+from .common import argument_parser, benchmark_database, emit, load_synthetic_sites, setup_django, timed
+
+REQUESTS = {
+    'pareto_2': ('pareto', {'objectives': ['solar', 'grid']}),
+    'pareto_3': ('pareto', {'objectives': ['solar', 'grid', 'slope']}),
+    'pareto_5': ('pareto', {'objectives': ['solar', 'area', 'grid', 'slope', 'infrastructure']}),
+    'pareto_region': ('pareto', {'objectives': ['solar', 'grid'], 'region': 'Kerala'}),
+    'portfolio': ('portfolio', {'area_budget': 5000000}),
+    'portfolio_large': ('portfolio', {'area_budget': 500000000}),
+}
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--database', choices=['configured', 'sqlite'], default='configured',
+                        help="Use the configured DATABASES or a temporary SQLite file")
+    args = parser.parse_args()
+    setup_django(args.database)
+
+    from django.test.utils import override_settings
+    from rest_framework.test import APIRequestFactory
+
+    from sites.snapshot import get_snapshot
+    from sites.views import SuitabilityAnalysisViewSet
+
+    factory = APIRequestFactory()
+
+    def run(action, data):
+        view = SuitabilityAnalysisViewSet.as_view({'post': action})
+
+        def request():
+            response = view(factory.post('/', data, format='json'))
+            assert response.status_code == 200, response.data
+            return response.data.get('front_size', response.data.get('selected'))
+        return request
+
+    report = {'benchmark': 'selection', 'sites': args.sites, 'results': {}}
+    with benchmark_database() as connection:
+        load_synthetic_sites(args.sites, args.seed)
+        report['database'] = connection.vendor
+        for name, (action, data) in REQUESTS.items():
+            orm = timed(run(action, data), args.repeat)
+            with override_settings(SITE_SNAPSHOT_ENABLED=True):
+                get_snapshot()
+                snapshot = timed(run(action, data), args.repeat)
+            report['results'][name] = {'orm': orm, 'snapshot': snapshot}
+
+    emit(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
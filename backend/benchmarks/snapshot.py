@@ -0,0 +1,59 @@
+"""
+Read endpoints served by the ORM against the in-memory site snapshot.
+
+    python -m benchmarks.snapshot --sites 100000
+"""
+from .common import argument_parser, benchmark_database, emit, load_synthetic_sites, setup_django, timed
+
+REQUESTS = {
+    'top_sites': ('top_sites', {'limit': 50}),
+    'top_sites_score_range': ('top_sites', {'limit': 50, 'min_score': 40, 'max_score': 80}),
+    'statistics': ('statistics', {}),
+    'statistics_score_range': ('statistics', {'region': 'Kerala', 'min_score': 40, 'max_score': 80}),
+    'list_score_range': ('list', {'site__region': 'Kerala', 'min_score': 40, 'max_score': 80, 'limit': 50}),
+}
+
+
+def main():
+    args = argument_parser(__doc__).parse_args()
+    setup_django()
+
+    from django.test.utils import override_settings
+    from rest_framework.test import APIRequestFactory
+
+    from sites.snapshot import SiteSnapshot, get_snapshot
+    from sites.views import AnalysisResultViewSet
+
+    factory = APIRequestFactory()
+
+    def run(action, params):
+        view = AnalysisResultViewSet.as_view({'get': action})
+
+        def request():
+            response = view(factory.get('/', params))
+            assert response.status_code == 200, response.data
+            return response.data
+        return request
+
+    report = {'benchmark': 'snapshot', 'sites': args.sites, 'results': {}}
+    with benchmark_database() as connection:
+        load_synthetic_sites(args.sites, args.seed)
+        report['database'] = connection.vendor
+        report['results']['snapshot_build'] = timed(lambda: SiteSnapshot.load().size, args.repeat, warmup=0)
+
+        for name, (action, params) in REQUESTS.items():
+            orm = timed(run(action, params), args.repeat)
+            with override_settings(SITE_SNAPSHOT_ENABLED=True):
+                get_snapshot()
+                snapshot = timed(run(action, params), args.repeat)
+            report['results'][name] = {
+                'orm': orm,
+                'snapshot': snapshot,
+                'speedup': round(orm['median_ms'] / max(snapshot['median_ms'], 1e-3), 1),
+            }
+
+    emit(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Viewport and radius queries: geohash index vs the current full scans.
+
+    python -m benchmarks.spatial --sites 100000
+"""
+from .common import argument_parser, benchmark_database, emit, load_synthetic_sites, setup_django, timed
+
+VIEWPORTS = {
+    'city': (76.8, 10.9, 77.1, 11.2),
+    'district': (76.0, 10.0, 78.0, 12.0),
+    'state': (74.0, 8.0, 80.0, 16.0),
+}
+RADII = {'25km': 25, '100km': 100}
+CENTER = (11.0, 77.0)
+
+
+def main():
+    args = argument_parser(__doc__).parse_args()
+    setup_django()
+
+    from sites.filters import bbox_q, distance_km
+    from sites.geo import radius_bbox
+    from sites.models import Site
+
+    def client_scan(west, south, east, north):
+        # What the map does today: fetch every site and filter locally
+        rows = Site.objects.values_list('site_id', 'latitude', 'longitude')
+        return sum(1 for _, lat, lon in rows if south <= lat <= north and west <= lon <= east)
+
+    def latlon_range(west, south, east, north):
+        return len(list(Site.objects.filter(
+            latitude__range=(south, north), longitude__range=(west, east)
+        ).values_list('site_id', flat=True)))
+
+    def geohash(west, south, east, north):
+        return len(list(Site.objects.filter(
+            bbox_q(south, west, north, east)
+        ).values_list('site_id', flat=True)))
+
+    def radius(radius_km):
+        return len(list(
+            Site.objects.filter(bbox_q(*radius_bbox(*CENTER, radius_km)))
+            .alias(distance_km=distance_km(*CENTER))
+            .filter(distance_km__lte=radius_km)
+            .values_list('site_id', flat=True)
+        ))
+
+    report = {'benchmark': 'spatial', 'sites': args.sites, 'results': {}}
+    with benchmark_database() as connection:
+        load_synthetic_sites(args.sites, args.seed)
+        report['database'] = connection.vendor
+
+        for name, box in VIEWPORTS.items():
+            report['results'][f'bbox_{name}'] = {
+                'client_scan': timed(lambda: client_scan(*box), args.repeat),
+                'latlon_range': timed(lambda: latlon_range(*box), args.repeat),
+                'geohash': timed(lambda: geohash(*box), args.repeat),
+            }
+        for name, km in RADII.items():
+            report['results'][f'near_{name}'] = {
+                'geohash_haversine': timed(lambda: radius(km), args.repeat),
+            }
+
+    emit(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Reproducible benchmark suite over the scoring, ingestion and API hot
+paths, run at one or more dataset sizes:
+
+    python -m benchmarks.suite --sizes 1000 100000 --output before.json
+    python -m benchmarks.suite --sizes 1000 100000 --output after.json
+    python -m benchmarks.compare before.json after.json
+
+Every size gets a fresh database loaded from a synthetic CSV through
+load_sample_data.load_from_csv, so the ingestion timing is a single run.
+The response cache is off while the API is timed.
+"""
+import io
+import os
+import platform
+import subprocess
+import tempfile
+from contextlib import redirect_stdout
+
+from .common import argument_parser, benchmark_database, emit, setup_django, synthetic_sites, timed, write_synthetic_csv
+
+PAGE_SIZE = 20
+# Scalar SuitabilityCalculator.calculate calls per sample
+SCALAR_CALLS = 1000
+# Sites rescored one by one through Site.calculate_suitability_scores
+PER_SITE_SAMPLE = 100
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000],
+                        help="Dataset sizes to run at, e.g. 1000 100000 1000000")
+    parser.add_argument('--database', choices=['configured', 'sqlite'], default='configured',
+                        help="Use the configured DATABASES or a temporary SQLite file")
+    args = parser.parse_args()
+    setup_django(args.database)
+
+    import django
+    import numpy as np
+    import pandas as pd
+    from django.test.utils import override_settings
+    from rest_framework.test import APIRequestFactory
+
+    import load_sample_data
+    from sites.models import AnalysisResult, Site
+    from sites.pagination import ResultKeysetPagination, SiteKeysetPagination, encode_cursor
+    from sites.utils import DEFAULT_WEIGHTS, FACTOR_FIELDS, SuitabilityCalculator
+    from sites.views import AnalysisResultViewSet, SiteViewSet
+
+    factory = APIRequestFactory()
+    calculator = SuitabilityCalculator()
+
+    def request(view, params=None):
+        def run():
+            response = view(factory.get('/', params or {}))
+            assert response.status_code == 200, response.data
+            data = response.data
+            return len(data['results']) if isinstance(data, dict) and 'results' in data else len(data)
+        return run
+
+    def deep_cursor(queryset, keyset, size):
+        offset = (max(1, size // PAGE_SIZE // 2) - 1) * PAGE_SIZE
+        if not offset:
+            return {}
+        fields = [field.lstrip('-') for field in keyset.ordering]
+        return {'cursor': encode_cursor(list(queryset.order_by(*keyset.ordering).values_list(*fields)[offset - 1]))}
+
+    def scoring(size):
+        frame = synthetic_sites(size, args.seed)
+        site = frame.iloc[0][list(FACTOR_FIELDS.values())].to_dict()
+
+        def scalar():
+            for _ in range(SCALAR_CALLS):
+                calculator.calculate(site, DEFAULT_WEIGHTS)
+            return SCALAR_CALLS
+
+        def batch():
+            calculator.calculate_batch(frame, DEFAULT_WEIGHTS)
+            return size
+
+        return {
+            f'calculate_x{SCALAR_CALLS}': timed(scalar, args.repeat),
+            'calculate_batch': timed(batch, args.repeat),
+        }
+
+    def ingestion(size, directory):
+        path = write_synthetic_csv(os.path.join(directory, f'sites_{size}.csv'), size, args.seed)
+        load_sample_data.CSV_PATH = path
+
+        def load():
+            with redirect_stdout(io.StringIO()):
+                load_sample_data.load_from_csv()
+            return Site.objects.count()
+
+        return {'load_from_csv': timed(load, repeat=1, warmup=0)}
+
+    def per_site(size):
+        sample = list(Site.objects.order_by('site_id')[:min(size, PER_SITE_SAMPLE)])
+
+        def rescore():
+            for site in sample:
+                site.calculate_suitability_scores(DEFAULT_WEIGHTS)
+            return len(sample)
+
+        return {f'calculate_suitability_scores_x{len(sample)}': timed(rescore, args.repeat)}
+
+    def api(size):
+        region = Site.objects.values_list('region', flat=True).first()
+        top_sites = AnalysisResultViewSet.as_view({'get': 'top_sites'})
+        statistics = AnalysisResultViewSet.as_view({'get': 'statistics'})
+        results = AnalysisResultViewSet.as_view({'get': 'list'})
+        sites = SiteViewSet.as_view({'get': 'list'})
+        results_cursor = deep_cursor(AnalysisResult.objects.all(), ResultKeysetPagination, size)
+        sites_cursor = deep_cursor(Site.objects.all(), SiteKeysetPagination, size)
+
+        return {
+            'top_sites': timed(request(top_sites), args.repeat),
+            'top_sites_region': timed(request(top_sites, {'region': region, 'limit': 50}), args.repeat),
+            'statistics': timed(request(statistics), args.repeat),
+            'statistics_region': timed(request(statistics, {'region': region}), args.repeat),
+            'results_page_1': timed(request(results, {'limit': PAGE_SIZE}), args.repeat),
+            'results_page_deep': timed(request(results, {'limit': PAGE_SIZE, **results_cursor}), args.repeat),
+            'sites_page_1': timed(request(sites, {'limit': PAGE_SIZE}), args.repeat),
+            'sites_page_deep': timed(request(sites, {'limit': PAGE_SIZE, **sites_cursor}), args.repeat),
+        }
+
+    report = {
+        'benchmark': 'suite',
+        'commit': git_commit(),
+        'database': None,
+        'versions': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+        },
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'sizes': {},
+    }
+    with tempfile.TemporaryDirectory() as directory, override_settings(RESPONSE_CACHE_ENABLED=False):
+        for size in args.sizes:
+            with benchmark_database() as connection:
+                report['database'] = connection.vendor
+                report['sizes'][str(size)] = {
+                    'scoring': scoring(size),
+                    'ingestion': ingestion(size, directory),
+                    'per_site': per_site(size),
+                    'api': api(size),
+                }
+
+    emit(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
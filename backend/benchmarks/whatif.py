@@ -0,0 +1,78 @@
+"""
+What-if re-ranking: one /analyze/what-if/ request over every site against
+the per-site /analyze/calculate/ calls the custom-analysis screen makes.
+
+    python -m benchmarks.whatif --sites 100000
+"""
+from .common import argument_parser, benchmark_database, emit, load_synthetic_sites, setup_django, timed
+
+# Per-site calls are slow enough that only a sample is timed
+CALCULATE_SAMPLE = 200
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--weight-sets', type=int, default=10)
+    args = parser.parse_args()
+    setup_django()
+
+    import numpy as np
+    from rest_framework.test import APIRequestFactory
+
+    from sites.models import Site
+    from sites.views import SuitabilityAnalysisViewSet
+    from sites.whatif import factor_matrix, rank_weight_sets
+
+    factory = APIRequestFactory()
+    what_if = SuitabilityAnalysisViewSet.as_view({'post': 'what_if'})
+    calculate = SuitabilityAnalysisViewSet.as_view({'post': 'calculate'})
+
+    rng = np.random.default_rng(args.seed)
+    fields = ['solar_weight', 'area_weight', 'grid_weight', 'slope_weight', 'infra_weight']
+    weight_sets = [dict(zip(fields, w.round(3).tolist())) for w in rng.dirichlet(np.ones(5), args.weight_sets)]
+
+    def request(sets):
+        def run():
+            response = what_if(factory.post('/', {'weight_sets': sets, 'limit': 100}, format='json'))
+            assert response.status_code == 200, response.data
+            return response.data['total_sites']
+        return run
+
+    report = {'benchmark': 'whatif', 'sites': args.sites, 'weight_sets': args.weight_sets, 'results': {}}
+    with benchmark_database() as connection:
+        load_synthetic_sites(args.sites, args.seed)
+        report['database'] = connection.vendor
+
+        site_ids, matrix = factor_matrix()
+        sample = list(
+            Site.objects.order_by('site_id')
+            .values('solar_irradiance_kwh', 'area_sqm', 'grid_distance_km', 'slope_degrees', 'road_distance_km')
+            [:CALCULATE_SAMPLE]
+        )
+
+        def per_site():
+            for site in sample:
+                response = calculate(factory.post('/', {**site, **weight_sets[0]}, format='json'))
+                assert response.status_code == 200, response.data
+            return len(sample)
+
+        calls = timed(per_site, max(1, args.repeat // 2))
+        report['results'] = {
+            'calculate_per_site': {
+                **calls,
+                'ms_per_site': round(calls['median_ms'] / len(sample), 4),
+                'estimated_all_sites_ms': round(calls['median_ms'] / len(sample) * args.sites, 1),
+            },
+            'what_if_1_weight_set': timed(request(weight_sets[:1]), args.repeat),
+            f'what_if_{args.weight_sets}_weight_sets': timed(request(weight_sets), args.repeat),
+            'load_factor_matrix': timed(lambda: len(factor_matrix()[0]), args.repeat),
+            f'rank_only_{args.weight_sets}_weight_sets': timed(
+                lambda: len(rank_weight_sets(site_ids, matrix, weight_sets, 100)), args.repeat
+            ),
+        }
+
+    emit(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Async versions of the hot read endpoints, served under /api/async/.
+
+Under an ASGI server these views await the database through Django's
+async ORM instead of holding a worker thread per request. Filtering,
+pagination and payloads are borrowed from the DRF viewsets, so each
+endpoint answers exactly like its synchronous counterpart; they always
+read the database and never the in-memory snapshot, whose rebuild
+would block the event loop.
+"""
+from functools import wraps
+
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .models import AnalysisResult
+from .payloads import renderer_for
+from .rankings import ranked_result_ids
+from .serializers import AnalysisResultSerializer
+from .statistics import aaggregate_groups, aget_statistics, summarize
+from .views import AnalysisResultViewSet, SiteViewSet, group_params, top_sites_serializer
+
+
+def json_response(data, status=200):
+    # Rendered by DRF so the bytes match the synchronous endpoints
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def async_api(view):
+    """GET-only async view wrapping the request for DRF and rendering API errors"""
+    @require_GET
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(Request(request), *args, **kwargs)
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            return json_response(detail, status=exc.status_code)
+    return wrapper
+
+
+def viewset_for(viewset_class, request, action, **kwargs):
+    """An unbound viewset instance, for its queryset, filters and paginator"""
+    view = viewset_class(action=action, args=(), kwargs=kwargs, format_kwarg=None)
+    view.request = request
+    return view
+
+
+async def lean_page(view):
+    """One keyset page of the viewset's filtered list, rendered from .values() rows"""
+    renderer = renderer_for(view.get_serializer_class())
+    queryset = renderer.values(view.filter_queryset(view.get_queryset()))
+    rows = await view.paginator.apaginate_queryset(queryset, view.request)
+    return json_response(view.paginator.get_paginated_data(renderer.render(rows)))
+
+
+@async_api
+async def site_list(request):
+    return await lean_page(viewset_for(SiteViewSet, request, 'list'))
+
+
+@async_api
+async def site_detail(request, pk):
+    view = viewset_for(SiteViewSet, request, 'retrieve', pk=pk)
+    renderer = renderer_for(view.get_serializer_class())
+    row = await renderer.values(view.get_queryset()).filter(pk=pk).afirst()
+    if row is None:
+        raise NotFound('No Site matches the given query.')
+    return json_response(renderer.render([row])[0])
+
+
+@async_api
+async def result_list(request):
+    return await lean_page(viewset_for(AnalysisResultViewSet, request, 'list'))
+
+
+@async_api
+async def top_sites(request):
+    serializer = top_sites_serializer(request.query_params)
+    if not serializer.is_valid():
+        raise ValidationError(serializer.errors)
+    data = serializer.validated_data
+
+    result_ids = [
+        result_id async for result_id in ranked_result_ids(
+            region=data.get('region'), land_type=data.get('land_type'),
+            min_score=data.get('min_score'), max_score=data.get('max_score'),
+        )[:data['limit']]
+    ]
+    renderer = renderer_for(AnalysisResultSerializer)
+    rows = {
+        row['result_id']: row
+        async for row in renderer.values(AnalysisResult.objects.filter(result_id__in=result_ids))
+    }
+    return json_response(renderer.render([rows[result_id] for result_id in result_ids if result_id in rows]))
+
+
+@async_api
+async def statistics(request):
+    params = request.query_params
+    region, land_type = group_params(params)
+    if 'min_score' in params or 'max_score' in params:
+        # Score ranges cut across the materialized groups
+        queryset = viewset_for(AnalysisResultViewSet, request, 'statistics').get_queryset()
+        if region is not None:
+            queryset = queryset.filter(site__region=region)
+        if land_type is not None:
+            queryset = queryset.filter(site__land_type=land_type)
+        return json_response(summarize((await aaggregate_groups(queryset)).values()))
+    return json_response(await aget_statistics(region, land_type))
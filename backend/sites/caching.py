@@ -0,0 +1,189 @@
+"""
+Version tokens and conditional, cached API responses.
+
+Cached data is invalidated by replacing a version token in Django's
+cache rather than by deleting entries: anything derived from the old
+token simply stops being looked up. Read endpoints opt in through
+ConditionalCacheMixin; their responses are stored under a key built
+from the request and the current tokens, and the same key doubles as
+the ETag, so a client revalidating an unchanged resource gets a 304
+without the view running at all.
+
+Tokens live in the default cache, so checking one costs no query. With
+locmem they are private to the process, which is right for a single
+worker; deployments running several need a shared cache, or a write in
+one process is never seen by the others (`check --deploy` warns).
+"""
+import hashlib
+import threading
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.response import Response
+
+RESPONSE_TIMEOUT = 5 * 60
+
+# Per-process counters: (view name, outcome) -> requests
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def shared_cache():
+    """Whether the default cache is one store for all processes, not a copy per process"""
+    backend = settings.CACHES['default']['BACKEND']
+    return not backend.endswith(('LocMemCache', 'DummyCache'))
+
+
+def current_versions(keys):
+    """Key -> the token stored under it, created if it is missing or was evicted"""
+    keys = list(keys)
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = uuid.uuid4().hex
+            if not cache.add(key, version, timeout=None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return versions
+
+
+def current_version(key):
+    return current_versions([key])[key]
+
+
+def bump_versions(keys):
+    """Replace the tokens now and again once the surrounding write commits"""
+    keys = list(keys)
+    if not keys:
+        return
+
+    def bump():
+        token = uuid.uuid4().hex
+        cache.set_many({key: token for key in keys}, timeout=None)
+
+    # The second bump stops a value rebuilt from pre-commit data in the
+    # meantime from being served under the new token
+    bump()
+    transaction.on_commit(bump)
+
+
+def bump_version(key):
+    bump_versions([key])
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if shared_cache():
+        return []
+    return [checks.Warning(
+        "The default cache is private to each process, so version tokens bumped "
+        "by one worker are not seen by the others.",
+        hint="Run a single worker or set CACHE_BACKEND to file, db, memcached or redis.",
+        id='sites.W001',
+    )]
+
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get('If-None-Match', '')
+    return etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+
+
+def response_cache_enabled():
+    return getattr(settings, 'RESPONSE_CACHE_ENABLED', True)
+
+
+def _record(name, outcome):
+    with _stats_lock:
+        _stats[(name, outcome)] += 1
+
+
+def cache_stats():
+    """Hit/miss/304 counts of this process, overall and per view"""
+    with _stats_lock:
+        stats = dict(_stats)
+
+    def summary(counts):
+        lookups = counts.get('hit', 0) + counts.get('miss', 0) + counts.get('not_modified', 0)
+        served = lookups - counts.get('miss', 0)
+        return {
+            'hits': counts.get('hit', 0),
+            'misses': counts.get('miss', 0),
+            'not_modified': counts.get('not_modified', 0),
+            'hit_rate': round(served / lookups, 4) if lookups else None,
+        }
+
+    views = {}
+    for (name, outcome), count in stats.items():
+        views.setdefault(name, Counter())[outcome] += count
+    return {
+        **summary(sum(views.values(), Counter())),
+        'views': {name: summary(counts) for name, counts in sorted(views.items())},
+    }
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+class ConditionalCacheMixin:
+    """
+    Cache the GET responses of `cached_actions` and answer conditional
+    requests for them with 304 Not Modified.
+
+    Responses are keyed on the action, path, sorted query parameters,
+    negotiated format and the tokens under `cache_version_keys`, which
+    every write to the underlying data must bump.
+    """
+    cache_version_keys = ()
+    cached_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (request.method == 'GET' and self.action in self.cached_actions
+                and self.cache_version_keys and response_cache_enabled()):
+            handler = self.get
+            self.get = lambda request, *args, **kwargs: self.cached_response(
+                request, lambda: handler(request, *args, **kwargs)
+            )
+
+    def response_cache_key(self, request):
+        digest = hashlib.sha1(f'{self.basename}:{self.action}:{request.path}'.encode())
+        for name, value in sorted(request.query_params.lists()):
+            digest.update(f'|{name}={",".join(value)}'.encode())
+        digest.update(f'|format={request.accepted_renderer.format}'.encode())
+        versions = current_versions(self.cache_version_keys)
+        for key in self.cache_version_keys:
+            digest.update(f'|{key}={versions[key]}'.encode())
+        return f'sites:response:{digest.hexdigest()}'
+
+    def cached_response(self, request, build):
+        key = self.response_cache_key(request)
+        etag = f'"{key.rsplit(":", 1)[1]}"'
+        name = f'{self.basename}-{self.action}'
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+        if etag_matches(request, etag):
+            _record(name, 'not_modified')
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        data = cache.get(key)
+        if data is not None:
+            _record(name, 'hit')
+            response = Response(data, headers={**headers, 'X-Cache': 'HIT'})
+        else:
+            _record(name, 'miss')
+            response = build()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(key, response.data, timeout=getattr(settings, 'RESPONSE_CACHE_TIMEOUT', RESPONSE_TIMEOUT))
+            for header, value in {**headers, 'X-Cache': 'MISS'}.items():
+                response[header] = value
+        patch_vary_headers(response, ['Accept'])
+        return response
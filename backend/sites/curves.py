@@ -0,0 +1,189 @@
+"""
+Scoring curves defined as data.
+
+Every factor is a piecewise-linear curve over one site attribute, given
+as breakpoints, or a table over a categorical attribute:
+
+    {'field': 'slope_degrees', 'points': [[5, 100], [15, 50], [20, 0]]}
+    {'field': 'land_type', 'kind': 'multiplier',
+     'categories': {'Barren': 1.0, 'Residential': 0.6}, 'default': 1.0}
+
+Curves clamp to their first and last breakpoint outside their range.
+'score' factors give 0-100 and enter the weighted total under their
+key's weight; 'multiplier' factors scale the weighted total. The built-in
+five live in DEFAULT_CURVES; active ScoringCurve rows override them or
+add new factors. Definitions are compiled once into breakpoint and
+slope arrays, interpolated like np.interp, or code lookups for
+categories, so a scalar and a million-row batch go through the same
+arithmetic.
+"""
+import json
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+
+from .caching import bump_version, current_version
+
+# Factor key -> curve definition of the built-in factors
+DEFAULT_CURVES = {
+    'solar': {'field': 'solar_irradiance_kwh', 'points': [[3.0, 0], [5.5, 100]]},
+    'area': {'field': 'area_sqm', 'points': [[5000, 0], [50000, 100]]},
+    'grid': {'field': 'grid_distance_km', 'points': [[1, 100], [20, 0]]},
+    'slope': {'field': 'slope_degrees', 'points': [[5, 100], [15, 50], [20, 0]]},
+    'infrastructure': {'field': 'road_distance_km', 'points': [[0.5, 100], [5, 0]]},
+}
+
+CURVE_KINDS = ('score', 'multiplier')
+BUILTIN_KIND_ERROR = "{key}: built-in factors must stay 'score' curves"
+
+VERSION_KEY = 'sites:curves:version'
+CURVES_TIMEOUT = 60 * 60 * 24
+
+# Per-process compiled model for the version it was loaded at
+_local = {'version': None, 'model': None}
+
+
+class Curve:
+    """One compiled factor curve"""
+
+    def __init__(self, key, spec):
+        self.key = key
+        self.field = spec.get('field')
+        self.kind = spec.get('kind', 'score')
+        if not isinstance(self.field, str) or not self.field:
+            raise ValueError(f"{key}: 'field' must name a site attribute")
+        if self.kind not in CURVE_KINDS:
+            raise ValueError(f"{key}: 'kind' must be one of {', '.join(CURVE_KINDS)}")
+
+        if 'categories' in spec:
+            categories = spec['categories']
+            if not isinstance(categories, dict) or not categories:
+                raise ValueError(f"{key}: 'categories' must map values to numbers")
+            self.categories = {str(name): self._number(key, value) for name, value in categories.items()}
+            self.default = self._number(key, spec.get('default', 1.0 if self.kind == 'multiplier' else 0.0))
+            self.xp = self.fp = None
+        else:
+            points = spec.get('points')
+            if not isinstance(points, (list, tuple)) or not points:
+                raise ValueError(f"{key}: a curve needs 'points' or 'categories'")
+            try:
+                xp, fp = zip(*[(self._number(key, x), self._number(key, y)) for x, y in points])
+            except (TypeError, ValueError) as error:
+                raise ValueError(f"{key}: 'points' must be [x, y] pairs of numbers") from error
+            self.xp = np.array(xp, dtype=np.float64)
+            self.fp = np.array(fp, dtype=np.float64)
+            self.dx = np.diff(self.xp)
+            self.dy = np.diff(self.fp)
+            if np.any(self.dx <= 0):
+                raise ValueError(f"{key}: breakpoint x values must be strictly increasing")
+            self.categories = None
+
+    @staticmethod
+    def _number(key, value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value):
+            raise ValueError(f"{key}: {value!r} is not a finite number")
+        return float(value)
+
+    @property
+    def categorical(self):
+        return self.categories is not None
+
+    def __call__(self, values):
+        """Evaluate the curve for a sequence of values"""
+        if self.categorical:
+            codes, uniques = pd.factorize(pd.Series(np.asarray(values, dtype=object)))
+            lookup = np.array(
+                [self.categories.get(str(value), self.default) for value in uniques] + [self.default],
+                dtype=np.float64,
+            )
+            # Missing values factorize to -1, the trailing default
+            return lookup[codes]
+        x = np.asarray(values, dtype=np.float64)
+        if len(self.xp) == 1:
+            return np.where(np.isnan(x), np.nan, self.fp[0])
+        # Like np.interp, but as y0 + (x - x0) / dx * dy, the arithmetic
+        # the hand-written curves used, so scores match them bit for bit
+        if len(self.dx) == 1:
+            y = self.fp[0] + (x - self.xp[0]) / self.dx[0] * self.dy[0]
+        else:
+            segment = np.clip(np.searchsorted(self.xp, x, side='right') - 1, 0, len(self.dx) - 1)
+            y = self.fp[segment] + (x - self.xp[segment]) / self.dx[segment] * self.dy[segment]
+        y = np.where(x <= self.xp[0], self.fp[0], y)
+        return np.where(x >= self.xp[-1], self.fp[-1], y)
+
+
+class ScoringModel:
+    """A compiled set of factor curves, in definition order"""
+
+    def __init__(self, specs):
+        self.specs = specs
+        self.curves = [Curve(key, spec) for key, spec in specs.items()]
+        for curve in self.curves:
+            if curve.key in DEFAULT_CURVES and curve.kind != 'score':
+                raise ValueError(BUILTIN_KIND_ERROR.format(key=curve.key))
+        self.scores = [curve for curve in self.curves if curve.kind == 'score']
+        self.multipliers = [curve for curve in self.curves if curve.kind == 'multiplier']
+        self.fields = list(dict.fromkeys(curve.field for curve in self.curves))
+        self.category_fields = {curve.field for curve in self.curves if curve.categorical}
+        # Definitions that differ from the built-in ones, as recorded on runs
+        self.overrides = {key: spec for key, spec in specs.items() if DEFAULT_CURVES.get(key) != spec}
+
+
+def _canonical(specs):
+    # Key order is kept: it is the order factors are summed in
+    return json.dumps(specs, separators=(',', ':'))
+
+
+@lru_cache(maxsize=32)
+def _compile(canonical):
+    return ScoringModel(json.loads(canonical))
+
+
+def compile_curves(specs=None):
+    """
+    The ScoringModel for `specs` (DEFAULT_CURVES if omitted), compiled
+    once per distinct definition. Raises ValueError for invalid curves.
+    """
+    return _compile(_canonical(DEFAULT_CURVES if specs is None else specs))
+
+
+def _cache_key(version):
+    return f'sites:curves:{version}'
+
+
+def _load_specs():
+    from .models import ScoringCurve
+
+    specs = dict(DEFAULT_CURVES)
+    for curve in ScoringCurve.objects.filter(is_active=True).order_by('curve_id'):
+        specs[curve.factor_key] = curve.spec()
+    return specs
+
+
+def get_scoring_model():
+    """
+    The compiled curves currently in effect: DEFAULT_CURVES overlaid with
+    the active ScoringCurve rows.
+
+    The definitions are cached like the default weights, under a version
+    token, so repeated calls cost one cache lookup and no queries.
+    """
+    version = current_version(VERSION_KEY)
+    if _local['version'] != version:
+        specs = cache.get(_cache_key(version))
+        if specs is None:
+            specs = _load_specs()
+            cache.set(_cache_key(version), specs, timeout=CURVES_TIMEOUT)
+        _local['version'] = version
+        _local['model'] = compile_curves(specs)
+
+    return _local['model']
+
+
+def invalidate_curves():
+    """Drop cached curve definitions everywhere; called whenever a curve changes"""
+    bump_version(VERSION_KEY)
+    _local['version'] = None
+    _local['model'] = None
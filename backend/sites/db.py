@@ -0,0 +1,55 @@
+import django
+from django.db import connections, router, transaction
+
+
+def bulk_upsert(model, rows, unique_fields, update_fields, batch_size=None):
+    """
+    Insert `rows`, updating `update_fields` of the ones that clash with an
+    existing row on `unique_fields`.
+
+    MySQL upserts on whichever unique key clashes (ON DUPLICATE KEY
+    UPDATE) and rejects an explicit conflict target, which SQLite and
+    PostgreSQL require.
+    """
+    connection = connections[router.db_for_write(model)]
+    target = unique_fields if connection.features.supports_update_conflicts_with_target else None
+    return model.objects.bulk_create(
+        rows, batch_size=batch_size, update_conflicts=True, unique_fields=target, update_fields=update_fields,
+    )
+
+
+def allocate_ids(model, count, using=None):
+    """
+    The first of `count` consecutive new primary keys for `model`, for
+    backends such as MySQL that don't return auto-increment keys from a
+    bulk insert.
+
+    Keys come from the table's IdSequence row, locked FOR UPDATE until
+    the surrounding transaction ends, so concurrent allocations wait
+    for each other rather than for gap locks, which READ COMMITTED
+    doesn't take. They start above the table's highest key, so rows
+    inserted by other means are never reused.
+    """
+    from .models import IdSequence
+
+    using = using or router.db_for_write(model)
+    pk = model._meta.pk.attname
+    with transaction.atomic(using=using):
+        sequences = IdSequence.objects.using(using)
+        sequences.get_or_create(name=model._meta.db_table)
+        sequence = sequences.select_for_update().get(name=model._meta.db_table)
+        highest = model._default_manager.using(using).order_by(f'-{pk}').values_list(pk, flat=True).first()
+        first = max(sequence.last_id, highest or 0) + 1
+        sequence.last_id = first + count - 1
+        sequence.save(update_fields=['last_id'])
+    return first
+
+
+def init_worker():
+    """
+    Process pool initializer. Kept free of model imports so a spawned
+    child can unpickle it before Django is set up.
+    """
+    django.setup()
+    # Forked children must open their own database connections
+    connections.close_all()
@@ -0,0 +1,175 @@
+import csv
+import json
+
+from .models import AnalysisResult
+
+EXPORT_CHUNK_SIZE = 2000
+
+SITE_COLUMNS = [
+    'site_id', 'site_name', 'latitude', 'longitude', 'area_sqm', 'solar_irradiance_kwh',
+    'grid_distance_km', 'slope_degrees', 'road_distance_km', 'elevation_m', 'land_type', 'region',
+]
+RESULT_COLUMNS = [
+    'solar_irradiance_score', 'area_score', 'grid_distance_score', 'slope_score',
+    'infrastructure_score', 'total_suitability_score', 'analysis_timestamp',
+]
+COLUMNS = SITE_COLUMNS + RESULT_COLUMNS
+
+FLOAT_COLUMNS = {
+    'latitude', 'longitude', 'solar_irradiance_kwh', 'grid_distance_km', 'slope_degrees',
+    'road_distance_km', 'solar_irradiance_score', 'area_score', 'grid_distance_score',
+    'slope_score', 'infrastructure_score', 'total_suitability_score',
+}
+
+# Requested format -> streamed format
+EXPORT_FORMATS = {'csv': 'csv', 'json': 'ndjson', 'ndjson': 'ndjson', 'parquet': 'parquet'}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_queryset(region=None, land_type=None, min_score=None, max_score=None):
+    """Each site's latest result, filtered like AnalysisResultViewSet"""
+    queryset = AnalysisResult.objects.latest_per_site()
+    if region is not None:
+        queryset = queryset.filter(site__region=region)
+    if land_type is not None:
+        queryset = queryset.filter(site__land_type=land_type)
+    if min_score is not None:
+        queryset = queryset.filter(total_suitability_score__gte=min_score)
+    if max_score is not None:
+        queryset = queryset.filter(total_suitability_score__lte=max_score)
+    return queryset
+
+
+def iter_chunks(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield lists of row tuples in site order.
+
+    Each chunk is its own keyset-bounded query, so memory stays flat on
+    every backend, including MySQL where iterator() can't stream.
+    """
+    lookups = [f'site__{c}' if c in SITE_COLUMNS else c for c in COLUMNS]
+    queryset = queryset.order_by('site_id').values_list(*lookups)
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(site_id__gt=last_id)[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _jsonable(row):
+    record = {}
+    for column, value in zip(COLUMNS, row):
+        if value is not None and column in FLOAT_COLUMNS:
+            value = float(value)
+        elif column == 'analysis_timestamp' and value is not None:
+            value = value.isoformat()
+        record[column] = value
+    return record
+
+
+def stream_csv(chunks):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for rows in chunks:
+        yield ''.join(writer.writerow(row) for row in rows)
+
+
+def stream_ndjson(chunks):
+    for rows in chunks:
+        yield ''.join(json.dumps(_jsonable(row)) + '\n' for row in rows)
+
+
+class _Sink:
+    """Write-only file object whose contents are drained after each row group"""
+
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream_parquet(chunks):
+    """Stream a Parquet file, one row group per chunk; requires pyarrow"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        (column, pa.float64() if column in FLOAT_COLUMNS
+         else pa.int64() if column in ('site_id', 'area_sqm', 'elevation_m')
+         else pa.timestamp('us', tz='UTC') if column == 'analysis_timestamp'
+         else pa.string())
+        for column in COLUMNS
+    ])
+    sink = _Sink()
+    with pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema) as writer:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            arrays = [
+                pa.array([None if v is None else float(v) for v in values], pa.float64())
+                if column in FLOAT_COLUMNS else pa.array(values, schema.field(column).type)
+                for column, values in zip(COLUMNS, columns)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+STREAMERS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+    'parquet': stream_parquet,
+}
+
+
+def write_export(path, export_format, queryset, progress=None):
+    """
+    Write the export to a file instead of a response.
+
+    `progress`, if given, is called with the number of rows written after
+    every chunk. Returns the row count.
+    """
+    written = 0
+
+    def counted(chunks):
+        nonlocal written
+        for rows in chunks:
+            yield rows
+            written += len(rows)
+            if progress is not None:
+                progress(written)
+
+    with open(path, 'wb') as f:
+        for part in STREAMERS[export_format](counted(iter_chunks(queryset))):
+            f.write(part.encode() if isinstance(part, str) else part)
+    return written
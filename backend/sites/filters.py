@@ -0,0 +1,81 @@
+from functools import reduce
+from operator import or_
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Least, Power, Radians, Sin, Sqrt
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .geo import EARTH_RADIUS_KM, bbox_prefixes, prefix_ranges, radius_bbox
+
+
+def _parse_floats(value, count, name):
+    try:
+        numbers = [float(part) for part in value.split(',')]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count:
+        raise ValidationError({name: f'Expected {count} comma-separated numbers.'})
+    return numbers
+
+
+def bbox_q(south, west, north, east, prefix=''):
+    """Q object selecting sites inside the box through the geohash index"""
+    cells = reduce(or_, (
+        Q(**{f'{prefix}geohash__gte': low}) & (Q(**{f'{prefix}geohash__lt': high}) if high else Q())
+        for low, high in prefix_ranges(bbox_prefixes(south, west, north, east))
+    ))
+    latitude = Q(**{f'{prefix}latitude__gte': south, f'{prefix}latitude__lte': north})
+    if west <= east:
+        longitude = Q(**{f'{prefix}longitude__gte': west, f'{prefix}longitude__lte': east})
+    else:
+        longitude = Q(**{f'{prefix}longitude__gte': west}) | Q(**{f'{prefix}longitude__lte': east})
+    return cells & latitude & longitude
+
+
+def distance_km(latitude, longitude, prefix=''):
+    """Haversine distance expression from a fixed point to each site"""
+    lat1, lon1 = Radians(Value(latitude)), Radians(Value(longitude))
+    lat2 = Radians(Cast(F(f'{prefix}latitude'), FloatField()))
+    lon2 = Radians(Cast(F(f'{prefix}longitude'), FloatField()))
+    a = (
+        Power(Sin((lat2 - lat1) / 2), 2)
+        + Cos(lat1) * Cos(lat2) * Power(Sin((lon2 - lon1) / 2), 2)
+    )
+    # Clamp against rounding pushing asin's argument just past 1
+    return 2 * EARTH_RADIUS_KM * ASin(Least(Sqrt(a), Value(1.0)))
+
+
+class SpatialFilterBackend(BaseFilterBackend):
+    """
+    Geographic filters backed by the Site.geohash index.
+
+    ``bbox=west,south,east,north`` (Leaflet's toBBoxString order) keeps
+    sites inside the box; ``near=lat,lon&radius_km=r`` keeps sites within
+    r km of the point. Views whose model reaches sites through a relation
+    set ``spatial_field_prefix`` (e.g. ``'site__'``).
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        prefix = getattr(view, 'spatial_field_prefix', '')
+        params = request.query_params
+
+        if params.get('bbox'):
+            west, south, east, north = _parse_floats(params['bbox'], 4, 'bbox')
+            if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+                raise ValidationError({'bbox': 'Coordinates are out of range.'})
+            queryset = queryset.filter(bbox_q(south, west, north, east, prefix))
+
+        if params.get('near'):
+            latitude, longitude = _parse_floats(params['near'], 2, 'near')
+            radius = _parse_floats(params.get('radius_km', ''), 1, 'radius_km')[0]
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or radius <= 0:
+                raise ValidationError({'near': 'Point or radius is out of range.'})
+            queryset = (
+                queryset
+                .filter(bbox_q(*radius_bbox(latitude, longitude, radius), prefix))
+                .alias(distance_km=distance_km(latitude, longitude, prefix))
+                .filter(distance_km__lte=radius)
+            )
+
+        return queryset
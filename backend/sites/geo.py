@@ -0,0 +1,146 @@
+import math
+
+import numpy as np
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+# Upper bound on the number of geohash prefixes a single query may expand to
+MAX_QUERY_CELLS = 16
+
+
+def encode_geohashes(latitudes, longitudes, precision=GEOHASH_PRECISION):
+    """Vectorized geohash encoding; returns a list of strings"""
+    lat = np.asarray(latitudes, dtype=np.float64)
+    lon = np.asarray(longitudes, dtype=np.float64)
+    lat_range = np.array([[-90.0, 90.0]]).repeat(len(lat), axis=0)
+    lon_range = np.array([[-180.0, 180.0]]).repeat(len(lon), axis=0)
+
+    chars = np.zeros((len(lat), precision), dtype=np.int64)
+    for bit in range(precision * 5):
+        # Geohash interleaves bits starting with longitude
+        values, bounds = (lon, lon_range) if bit % 2 == 0 else (lat, lat_range)
+        mid = (bounds[:, 0] + bounds[:, 1]) / 2
+        upper = values >= mid
+        bounds[:, 0] = np.where(upper, mid, bounds[:, 0])
+        bounds[:, 1] = np.where(upper, bounds[:, 1], mid)
+        chars[:, bit // 5] = (chars[:, bit // 5] << 1) | upper
+
+    alphabet = np.array(list(BASE32))
+    return [''.join(row) for row in alphabet[chars]]
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    return encode_geohashes([float(latitude)], [float(longitude)], precision)[0]
+
+
+def cell_size(precision):
+    """(height, width) in degrees of a geohash cell of the given length"""
+    bits = precision * 5
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** (bits - bits // 2)
+
+
+def _cover(south, west, north, east, precision):
+    height, width = cell_size(precision)
+    lats = np.arange(south, north + height, height).clip(max=north)
+    lons = np.arange(west, east + width, width).clip(max=east)
+    grid_lat, grid_lon = np.meshgrid(lats, lons)
+    return set(encode_geohashes(grid_lat.ravel(), grid_lon.ravel(), precision))
+
+
+def _cover_count(south, west, north, east, precision):
+    height, width = cell_size(precision)
+    rows = math.floor(north / height) - math.floor(south / height) + 1
+    cols = math.floor(east / width) - math.floor(west / width) + 1
+    return rows * cols
+
+
+def bbox_prefixes(south, west, north, east, max_cells=MAX_QUERY_CELLS):
+    """
+    Geohash prefixes whose cells together cover the bounding box.
+
+    Uses the longest prefix length that keeps the cover within
+    `max_cells`, so each prefix is a narrow index range scan. A box that
+    crosses the antimeridian (west > east) is split in two.
+    """
+    if west > east:
+        return (bbox_prefixes(south, west, north, 180.0, max_cells // 2)
+                | bbox_prefixes(south, -180.0, north, east, max_cells // 2))
+
+    precision = 1
+    while (precision < GEOHASH_PRECISION
+           and _cover_count(south, west, north, east, precision + 1) <= max_cells):
+        precision += 1
+    return _cover(south, west, north, east, precision)
+
+
+def _next_prefix(prefix):
+    """Smallest geohash string ordering after every string starting with `prefix`"""
+    while prefix:
+        index = BASE32.index(prefix[-1])
+        if index + 1 < len(BASE32):
+            return prefix[:-1] + BASE32[index + 1]
+        prefix = prefix[:-1]
+    return None
+
+
+def prefix_ranges(prefixes):
+    """
+    Merge same-length geohash prefixes into [low, high) string ranges.
+
+    Adjacent prefixes collapse into one range, and plain range comparisons
+    use the index on every backend where LIKE 'abc%' might not.
+    """
+    ranges = []
+    for prefix in sorted(prefixes):
+        upper = _next_prefix(prefix)
+        if ranges and ranges[-1][1] == prefix:
+            ranges[-1][1] = upper
+        else:
+            ranges.append([prefix, upper])
+    return [tuple(r) for r in ranges]
+
+
+def radius_bbox(latitude, longitude, radius_km):
+    """Bounding box (south, west, north, east) of a circle on the sphere"""
+    dlat = radius_km / KM_PER_DEGREE
+    south, north = max(latitude - dlat, -90.0), min(latitude + dlat, 90.0)
+    cos_lat = math.cos(math.radians(latitude))
+    if north >= 90.0 or south <= -90.0 or cos_lat < 1e-9:
+        return south, -180.0, north, 180.0
+    dlon = min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+    west, east = longitude - dlon, longitude + dlon
+    if west < -180.0:
+        west += 360.0
+    if east > 180.0:
+        east -= 360.0
+    if dlon >= 180.0:
+        west, east = -180.0, 180.0
+    return south, west, north, east
+
+
+def haversine_km(latitude1, longitude1, latitude2, longitude2):
+    """Great-circle distances in km, element-wise"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=np.float64))
+                              for value in (latitude1, longitude1, latitude2, longitude2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.sqrt(a), 1.0))
+
+
+def unit_vectors(latitudes, longitudes):
+    """Points on the unit sphere, rows of (x, y, z)"""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_km(chord):
+    """Great-circle distance in km of a straight-line distance between unit vectors"""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord, dtype=np.float64) / 2, 0.0, 1.0))
+
+
+def km_to_chord(distance_km):
+    """Straight-line distance between unit vectors `distance_km` apart on the surface"""
+    return 2 * np.sin(np.minimum(np.asarray(distance_km, dtype=np.float64) / (2 * EARTH_RADIUS_KM), np.pi / 2))
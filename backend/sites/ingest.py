@@ -0,0 +1,234 @@
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from django.db import connection, transaction
+
+from .curves import get_scoring_model
+from .db import allocate_ids
+from .geo import encode_geohashes
+from .models import Site, AnalysisResult, AnalysisRun
+from .rankings import sync_rankings
+from .runs import record_scores, start_run
+from .snapshot import invalidate_snapshot
+from .statistics import apply_score_changes
+from .tiles import touch_geohashes
+from .utils import SuitabilityCalculator, SCORE_FIELDS, round_scores
+from .weights import get_default_weights
+
+DEFAULT_CHUNK_SIZE = 10000
+
+# Column -> (min, max, decimal places); None decimal places means integer
+NUMERIC_COLUMNS = {
+    'latitude': (-90, 90, 7),
+    'longitude': (-180, 180, 7),
+    'area_sqm': (0, 2147483647, None),
+    'solar_irradiance_kwh': (0, 99.99, 2),
+    'grid_distance_km': (0, 999.99, 2),
+    'slope_degrees': (0, 90, 2),
+    'road_distance_km': (0, 999.99, 2),
+    'elevation_m': (-2147483648, 2147483647, None),
+}
+
+TEXT_COLUMNS = {
+    'site_name': 255,
+    'land_type': 50,
+    'region': 100,
+}
+
+REQUIRED_COLUMNS = list(TEXT_COLUMNS) + list(NUMERIC_COLUMNS)
+
+
+def read_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, skip_rows=0):
+    """
+    Yield DataFrames of at most `chunk_size` rows from a CSV or Parquet
+    file, leaving out its first `skip_rows` records. Records are counted
+    as parsed, so a quoted CSV field spanning lines is still one record.
+    """
+    if str(path).lower().endswith(('.parquet', '.pq')):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Reading Parquet files requires the 'pyarrow' package")
+
+        frames = (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size))
+    else:
+        frames = pd.read_csv(path, chunksize=chunk_size)
+
+    for frame in frames:
+        if skip_rows >= len(frame):
+            skip_rows -= len(frame)
+            continue
+        if skip_rows:
+            frame = frame.iloc[skip_rows:].reset_index(drop=True)
+            skip_rows = 0
+        yield frame
+
+
+def clean_chunk(frame):
+    """
+    Validate and coerce a raw chunk with column-wise operations.
+
+    Returns (clean DataFrame, {reason: rejected row count}).
+    """
+    missing = [column for column in REQUIRED_COLUMNS if column not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+    clean = pd.DataFrame(index=frame.index)
+    reasons = pd.Series(None, index=frame.index, dtype=object)
+
+    for column, max_length in TEXT_COLUMNS.items():
+        values = frame[column].astype('string').str.strip()
+        invalid = values.isna() | (values == '') | (values.str.len() > max_length)
+        reasons = reasons.mask(reasons.isna() & invalid, f'invalid {column}')
+        clean[column] = values
+
+    for column, (low, high, places) in NUMERIC_COLUMNS.items():
+        values = pd.to_numeric(frame[column], errors='coerce')
+        values = values.round(places or 0)
+        invalid = values.isna() | (values < low) | (values > high)
+        reasons = reasons.mask(reasons.isna() & invalid, f'invalid {column}')
+        clean[column] = values
+
+    valid = reasons.isna()
+    clean = clean[valid].reset_index(drop=True)
+    clean['area_sqm'] = clean['area_sqm'].astype(np.int64)
+    clean['elevation_m'] = clean['elevation_m'].astype(np.int64)
+    return clean, reasons[~valid].value_counts().to_dict()
+
+
+def _create_sites(frame):
+    geohashes = encode_geohashes(frame['latitude'], frame['longitude'])
+    sites = [
+        Site(geohash=geohash, **record)
+        for record, geohash in zip(frame[REQUIRED_COLUMNS].to_dict('records'), geohashes)
+    ]
+    if not connection.features.can_return_rows_from_bulk_insert:
+        # Backends such as MySQL don't hand back auto-increment keys from a
+        # bulk insert, so allocate them from the sites sequence first
+        first = allocate_ids(Site, len(sites))
+        for offset, site in enumerate(sites):
+            site.site_id = first + offset
+    Site.objects.bulk_create(sites)
+    touch_geohashes(geohashes)
+    return [site.site_id for site in sites]
+
+
+def _create_results(frame, site_ids, total, scores, run):
+    rounded = {key: round_scores(values, 2) for key, values in scores.items()}
+    results = [
+        AnalysisResult(
+            site_id=site_id,
+            total_suitability_score=float(total[i]),
+            run=run,
+            **{field: float(rounded[key][i]) for key, field in SCORE_FIELDS.items()}
+        )
+        for i, site_id in enumerate(site_ids)
+    ]
+    AnalysisResult.objects.bulk_create(results)
+    record_scores(run, site_ids, total, rounded)
+    apply_score_changes(zip(frame['region'], frame['land_type'], total.tolist()))
+    sync_rankings(site_ids)
+
+
+def write_sites(clean, total, scores, run, checkpoint=None):
+    """
+    Insert a cleaned, scored chunk of sites and their results for `run`
+    in one transaction, storing `checkpoint` on the run in the same one
+    """
+    with transaction.atomic():
+        site_ids = _create_sites(clean)
+        _create_results(clean, site_ids, total, scores, run)
+        if checkpoint is not None:
+            AnalysisRun.objects.filter(pk=run.pk).update(checkpoint=checkpoint)
+        invalidate_snapshot()
+    return site_ids
+
+
+def _load_checkpoint(path, source):
+    """The checkpoint committed on the run recorded in the file at `path`"""
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    if checkpoint.get('source') != os.path.abspath(source):
+        raise ValueError(f"Checkpoint {path} belongs to a different source file")
+    run = AnalysisRun.objects.filter(pk=checkpoint.get('run_id')).first()
+    if run is None:
+        return None
+    return run.checkpoint or {'run_id': run.run_id}
+
+
+def _save_checkpoint(path, source, run):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'source': os.path.abspath(source), 'run_id': run.run_id}, f)
+    os.replace(tmp_path, path)
+
+
+def import_sites(path, chunk_size=DEFAULT_CHUNK_SIZE, weights=None, dry_run=False,
+                 checkpoint_path=None, resume=False, progress=None):
+    """
+    Import sites from a CSV or Parquet file and score them.
+
+    Each chunk is validated column-wise, scored with calculate_batch and
+    written as bulk inserts of Site and AnalysisResult rows in a single
+    transaction, which also stores the progress so far on the import's
+    run. When `checkpoint_path` is set, the file there names that run
+    and `resume` continues after its last committed chunk.
+    """
+    if weights is None:
+        weights = get_default_weights()
+
+    model = get_scoring_model()
+    calculator = SuitabilityCalculator(model)
+    summary = {
+        'rows_read': 0,
+        'imported': 0,
+        'rejected': 0,
+        'rejected_by_reason': {},
+        'elapsed_seconds': 0.0,
+        'rows_per_second': 0.0,
+        'dry_run': dry_run,
+        'run_id': None,
+    }
+    if checkpoint_path and resume:
+        summary.update(_load_checkpoint(checkpoint_path, path) or {})
+    # A resumed import keeps adding to the run it started
+    run = AnalysisRun.objects.filter(pk=summary['run_id']).first() if summary['run_id'] else None
+    skip_rows = summary['rows_read']
+    started = time.perf_counter()
+
+    for frame in read_chunks(path, chunk_size, skip_rows):
+        clean, rejected = clean_chunk(frame)
+        total, scores = calculator.calculate_batch(clean, weights)
+
+        summary['rows_read'] += len(frame)
+        summary['imported'] += len(clean)
+        summary['rejected'] += sum(rejected.values())
+        for reason, count in rejected.items():
+            summary['rejected_by_reason'][reason] = summary['rejected_by_reason'].get(reason, 0) + count
+
+        elapsed = time.perf_counter() - started
+        summary['elapsed_seconds'] = round(elapsed, 3)
+        summary['rows_per_second'] = round((summary['rows_read'] - skip_rows) / elapsed, 1) if elapsed else 0.0
+
+        if not dry_run and len(clean):
+            if run is None:
+                run = start_run(weights, 'import', model.overrides)
+                summary['run_id'] = run.run_id
+                # Name the run before any of its rows commit
+                if checkpoint_path:
+                    _save_checkpoint(checkpoint_path, path, run)
+            write_sites(clean, total, scores, run, checkpoint=summary)
+        elif not dry_run and run is not None:
+            AnalysisRun.objects.filter(pk=run.pk).update(checkpoint=summary)
+
+        if progress is not None:
+            progress(summary)
+
+    return summary
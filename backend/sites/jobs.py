@@ -0,0 +1,255 @@
+"""
+Database-backed job queue for long-running analyses.
+
+Jobs are rows in the `jobs` table. The `run_jobs` management command
+claims queued jobs with a compare-and-set update, so any number of
+workers can share the table without a broker or row locks, and runs
+them in a pool of processes so CPU-bound jobs use every core.
+"""
+import os
+import socket
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.utils import timezone
+
+from .models import Job, Site
+
+# Seconds between queue polls when idle
+POLL_INTERVAL = 1.0
+# A running job whose row hasn't been touched for this long is presumed
+# orphaned by a dead worker and put back in the queue
+STALE_AFTER = timedelta(minutes=10)
+# Minimum seconds between progress writes
+PROGRESS_INTERVAL = 0.5
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def job_files_dir():
+    path = Path(getattr(settings, 'JOB_FILES_DIR', Path(settings.BASE_DIR) / 'job_files'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def job_file(job, suffix):
+    return job_files_dir() / f'job_{job.job_id}{suffix}'
+
+
+class JobContext:
+    """Handed to job handlers to report progress and notice cancellation"""
+
+    def __init__(self, job):
+        self.job = job
+        self._last_write = 0.0
+
+    def progress(self, processed, total=None, force=False):
+        """Record progress; raises JobCancelled once a cancel was requested"""
+        now = time.monotonic()
+        if not force and now - self._last_write < PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        values = {'processed': processed, 'updated_at': timezone.now()}
+        if total is not None:
+            values['total'] = total
+        Job.objects.filter(pk=self.job.pk).update(**values)
+        if Job.objects.filter(pk=self.job.pk, cancel_requested=True).exists():
+            raise JobCancelled()
+
+
+def _rescore(job, context):
+    from .services import rescore_sites
+
+    params = job.params
+    queryset = Site.objects.all()
+    if params.get('region'):
+        queryset = queryset.filter(region=params['region'])
+    if params.get('land_type'):
+        queryset = queryset.filter(land_type=params['land_type'])
+
+    context.progress(0, queryset.count(), force=True)
+    return rescore_sites(
+        queryset,
+        weights=params.get('weights'),
+        chunk_size=params.get('chunk_size', 2000),
+        progress=lambda summary: context.progress(summary['processed'], summary['total_sites'], force=True),
+    )
+
+
+def _import(job, context):
+    from .ingest import import_sites
+
+    params = job.params
+    return import_sites(
+        params['path'],
+        chunk_size=params.get('chunk_size', 10000),
+        dry_run=params.get('dry_run', False),
+        checkpoint_path=f"{params['path']}.checkpoint.json",
+        resume=True,
+        progress=lambda summary: context.progress(summary['rows_read'], force=True),
+    )
+
+
+def _export(job, context):
+    from .export import export_queryset, write_export
+
+    params = job.params
+    queryset = export_queryset(
+        region=params.get('region'),
+        land_type=params.get('land_type'),
+        min_score=params.get('min_score'),
+        max_score=params.get('max_score'),
+    )
+    path = job_file(job, f".{params['format']}")
+    context.progress(0, queryset.count(), force=True)
+    rows = write_export(path, params['format'], queryset, progress=context.progress)
+    return {'rows': rows, 'format': params['format'], 'size_bytes': path.stat().st_size}
+
+
+def _sensitivity(job, context):
+    from .sensitivity import run_sensitivity
+
+    return run_sensitivity(
+        job_file(job, '.csv'),
+        job_file(job, '.npz'),
+        **job.params,
+        progress=lambda done, total: context.progress(done, total, force=done in (0, total)),
+    )
+
+
+# Job kind -> handler(job, context) returning the job's JSON result
+JOB_HANDLERS = {
+    'rescore': _rescore,
+    'import': _import,
+    'export': _export,
+    'sensitivity': _sensitivity,
+}
+
+
+def enqueue(kind, params=None):
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    return Job.objects.create(kind=kind, params=params or {})
+
+
+def cancel(job):
+    """Cancel a queued job outright, or ask a running one to stop"""
+    Job.objects.filter(pk=job.pk, status='queued').update(
+        status='cancelled', cancel_requested=True, finished_at=timezone.now()
+    )
+    Job.objects.filter(pk=job.pk, status='running').update(cancel_requested=True)
+    job.refresh_from_db()
+    return job
+
+
+def requeue_stale():
+    """Put back running jobs whose worker stopped reporting"""
+    return Job.objects.filter(
+        status='running', updated_at__lt=timezone.now() - STALE_AFTER
+    ).update(status='queued', worker='', updated_at=timezone.now())
+
+
+def claim_next(worker):
+    """Atomically take the oldest queued job, or return None"""
+    while True:
+        job_id = (
+            Job.objects.filter(status='queued').order_by('job_id')
+            .values_list('job_id', flat=True).first()
+        )
+        if job_id is None:
+            return None
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=job_id, status='queued').update(
+            status='running', worker=worker, started_at=now, updated_at=now
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+        # Another worker won the race; try the next one
+
+
+def run_job(job_id):
+    """Run a claimed job to completion and record how it ended"""
+    close_old_connections()
+    job = Job.objects.get(pk=job_id)
+    values = {}
+    try:
+        result = JOB_HANDLERS[job.kind](job, JobContext(job))
+    except JobCancelled:
+        values['status'] = 'cancelled'
+    except Exception:
+        values.update(status='failed', error=traceback.format_exc())
+    else:
+        values.update(status='succeeded', result=result)
+    finally:
+        now = timezone.now()
+        Job.objects.filter(pk=job_id).update(finished_at=now, updated_at=now, **values)
+        close_old_connections()
+    return values.get('status')
+
+
+def _init_process():
+    # Children must open their own database connections
+    connections.close_all()
+
+
+def run_worker(processes=1, poll_interval=POLL_INTERVAL, once=False, log=None):
+    """
+    Claim and run jobs until stopped, `processes` at a time.
+
+    With `once`, return as soon as the queue is empty and nothing is
+    running. Returns the number of jobs run.
+    """
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    log = log or (lambda message: None)
+    finished = 0
+
+    if processes == 1:
+        while True:
+            requeue_stale()
+            job = claim_next(worker)
+            if job is None:
+                if once:
+                    return finished
+                time.sleep(poll_interval)
+                continue
+            log(f'Running job {job.job_id} ({job.kind})')
+            status = run_job(job.job_id)
+            finished += 1
+            log(f'Job {job.job_id} {status}')
+
+    # Don't let forked children share the parent's connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_process) as pool:
+        running = {}
+        while True:
+            requeue_stale()
+            while len(running) < processes:
+                job = claim_next(worker)
+                if job is None:
+                    break
+                log(f'Running job {job.job_id} ({job.kind})')
+                running[pool.submit(run_job, job.job_id)] = job.job_id
+            if not running:
+                if once:
+                    return finished
+                time.sleep(poll_interval)
+                continue
+            done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                job_id = running.pop(future)
+                finished += 1
+                try:
+                    log(f'Job {job_id} {future.result()}')
+                except Exception as e:
+                    # The process died without recording an outcome
+                    Job.objects.filter(pk=job_id).update(
+                        status='failed', error=repr(e), finished_at=timezone.now()
+                    )
+                    log(f'Job {job_id} failed: {e!r}')
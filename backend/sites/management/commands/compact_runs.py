@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from sites.runs import DEFAULT_KEEP_RUNS, prune_runs, prune_superseded_results
+
+
+class Command(BaseCommand):
+    help = "Fold superseded analysis results into run history and drop the history of old runs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=DEFAULT_KEEP_RUNS,
+                            help="Always keep the history of this many newest runs")
+        parser.add_argument('--older-than', type=int, metavar='DAYS',
+                            help="Only drop runs created more than DAYS days ago")
+        parser.add_argument('--keep-superseded', action='store_true',
+                            help="Leave results replaced by a newer result of the same site in place")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be removed")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        superseded = 0
+        if not options['keep_superseded']:
+            superseded = prune_superseded_results(dry_run=dry_run)
+        runs, scores = prune_runs(
+            keep=max(0, options['keep']), older_than_days=options['older_than'], dry_run=dry_run
+        )
+        verb = "Would remove" if dry_run else "Removed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {superseded} superseded results and {runs} runs ({scores} history rows)"
+        ))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sites.ingest import import_sites, DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Import and score sites from a CSV or Parquet file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Validate and score without writing to the database")
+        parser.add_argument('--checkpoint',
+                            help="Checkpoint file (defaults to <path>.checkpoint.json)")
+        parser.add_argument('--resume', action='store_true',
+                            help="Continue from the last committed chunk in the checkpoint")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint.json'
+
+        def report(summary):
+            self.stdout.write(
+                f"{summary['rows_read']} rows read, {summary['imported']} imported, "
+                f"{summary['rejected']} rejected ({summary['rows_per_second']} rows/s)"
+            )
+
+        try:
+            summary = import_sites(
+                path,
+                chunk_size=options['chunk_size'],
+                dry_run=options['dry_run'],
+                checkpoint_path=checkpoint,
+                resume=options['resume'],
+                progress=report,
+            )
+        except (OSError, ImportError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for reason, count in sorted(summary['rejected_by_reason'].items()):
+            self.stdout.write(f"  {reason}: {count}")
+        verb = 'Validated' if summary['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {summary['imported']} of {summary['rows_read']} rows "
+            f"in {summary['elapsed_seconds']}s, {summary['rows_per_second']} rows/s"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from sites.rankings import rebuild_rankings
+
+
+class Command(BaseCommand):
+    help = "Recreate the current-score leaderboard from analysis_results"
+
+    def handle(self, *args, **options):
+        count = rebuild_rankings()
+        self.stdout.write(self.style.SUCCESS(f"Ranked {count} sites"))
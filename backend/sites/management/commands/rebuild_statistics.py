@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from sites.statistics import rebuild_statistics
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized score statistics from analysis_results"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--region')
+        parser.add_argument('--land-type')
+
+    def handle(self, *args, **options):
+        groups = rebuild_statistics(options['region'], options['land_type'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt statistics for {groups} groups"))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sites.models import Site
+from sites.services import rescore_sites, rescore_sites_sharded, DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Recalculate suitability scores for all sites in bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--region')
+        parser.add_argument('--land-type')
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Score site_id shards in this many processes")
+        parser.add_argument('--shards', type=int,
+                            help="Number of site_id shards (default: 4 per worker)")
+        parser.add_argument('--checkpoint',
+                            help="JSON file recording finished shards")
+        parser.add_argument('--resume', action='store_true',
+                            help="Skip the shards the checkpoint records as finished")
+
+    def handle(self, *args, **options):
+        queryset = Site.objects.all()
+        if options['region']:
+            queryset = queryset.filter(region=options['region'])
+        if options['land_type']:
+            queryset = queryset.filter(land_type=options['land_type'])
+
+        def report(summary):
+            # Sharded rescores also report their shards
+            shards = f", {summary['shards_done']}/{summary['shards']} shards" if 'shards' in summary else ''
+            self.stdout.write(
+                f"{summary['processed']}/{summary['total_sites']} sites{shards} "
+                f"({summary['rows_per_second']} rows/s)"
+            )
+
+        if options['resume'] and not options['checkpoint']:
+            raise CommandError("--resume needs --checkpoint")
+
+        if options['workers'] > 1 or options['checkpoint']:
+            try:
+                summary = rescore_sites_sharded(
+                    queryset, chunk_size=options['chunk_size'], workers=options['workers'],
+                    shards=options['shards'], checkpoint_path=options['checkpoint'],
+                    resume=options['resume'], progress=report,
+                )
+            except ValueError as error:
+                raise CommandError(str(error))
+        else:
+            summary = rescore_sites(queryset, chunk_size=options['chunk_size'], progress=report)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rescored {summary['processed']} sites "
+            f"({summary['created']} created, {summary['updated']} updated) "
+            f"in {summary['elapsed_seconds']}s, {summary['rows_per_second']} rows/s"
+        ))
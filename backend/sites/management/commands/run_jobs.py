@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from sites.jobs import POLL_INTERVAL, run_worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (rescores, imports, exports)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1,
+                            help="Jobs to run at once, each in its own process")
+        parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL)
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once the queue is empty instead of waiting for more jobs")
+
+    def handle(self, *args, **options):
+        finished = run_worker(
+            processes=max(1, options['processes']),
+            poll_interval=options['poll_interval'],
+            once=options['once'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Ran {finished} jobs"))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sites.proximity import (
+    CLUSTER_DISTANCE_KM, CLUSTER_MIN_SITES, DEFAULT_CHUNK_SIZE, INDEX_BACKENDS, NEIGHBOUR_RADIUS_KM, update_proximity,
+)
+
+
+class Command(BaseCommand):
+    help = "Recompute grid/road distances from local datasets, plus neighbour density and clusters"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--substations',
+                            help="CSV or GeoJSON of grid substations; sets grid_distance_km")
+        parser.add_argument('--roads',
+                            help="CSV or GeoJSON of roads; sets road_distance_km")
+        parser.add_argument('--radius-km', type=float, default=NEIGHBOUR_RADIUS_KM,
+                            help="Radius neighbours are counted within")
+        parser.add_argument('--cluster-km', type=float, default=CLUSTER_DISTANCE_KM,
+                            help="Distance that links sites into a cluster")
+        parser.add_argument('--min-sites', type=int, default=CLUSTER_MIN_SITES,
+                            help="Sites within --cluster-km, itself included, that make a site a cluster core")
+        parser.add_argument('--backend', choices=INDEX_BACKENDS,
+                            help="Spatial index (default: the fastest installed)")
+        parser.add_argument('--no-rescore', action='store_true',
+                            help="Store changed distances without rescoring the sites")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        for option in ('radius_km', 'cluster_km'):
+            if options[option] <= 0:
+                raise CommandError(f"--{option.replace('_', '-')} must be positive")
+
+        def report(summary):
+            self.stdout.write(f"{summary['changed']} sites with changed distances stored")
+
+        try:
+            summary = update_proximity(
+                substations=options['substations'], roads=options['roads'],
+                radius_km=options['radius_km'], cluster_km=options['cluster_km'], min_sites=options['min_sites'],
+                rescore=not options['no_rescore'], chunk_size=options['chunk_size'],
+                backend=options['backend'], progress=report,
+            )
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+        except ImportError as error:
+            raise CommandError(f"{options['backend']} backend unavailable: {error}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['total_sites']} sites: {summary['changed']} distances changed, "
+            f"{summary['rescored']} rescored, {summary['clustered_sites']} sites in "
+            f"{summary['clusters']} clusters ({summary['backend']} index) in {summary['elapsed_seconds']}s"
+        ))
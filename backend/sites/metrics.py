@@ -0,0 +1,96 @@
+"""
+In-process registry of per-view request metrics.
+
+Filled by PerformanceMiddleware and served at /api/metrics/. Each
+worker process keeps its own figures; latency percentiles come from the
+most recent requests only.
+"""
+import threading
+from collections import deque
+
+import numpy as np
+
+from .caching import cache_stats
+
+# Recent latencies kept per view for percentiles
+LATENCY_SAMPLES = 1000
+
+_views = {}
+_lock = threading.Lock()
+_counters = {'profiles_written': 0, 'budget_exceeded': 0}
+
+
+class ViewMetrics:
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.queries = 0
+        self.db_ms = 0.0
+        self.serialize_ms = 0.0
+        self.render_ms = 0.0
+        self.total_ms = 0.0
+        self.max_queries = 0
+        self.budget_exceeded = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def add(self, timing, status_code):
+        self.requests += 1
+        self.errors += status_code >= 500
+        self.queries += timing.queries
+        self.max_queries = max(self.max_queries, timing.queries)
+        self.db_ms += timing.db_ms
+        self.serialize_ms += timing.serialize_ms
+        self.render_ms += timing.render_ms
+        self.total_ms += timing.total_ms
+        self.latencies.append(timing.total_ms)
+
+    def summary(self):
+        latencies = np.array(self.latencies)
+        percentiles = (
+            np.percentile(latencies, [50, 95, 99]).round(2).tolist() if len(latencies) else [None] * 3
+        )
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'mean_ms': round(self.total_ms / self.requests, 2),
+            'p50_ms': percentiles[0],
+            'p95_ms': percentiles[1],
+            'p99_ms': percentiles[2],
+            'mean_queries': round(self.queries / self.requests, 2),
+            'max_queries': self.max_queries,
+            'mean_db_ms': round(self.db_ms / self.requests, 2),
+            'mean_serialize_ms': round(self.serialize_ms / self.requests, 2),
+            'mean_render_ms': round(self.render_ms / self.requests, 2),
+            'budget_exceeded': self.budget_exceeded,
+        }
+
+
+def record_request(name, timing, status_code, over_budget=False):
+    with _lock:
+        metrics = _views.get(name)
+        if metrics is None:
+            metrics = _views[name] = ViewMetrics()
+        metrics.add(timing, status_code)
+        if over_budget:
+            metrics.budget_exceeded += 1
+            _counters['budget_exceeded'] += 1
+
+
+def count(counter):
+    with _lock:
+        _counters[counter] += 1
+
+
+def metrics_snapshot():
+    with _lock:
+        views = {name: metrics.summary() for name, metrics in sorted(_views.items())}
+        counters = dict(_counters)
+    return {'views': views, **counters, 'response_cache': cache_stats()}
+
+
+def reset_metrics():
+    with _lock:
+        _views.clear()
+        for counter in _counters:
+            _counters[counter] = 0
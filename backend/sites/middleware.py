@@ -0,0 +1,242 @@
+import cProfile
+import logging
+import random
+import re
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .metrics import count, record_request
+
+logger = logging.getLogger(__name__)
+
+# The RequestTiming of the request being handled, for serializing()
+_current_timing = ContextVar('sites_request_timing', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def cache_tables():
+    """Tables of the configured database caches, whose queries budgets don't count"""
+    return {
+        config['LOCATION'] for config in settings.CACHES.values()
+        if config.get('BACKEND', '').endswith('DatabaseCache')
+    }
+
+
+# Transaction bookkeeping, e.g. around database cache writes
+SAVEPOINT_SQL = r'^\s*(?:RELEASE\s+|ROLLBACK\s+TO\s+)?SAVEPOINT\b'
+
+
+class RequestTiming:
+    """
+    Database, serialization and rendering time of one request, in
+    milliseconds.
+
+    `serialize_ms` is time spent turning rows and models into payload
+    data (see serializing()), which happens inside the view; `render_ms`
+    is encoding that data as JSON or CSV afterwards. `queries` leaves out
+    savepoints and statements on `ignored_tables`.
+    """
+
+    def __init__(self, ignored_tables=()):
+        patterns = [SAVEPOINT_SQL] + [rf'\b{re.escape(table)}\b' for table in ignored_tables]
+        self.ignored = re.compile('|'.join(patterns), re.IGNORECASE)
+        self.queries = 0
+        self.db_ms = 0.0
+        self.serialize_ms = 0.0
+        self.render_ms = 0.0
+        self.total_ms = 0.0
+        self._render_started = None
+        self._serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_ms += (time.perf_counter() - started) * 1000
+            if not self.ignored.search(sql):
+                self.queries += 1
+
+    def start_render(self):
+        self._render_started = time.perf_counter()
+
+    def finish_render(self, response):
+        if self._render_started is not None:
+            self.render_ms += (time.perf_counter() - self._render_started) * 1000
+        return response
+
+    def server_timing(self, cache_status=None):
+        app_ms = max(self.total_ms - self.db_ms - self.serialize_ms - self.render_ms, 0.0)
+        entries = [
+            f'app;dur={app_ms:.2f}',
+            f'db;dur={self.db_ms:.2f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize_ms:.2f}',
+            f'render;dur={self.render_ms:.2f}',
+            f'total;dur={self.total_ms:.2f}',
+        ]
+        if cache_status:
+            entries.append(f'cache;desc="{cache_status}"')
+        return ', '.join(entries)
+
+
+@contextmanager
+def serializing():
+    """
+    Count the enclosed time as the current request's serialization
+    time. Nested uses, e.g. a serializer within a serializer, count once;
+    queries run inside still count as database time too.
+    """
+    timing = _current_timing.get()
+    if timing is None or timing._serializing:
+        yield
+        return
+    timing._serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.serialize_ms += (time.perf_counter() - started) * 1000
+        timing._serializing = False
+
+
+def query_budget(view_func, request):
+    """
+    The view's query budget for this request, if it declares one.
+
+    Viewsets declare `query_budgets`, action -> maximum queries; other
+    views may set a single `query_budget`.
+    """
+    cls = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None)
+    if cls is not None and actions:
+        action = actions.get(request.method.lower())
+        return getattr(cls, 'query_budgets', {}).get(action)
+    return getattr(cls or view_func, 'query_budget', None)
+
+
+def _profile_path(name):
+    directory = Path(getattr(settings, 'PROFILE_DIR', Path(settings.BASE_DIR) / 'profiles'))
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', name)}-{time.time_ns()}.prof"
+
+
+class PerformanceMiddleware:
+    """
+    Time every request and report where the time went.
+
+    Adds a Server-Timing header (app, db, serialize, render, total) and
+    feeds the per-view registry behind /api/metrics/. A
+    PROFILE_SAMPLE_RATE share of requests runs under cProfile, written to
+    PROFILE_DIR; for async requests that profiles the event loop thread,
+    not sync code the view hands to executor threads. Views with
+    a query budget that issue more queries, not counting database cache
+    lookups, log a warning, or fail the request when QUERY_BUDGET_STRICT
+    is on (as it is under the test runner). Works in both sync and async
+    stacks, so async views keep running on the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _enabled(self):
+        return getattr(settings, 'PERFORMANCE_METRICS_ENABLED', True)
+
+    def _start(self, request, stack):
+        timing = request._timing = RequestTiming(cache_tables())
+        request._query_budget = None
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timing))
+        return timing
+
+    def _profile(self, stack):
+        """A running profiler of the calling thread for a sampled request, else None"""
+        if random.random() >= getattr(settings, 'PROFILE_SAMPLE_RATE', 0.0):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another request on this thread is already being profiled
+            return None
+        stack.callback(profiler.disable)
+        return profiler
+
+    def _finish(self, request, response, timing, profiler, started):
+        timing.total_ms = (time.perf_counter() - started) * 1000
+
+        match = request.resolver_match
+        name = match.view_name if match is not None else None
+        if profiler is not None:
+            profiler.dump_stats(_profile_path(name or 'unresolved'))
+            count('profiles_written')
+
+        budget = request._query_budget
+        over_budget = budget is not None and timing.queries > budget
+        if name:
+            record_request(name, timing, response.status_code, over_budget)
+        response['Server-Timing'] = timing.server_timing(response.get('X-Cache'))
+
+        if over_budget:
+            message = f'{name} ran {timing.queries} queries, over its budget of {budget}'
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._enabled():
+            return self.get_response(request)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            timing = self._start(request, stack)
+            stack.callback(_current_timing.reset, _current_timing.set(timing))
+            profiler = self._profile(stack)
+            response = self.get_response(request)
+        return self._finish(request, response, timing, profiler, started)
+
+    async def __acall__(self, request):
+        if not self._enabled():
+            return await self.get_response(request)
+        started = time.perf_counter()
+        stack = ExitStack()
+        # The async ORM runs queries on the request's thread-sensitive
+        # executor thread, whose connections aren't the event loop's
+        timing = await sync_to_async(self._start)(request, stack)
+        token = _current_timing.set(timing)
+        # The view's coroutines run here, so the profiler must too
+        with ExitStack() as profiling:
+            profiler = self._profile(profiling)
+            try:
+                response = await self.get_response(request)
+            finally:
+                _current_timing.reset(token)
+                await sync_to_async(stack.close)()
+        return self._finish(request, response, timing, profiler, started)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, '_timing'):
+            request._query_budget = query_budget(view_func, request)
+
+    def process_template_response(self, request, response):
+        # Called right before a DRF/template response is rendered
+        timing = getattr(request, '_timing', None)
+        if timing is not None:
+            timing.start_render()
+            response.add_post_render_callback(timing.finish_render)
+        return response
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScoreStatistic",
+            fields=[
+                ("stat_id", models.AutoField(primary_key=True, serialize=False)),
+                ("region", models.CharField(max_length=100)),
+                ("land_type", models.CharField(max_length=50)),
+                ("result_count", models.BigIntegerField(default=0)),
+                ("score_sum", models.BigIntegerField(default=0)),
+                ("score_sumsq", models.BigIntegerField(default=0)),
+                (
+                    "min_score",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=5, null=True
+                    ),
+                ),
+                (
+                    "max_score",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=5, null=True
+                    ),
+                ),
+                ("histogram", models.JSONField(default=list)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "score_statistics",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("region", "land_type"),
+                        name="score_statistics_group_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
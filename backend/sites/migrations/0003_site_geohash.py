@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+from sites.geo import encode_geohashes
+
+
+def populate_geohash(apps, schema_editor):
+    Site = apps.get_model("sites", "Site")
+    last_id = 0
+    while True:
+        sites = list(
+            Site.objects.filter(site_id__gt=last_id)
+            .order_by("site_id")
+            .only("site_id", "latitude", "longitude")[:5000]
+        )
+        if not sites:
+            return
+        hashes = encode_geohashes(
+            [float(site.latitude) for site in sites],
+            [float(site.longitude) for site in sites],
+        )
+        for site, geohash in zip(sites, hashes):
+            site.geohash = geohash
+        Site.objects.bulk_update(sites, ["geohash"], batch_size=1000)
+        last_id = sites[-1].site_id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0002_score_statistics"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="site",
+            name="geohash",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=12
+            ),
+        ),
+        migrations.RunPython(populate_geohash, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="site",
+            index=models.Index(
+                fields=["geohash", "latitude", "longitude"],
+                name="sites_geohash_93a4ae_idx",
+            ),
+        ),
+    ]
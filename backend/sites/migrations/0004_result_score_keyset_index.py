@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0003_site_geohash"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="analysisresult",
+            index=models.Index(
+                fields=["total_suitability_score", "result_id"],
+                name="analysis_re_total_s_0bffee_idx",
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="analysisresult",
+            name="analysis_re_total_s_4dec8c_idx",
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0004_result_score_keyset_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="analysisresult",
+            index=models.Index(
+                fields=["site", "result_id"], name="analysis_re_site_id_ebb414_idx"
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="analysisresult",
+            name="analysis_re_site_id_a4fc6d_idx",
+        ),
+    ]
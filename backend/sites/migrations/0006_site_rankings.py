@@ -0,0 +1,106 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def populate_rankings(apps, schema_editor):
+    AnalysisResult = apps.get_model("sites", "AnalysisResult")
+    SiteRanking = apps.get_model("sites", "SiteRanking")
+    latest = (
+        AnalysisResult.objects.values("site_id")
+        .annotate(latest=Max("result_id"))
+        .order_by("site_id")
+        .values_list("latest", flat=True)
+    )
+    result_ids = list(latest)
+    for start in range(0, len(result_ids), 5000):
+        rows = AnalysisResult.objects.filter(
+            result_id__in=result_ids[start : start + 5000]
+        ).values_list(
+            "site_id",
+            "result_id",
+            "site__region",
+            "site__land_type",
+            "total_suitability_score",
+        )
+        SiteRanking.objects.bulk_create(
+            [
+                SiteRanking(
+                    site_id=site_id,
+                    result_id=result_id,
+                    region=region,
+                    land_type=land_type,
+                    total_suitability_score=score,
+                )
+                for site_id, result_id, region, land_type, score in rows
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0005_result_site_latest_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SiteRanking",
+            fields=[
+                (
+                    "site",
+                    models.OneToOneField(
+                        db_column="site_id",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        serialize=False,
+                        to="sites.site",
+                    ),
+                ),
+                ("region", models.CharField(max_length=100)),
+                ("land_type", models.CharField(max_length=50)),
+                (
+                    "total_suitability_score",
+                    models.DecimalField(decimal_places=2, max_digits=5),
+                ),
+                (
+                    "result",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ranking",
+                        to="sites.analysisresult",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "site_rankings",
+                "indexes": [
+                    models.Index(
+                        fields=["total_suitability_score", "result"],
+                        name="site_rankin_total_s_f5cdd7_idx",
+                    ),
+                    models.Index(
+                        fields=["region", "total_suitability_score", "result"],
+                        name="site_rankin_region_248060_idx",
+                    ),
+                    models.Index(
+                        fields=["land_type", "total_suitability_score", "result"],
+                        name="site_rankin_land_ty_41139a_idx",
+                    ),
+                    models.Index(
+                        fields=[
+                            "region",
+                            "land_type",
+                            "total_suitability_score",
+                            "result",
+                        ],
+                        name="site_rankin_region_9df122_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(populate_rankings, migrations.RunPython.noop),
+    ]
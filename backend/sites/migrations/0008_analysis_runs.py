@@ -0,0 +1,94 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0007_jobs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnalysisRun",
+            fields=[
+                ("run_id", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[
+                            ("calculate", "Single-site calculation"),
+                            ("rescore", "Rescore"),
+                            ("import", "Import"),
+                            ("legacy", "Migrated from per-result snapshots"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("weights", models.JSONField(default=dict)),
+                ("weights_hash", models.CharField(max_length=64)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "db_table": "analysis_runs",
+                "indexes": [
+                    models.Index(
+                        fields=["weights_hash", "run_id"],
+                        name="analysis_ru_weights_c2f0d0_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name="analysisresult",
+            name="run",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="results",
+                to="sites.analysisrun",
+            ),
+        ),
+        migrations.CreateModel(
+            name="RunScore",
+            fields=[
+                ("score_id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("solar_irradiance_score", models.PositiveSmallIntegerField()),
+                ("area_score", models.PositiveSmallIntegerField()),
+                ("grid_distance_score", models.PositiveSmallIntegerField()),
+                ("slope_score", models.PositiveSmallIntegerField()),
+                ("infrastructure_score", models.PositiveSmallIntegerField()),
+                ("total_suitability_score", models.PositiveSmallIntegerField()),
+                (
+                    "run",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="scores",
+                        to="sites.analysisrun",
+                    ),
+                ),
+                (
+                    "site",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="sites.site"
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "analysis_run_scores",
+                "indexes": [
+                    models.Index(
+                        fields=["site", "run"], name="analysis_ru_site_id_c9e055_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("run", "site"), name="analysis_run_scores_run_site_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,100 @@
+import hashlib
+import json
+from decimal import Decimal
+
+from django.db import migrations
+
+SCORE_FIELDS = [
+    "solar_irradiance_score",
+    "area_score",
+    "grid_distance_score",
+    "slope_score",
+    "infrastructure_score",
+    "total_suitability_score",
+]
+
+
+def weights_hash(weights):
+    # Same as sites.runs.weights_hash at the time of this migration
+    canonical = {
+        key: float(value)
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+        else value
+        for key, value in (weights or {}).items()
+    }
+    payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def populate_runs(apps, schema_editor):
+    """One legacy run per distinct parameters_snapshot, plus its score history"""
+    AnalysisResult = apps.get_model("sites", "AnalysisResult")
+    AnalysisRun = apps.get_model("sites", "AnalysisRun")
+    RunScore = apps.get_model("sites", "RunScore")
+
+    target = schema_editor.connection.features.supports_update_conflicts_with_target
+    runs = {}
+    first_seen = {}
+    last_id = 0
+    while True:
+        rows = list(
+            AnalysisResult.objects.filter(result_id__gt=last_id)
+            .order_by("result_id")
+            .values_list("result_id", "site_id", "parameters_snapshot", "analysis_timestamp", *SCORE_FIELDS)[:5000]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        by_run = {}
+        history = {}
+        for result_id, site_id, weights, timestamp, *scores in rows:
+            if not isinstance(weights, dict):
+                weights = {}
+            digest = weights_hash(weights)
+            if digest not in runs:
+                runs[digest] = AnalysisRun.objects.create(
+                    source="legacy", weights=weights, weights_hash=digest
+                ).run_id
+                first_seen[runs[digest]] = timestamp
+            run_id = runs[digest]
+            by_run.setdefault(run_id, []).append(result_id)
+            # Later results of the same site and run replace earlier ones
+            history[(run_id, site_id)] = [round(float(score) * 100) for score in scores]
+
+        for run_id, result_ids in by_run.items():
+            AnalysisResult.objects.filter(result_id__in=result_ids).update(run_id=run_id)
+        RunScore.objects.bulk_create(
+            [
+                RunScore(run_id=run_id, site_id=site_id, **dict(zip(SCORE_FIELDS, scores)))
+                for (run_id, site_id), scores in history.items()
+            ],
+            batch_size=1000,
+            update_conflicts=True,
+            # MySQL upserts on any clashing unique key and rejects a target
+            unique_fields=["run", "site"] if target else None,
+            update_fields=SCORE_FIELDS,
+        )
+
+    for run_id, timestamp in first_seen.items():
+        AnalysisRun.objects.filter(run_id=run_id).update(created_at=timestamp)
+
+
+def restore_snapshots(apps, schema_editor):
+    AnalysisResult = apps.get_model("sites", "AnalysisResult")
+    AnalysisRun = apps.get_model("sites", "AnalysisRun")
+    for run in AnalysisRun.objects.all():
+        AnalysisResult.objects.filter(run=run).update(parameters_snapshot=run.weights)
+
+
+class Migration(migrations.Migration):
+    # Data only: MySQL can't roll back DDL, so schema changes stay in
+    # migrations of their own and a failure here leaves nothing half-applied
+
+    dependencies = [
+        ("sites", "0008_analysis_runs"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_runs, restore_snapshots),
+    ]
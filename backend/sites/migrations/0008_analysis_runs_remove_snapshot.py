@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0008_analysis_runs_populate"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="analysisresult",
+            name="parameters_snapshot",
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0008_analysis_runs_remove_snapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScoringCurve",
+            fields=[
+                ("curve_id", models.AutoField(primary_key=True, serialize=False)),
+                ("factor_key", models.CharField(max_length=50, unique=True)),
+                ("field_name", models.CharField(max_length=50)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("score", "Weighted 0-100 score"),
+                            ("multiplier", "Multiplier on the total"),
+                        ],
+                        default="score",
+                        max_length=20,
+                    ),
+                ),
+                ("points", models.JSONField(blank=True, default=list)),
+                ("categories", models.JSONField(blank=True, default=dict)),
+                ("default_value", models.FloatField(blank=True, null=True)),
+                ("description", models.TextField(blank=True, null=True)),
+                ("is_active", models.BooleanField(default=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "scoring_curves",
+            },
+        ),
+        migrations.AddField(
+            model_name="analysisrun",
+            name="curves",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0009_scoring_curves"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="job",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("rescore", "Rescore sites"),
+                    ("import", "Import sites"),
+                    ("export", "Export sites"),
+                    ("sensitivity", "Weight sensitivity sweep"),
+                ],
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0010_job_sensitivity"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SiteProximity",
+            fields=[
+                (
+                    "site",
+                    models.OneToOneField(
+                        db_column="site_id",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="proximity",
+                        serialize=False,
+                        to="sites.site",
+                    ),
+                ),
+                ("nearest_site_km", models.FloatField(blank=True, null=True)),
+                ("neighbour_count", models.IntegerField(default=0)),
+                ("neighbour_density", models.FloatField(default=0)),
+                (
+                    "cluster_id",
+                    models.IntegerField(blank=True, db_index=True, null=True),
+                ),
+                ("cluster_size", models.IntegerField(default=0)),
+                ("computed_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "site_proximity",
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0012_id_sequences"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="analysisrun",
+            name="checkpoint",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,22 @@
-from django.db import models
+from django.db import connections, models, router
+from django.db.models import Exists, OuterRef, Subquery
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+class SiteQuerySet(models.QuerySet):
+
+    def with_current_score(self):
+        """
+        Annotate each site with its latest result's id and total score.
+
+        Both are correlated subqueries that seek the (site, result_id)
+        index, so listing sites with their scores stays a single query.
+        """
+        latest = AnalysisResult.objects.filter(site=OuterRef('pk')).order_by('-result_id')
+        return self.annotate(
+            current_result_id=Subquery(latest.values('result_id')[:1]),
+            current_score=Subquery(latest.values('total_suitability_score')[:1]),
+        )
+
 class Site(models.Model):
     site_id = models.AutoField(primary_key=True)
     site_name = models.CharField(max_length=255)
@@ -14,9 +30,13 @@ class Site(models.Model):
     elevation_m = models.IntegerField()
     land_type = models.CharField(max_length=50)
     region = models.CharField(max_length=100)
+    # Maintained from latitude/longitude on save; backs bbox/radius queries
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = SiteQuerySet.as_manager()
+
     class Meta:
         db_table = 'sites'
         indexes = [
@@ -24,64 +44,67 @@ class Site(models.Model):
             models.Index(fields=['longitude']),
             models.Index(fields=['region']),
             models.Index(fields=['land_type']),
+            models.Index(fields=['geohash', 'latitude', 'longitude']),
         ]
+
+    def save(self, *args, **kwargs):
+        from .db import allocate_ids
+        from .geo import encode_geohash
+
+        self.geohash = encode_geohash(self.latitude, self.longitude)
+        if self._state.adding and self.site_id is None:
+            # Where imports allocate ids themselves, take this one from the same sequence
+            using = kwargs.get('using') or router.db_for_write(Site, instance=self)
+            if not connections[using].features.can_return_rows_from_bulk_insert:
+                self.site_id = allocate_ids(Site, 1, using=using)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
     
     def calculate_suitability_scores(self, weights=None):
         """Calculate suitability scores for this site"""
+        from .curves import get_scoring_model
         from .utils import SuitabilityCalculator
+        from .weights import get_default_weights
         
         if weights is None:
-            # Get default weights from parameters
-            try:
-                from .models import AnalysisParameter
-                weights = {
-                    'solar': float(AnalysisParameter.objects.get(parameter_name='solar_irradiance_weight').weight_value),
-                    'area': float(AnalysisParameter.objects.get(parameter_name='area_weight').weight_value),
-                    'grid': float(AnalysisParameter.objects.get(parameter_name='grid_distance_weight').weight_value),
-                    'slope': float(AnalysisParameter.objects.get(parameter_name='slope_weight').weight_value),
-                    'infrastructure': float(AnalysisParameter.objects.get(parameter_name='infrastructure_weight').weight_value),
-                }
-            except AnalysisParameter.DoesNotExist:
-                weights = {
-                    'solar': 0.35,
-                    'area': 0.25,
-                    'grid': 0.20,
-                    'slope': 0.15,
-                    'infrastructure': 0.05
-                }
+            weights = get_default_weights()
         
-        calculator = SuitabilityCalculator()
-        site_data = {
-            'solar_irradiance_kwh': float(self.solar_irradiance_kwh),
-            'area_sqm': self.area_sqm,
-            'grid_distance_km': float(self.grid_distance_km),
-            'slope_degrees': float(self.slope_degrees),
-            'road_distance_km': float(self.road_distance_km)
-        }
+        model = get_scoring_model()
+        calculator = SuitabilityCalculator(model)
+        site_data = {}
+        for field in model.fields:
+            value = getattr(self, field)
+            site_data[field] = value if value is None or field in model.category_fields else float(value)
         
         total_score, breakdown = calculator.calculate(site_data, weights)
         
-        # Create or update analysis result
-        analysis_result, created = AnalysisResult.objects.update_or_create(
-            site=self,
-            defaults={
-                'solar_irradiance_score': breakdown['solar'],
-                'area_score': breakdown['area'],
-                'grid_distance_score': breakdown['grid'],
-                'slope_score': breakdown['slope'],
-                'infrastructure_score': breakdown['infrastructure'],
-                'total_suitability_score': total_score,
-                'parameters_snapshot': weights
-            }
-        )
-        
+        # Update the latest analysis result, or create the first one
+        from .runs import record_scores, run_for_weights
+
+        run = run_for_weights(weights, 'calculate', model.overrides)
+        scores = {
+            'solar_irradiance_score': round(breakdown['solar'], 2),
+            'area_score': round(breakdown['area'], 2),
+            'grid_distance_score': round(breakdown['grid'], 2),
+            'slope_score': round(breakdown['slope'], 2),
+            'infrastructure_score': round(breakdown['infrastructure'], 2),
+            'total_suitability_score': total_score,
+        }
+        analysis_result = self.get_latest_score()
+        if analysis_result is None:
+            analysis_result = AnalysisResult(site=self)
+        for field, value in scores.items():
+            setattr(analysis_result, field, value)
+        analysis_result.run = run
+        analysis_result.save()
+        record_scores(run, [self.site_id], [total_score], {key: [value] for key, value in breakdown.items()})
+
         return analysis_result
     def get_latest_score(self):
         """Get the latest analysis result for this site"""
-        try:
-            return AnalysisResult.objects.filter(site=self).latest('analysis_timestamp')
-        except AnalysisResult.DoesNotExist:
-            return None
+        return self.analysisresult_set.order_by('-result_id').first()
 class AnalysisParameter(models.Model):
     param_id = models.AutoField(primary_key=True)
     parameter_name = models.CharField(max_length=100, unique=True)
@@ -98,6 +121,82 @@ class AnalysisParameter(models.Model):
     class Meta:
         db_table = 'analysis_parameters'
 
+class ScoringCurve(models.Model):
+    """
+    A factor curve overriding one of the built-in ones or adding a factor;
+    see curves.py for how the definitions are evaluated.
+    """
+    KIND_CHOICES = [
+        ('score', 'Weighted 0-100 score'),
+        ('multiplier', 'Multiplier on the total'),
+    ]
+
+    curve_id = models.AutoField(primary_key=True)
+    factor_key = models.CharField(max_length=50, unique=True)
+    field_name = models.CharField(max_length=50)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='score')
+    # [[x, y], ...] breakpoints of a numeric attribute
+    points = models.JSONField(default=list, blank=True)
+    # value -> y of a categorical attribute, with default_value for the rest
+    categories = models.JSONField(default=dict, blank=True)
+    default_value = models.FloatField(null=True, blank=True)
+    description = models.TextField(blank=True, null=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'scoring_curves'
+
+    def spec(self):
+        """The curve definition in the DEFAULT_CURVES format"""
+        spec = {'field': self.field_name, 'kind': self.kind}
+        if self.categories:
+            spec['categories'] = self.categories
+            if self.default_value is not None:
+                spec['default'] = self.default_value
+        else:
+            spec['points'] = self.points
+        return spec
+
+class AnalysisResultQuerySet(models.QuerySet):
+
+    def latest_per_site(self):
+        """Each site's most recent result"""
+        newer = AnalysisResult.objects.filter(site=OuterRef('site'), result_id__gt=OuterRef('result_id'))
+        return self.filter(~Exists(newer))
+
+    def superseded(self):
+        """Results with a newer result for the same site"""
+        newer = AnalysisResult.objects.filter(site=OuterRef('site'), result_id__gt=OuterRef('result_id'))
+        return self.filter(Exists(newer))
+
+class AnalysisRun(models.Model):
+    """One scoring pass and the weights it used, stored once for all its results"""
+    SOURCE_CHOICES = [
+        ('calculate', 'Single-site calculation'),
+        ('rescore', 'Rescore'),
+        ('import', 'Import'),
+        ('legacy', 'Migrated from per-result snapshots'),
+    ]
+
+    run_id = models.AutoField(primary_key=True)
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    weights = models.JSONField(default=dict)
+    # SHA-256 of the canonical weights JSON, to find runs with the same weights
+    weights_hash = models.CharField(max_length=64)
+    # Curve definitions that differed from the built-in ones, keyed by factor
+    curves = models.JSONField(default=dict, blank=True)
+    # An import's summary as of its last committed chunk, to resume from
+    checkpoint = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'analysis_runs'
+        indexes = [
+            models.Index(fields=['weights_hash', 'run_id']),
+        ]
+
 class AnalysisResult(models.Model):
     result_id = models.AutoField(primary_key=True)
     site = models.ForeignKey(Site, on_delete=models.CASCADE)
@@ -108,16 +207,24 @@ class AnalysisResult(models.Model):
     infrastructure_score = models.DecimalField(max_digits=5, decimal_places=2)
     total_suitability_score = models.DecimalField(max_digits=5, decimal_places=2)
     analysis_timestamp = models.DateTimeField(auto_now_add=True)
-    parameters_snapshot = models.JSONField(blank=True, null=True)
+    run = models.ForeignKey(AnalysisRun, on_delete=models.PROTECT, null=True, blank=True, related_name='results')
+
+    objects = AnalysisResultQuerySet.as_manager()
 
     class Meta:
         db_table = 'analysis_results'
         indexes = [
-            models.Index(fields=['total_suitability_score']),
-            models.Index(fields=['site']),
+            models.Index(fields=['total_suitability_score', 'result_id']),
+            # "Latest result per site" lookups
+            models.Index(fields=['site', 'result_id']),
             models.Index(fields=['analysis_timestamp']),
         ]
     
+    @property
+    def parameters_snapshot(self):
+        """The weights this result was scored with"""
+        return self.run.weights if self.run_id else None
+
     def get_score_breakdown(self):
         """Return score breakdown as dictionary"""
         return {
@@ -127,4 +234,131 @@ class AnalysisResult(models.Model):
             'slope': float(self.slope_score),
             'infrastructure': float(self.infrastructure_score),
             'total': float(self.total_suitability_score)
-        }
\ No newline at end of file
+        }
+
+class RunScore(models.Model):
+    """
+    One site's scores in one run: the compact, append-only score history.
+
+    Scores are stored in hundredths of a point (0-10000) so each fits a
+    small integer column.
+    """
+    score_id = models.BigAutoField(primary_key=True)
+    run = models.ForeignKey(AnalysisRun, on_delete=models.CASCADE, related_name='scores')
+    site = models.ForeignKey(Site, on_delete=models.CASCADE)
+    solar_irradiance_score = models.PositiveSmallIntegerField()
+    area_score = models.PositiveSmallIntegerField()
+    grid_distance_score = models.PositiveSmallIntegerField()
+    slope_score = models.PositiveSmallIntegerField()
+    infrastructure_score = models.PositiveSmallIntegerField()
+    total_suitability_score = models.PositiveSmallIntegerField()
+
+    class Meta:
+        db_table = 'analysis_run_scores'
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'site'], name='analysis_run_scores_run_site_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['site', 'run']),
+        ]
+
+class SiteRanking(models.Model):
+    """Each site's current (latest) result, indexed for top-N reads"""
+    site = models.OneToOneField(Site, on_delete=models.CASCADE, primary_key=True, db_column='site_id')
+    result = models.OneToOneField(AnalysisResult, on_delete=models.CASCADE, related_name='ranking')
+    region = models.CharField(max_length=100)
+    land_type = models.CharField(max_length=50)
+    total_suitability_score = models.DecimalField(max_digits=5, decimal_places=2)
+
+    class Meta:
+        db_table = 'site_rankings'
+        indexes = [
+            models.Index(fields=['total_suitability_score', 'result']),
+            models.Index(fields=['region', 'total_suitability_score', 'result']),
+            models.Index(fields=['land_type', 'total_suitability_score', 'result']),
+            models.Index(fields=['region', 'land_type', 'total_suitability_score', 'result']),
+        ]
+
+class SiteProximity(models.Model):
+    """Neighbour density and cluster of each site, from update_proximity"""
+    site = models.OneToOneField(Site, on_delete=models.CASCADE, primary_key=True, db_column='site_id',
+                                related_name='proximity')
+    nearest_site_km = models.FloatField(null=True, blank=True)
+    neighbour_count = models.IntegerField(default=0)
+    # Other sites per km² within the neighbour radius
+    neighbour_density = models.FloatField(default=0)
+    # Smallest site_id of the site's cluster; null for sites in none
+    cluster_id = models.IntegerField(null=True, blank=True, db_index=True)
+    cluster_size = models.IntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'site_proximity'
+
+class ScoreStatistic(models.Model):
+    """Running totals of total_suitability_score per (region, land_type)"""
+    stat_id = models.AutoField(primary_key=True)
+    region = models.CharField(max_length=100)
+    land_type = models.CharField(max_length=50)
+    result_count = models.BigIntegerField(default=0)
+    # Sums are kept in hundredths of a point so incremental updates are exact
+    score_sum = models.BigIntegerField(default=0)
+    score_sumsq = models.BigIntegerField(default=0)
+    min_score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    max_score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    histogram = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'score_statistics'
+        constraints = [
+            models.UniqueConstraint(fields=['region', 'land_type'], name='score_statistics_group_uniq'),
+        ]
+
+class IdSequence(models.Model):
+    """
+    The last primary key handed out for a table, on backends whose bulk
+    inserts don't return keys; see db.allocate_ids
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'id_sequences'
+
+class Job(models.Model):
+    """A long-running operation queued for the job worker"""
+    KIND_CHOICES = [
+        ('rescore', 'Rescore sites'),
+        ('import', 'Import sites'),
+        ('export', 'Export sites'),
+        ('sensitivity', 'Weight sensitivity sweep'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    job_id = models.AutoField(primary_key=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    params = models.JSONField(default=dict, blank=True)
+    processed = models.BigIntegerField(default=0)
+    total = models.BigIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    cancel_requested = models.BooleanField(default=False)
+    worker = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'jobs'
+        indexes = [
+            models.Index(fields=['status', 'job_id']),
+        ]
@@ -0,0 +1,155 @@
+import base64
+import json
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(values):
+    payload = json.dumps([str(v) if isinstance(v, Decimal) else v for v in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise NotFound('Invalid cursor.')
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only keyset pagination over a unique, indexed ordering.
+
+    Unlike offset pagination, fetching a deep page is a range read that
+    starts right after the previous page's last row, so page 5000 costs
+    the same as page 1. ``limit`` sets the page size, as it did with
+    LimitOffsetPagination. Querysets may be model or ``.values()``
+    querysets as long as the ordering fields are selected.
+    """
+    ordering = ('pk',)
+    page_size = 20
+    max_page_size = 1000
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def _after(self, values):
+        # (a, b) > (x, y) expanded for mixed ascending/descending columns
+        clauses = []
+        for i, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {f.lstrip('-'): v for f, v in zip(self.ordering[:i], values)}
+            clauses.append(Q(**equal, **{f'{name}__{lookup}': values[i]}))
+        # The redundant bound on the leading column lets the database turn
+        # the OR into a single index range scan.
+        first = self.ordering[0]
+        bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": values[0]})
+        return bound & reduce(or_, clauses)
+
+    def _key(self, row):
+        names = [field.lstrip('-') for field in self.ordering]
+        if isinstance(row, dict):
+            return [row[name] for name in names]
+        return [getattr(row, name) for name in names]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = queryset.order_by(*self.ordering)
+
+        def fetch(after, count):
+            if after is not None:
+                return list(queryset.filter(self._after(after))[:count])
+            return list(queryset[:count])
+        return self.paginate_fetch(fetch, request)
+
+    async def apaginate_queryset(self, queryset, request):
+        """paginate_queryset() for async views, reading with the async ORM"""
+        queryset = queryset.order_by(*self.ordering)
+
+        async def fetch(after, count):
+            rows = queryset.filter(self._after(after)) if after is not None else queryset
+            return [row async for row in rows[:count]]
+        return await self.apaginate_fetch(fetch, request)
+
+    def paginate_fetch(self, fetch, request):
+        """
+        Paginate rows from any source that can produce them in order.
+
+        `fetch(after, count)` returns up to `count` rows following the
+        cursor values `after` (None for the first page).
+        """
+        page_size = self._start(request)
+        return self._finish(fetch(self._cursor_values(request), page_size + 1), page_size)
+
+    async def apaginate_fetch(self, fetch, request):
+        """paginate_fetch() with a coroutine `fetch`"""
+        page_size = self._start(request)
+        return self._finish(await fetch(self._cursor_values(request), page_size + 1), page_size)
+
+    def _start(self, request):
+        self.request = request
+        return self.get_page_size(request)
+
+    def _cursor_values(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        values = decode_cursor(cursor)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound('Invalid cursor.')
+        return values
+
+    def _finish(self, rows, page_size):
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.next_cursor = encode_cursor(self._key(rows[-1])) if self.has_next else None
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class SiteKeysetPagination(KeysetPagination):
+    ordering = ('site_id',)
+
+
+class ResultKeysetPagination(KeysetPagination):
+    ordering = ('-total_suitability_score', '-result_id')
@@ -0,0 +1,92 @@
+import decimal
+from functools import lru_cache
+
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .middleware import serializing
+
+
+def _decimal_formatter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.normalize_output or field.localize:
+        return field.to_representation
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.Context(prec=field.max_digits, rounding=field.rounding)
+
+    def format_decimal(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return f'{value.quantize(exponent, context=context):f}'
+    return format_decimal
+
+
+def _datetime_formatter(field):
+    current = getattr(field, 'timezone', None) or field.default_timezone() or timezone.get_default_timezone()
+
+    def format_datetime(value):
+        value = value.astimezone(current).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return format_datetime
+
+
+def _formatter(field):
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_formatter(field)
+    if isinstance(field, serializers.DateTimeField):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        if output_format and output_format.lower() == ISO_8601:
+            return _datetime_formatter(field)
+    if isinstance(field, serializers.FloatField):
+        return float
+    if isinstance(field, (serializers.CharField, serializers.IntegerField, serializers.JSONField,
+                          serializers.BooleanField, serializers.PrimaryKeyRelatedField)):
+        return None
+    return field.to_representation
+
+
+@lru_cache(maxsize=None)
+def renderer_for(serializer_class):
+    return ValuesRenderer(serializer_class)
+
+
+class ValuesRenderer:
+    """
+    Build list payloads straight from ``.values()`` rows.
+
+    Produces the same keys and value formats as `serializer_class` for its
+    read-only fields, without instantiating model or serializer objects
+    per row. Only plain fields and dotted ``source`` paths are supported;
+    anything needing a method or nested serializer should use the regular
+    serializer.
+    """
+
+    def __init__(self, serializer_class):
+        self.columns = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.PrimaryKeyRelatedField):
+                source = field.source
+            else:
+                source = field.source.replace('.', '__')
+            self.columns.append((name, source, _formatter(field)))
+
+    @property
+    def sources(self):
+        return [source for _, source, _ in self.columns]
+
+    def values(self, queryset):
+        return queryset.values(*self.sources)
+
+    def render(self, rows):
+        columns = self.columns
+        with serializing():
+            return [
+                {
+                    name: row[source] if fmt is None or row[source] is None else fmt(row[source])
+                    for name, source, fmt in columns
+                }
+                for row in rows
+            ]
@@ -0,0 +1,603 @@
+"""
+Proximity features recomputed from infrastructure datasets.
+
+grid_distance_km and road_distance_km arrive with the import file and
+go stale as the network changes. update_proximity() recomputes them from
+local substation and road datasets (CSV or GeoJSON, points or lines),
+adds each site's neighbour density and cluster, writes back only the
+rows that changed and rescores those sites.
+
+Nearest-neighbour and radius queries run on a PointIndex: scikit-learn's
+BallTree with the haversine metric, or SciPy's cKDTree over unit
+vectors, when either is installed, and an exact NumPy grid index
+otherwise. Distances to lines are exact distances to their segments,
+not to their vertices (FeatureIndex).
+"""
+import importlib
+import json
+import math
+import time
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+
+from .curves import get_scoring_model
+from .db import bulk_upsert
+from .geo import EARTH_RADIUS_KM, chord_to_km, km_to_chord, unit_vectors
+from .ingest import NUMERIC_COLUMNS
+from .models import Site, SiteProximity
+from .runs import start_run
+from .services import iter_site_chunks, write_results
+from .snapshot import invalidate_snapshot
+from .utils import SuitabilityCalculator
+from .weights import get_default_weights
+from .whatif import result_columns
+
+DEFAULT_CHUNK_SIZE = 2000
+NEIGHBOUR_RADIUS_KM = 5.0
+# Sites within this distance of each other chain into one cluster, as
+# long as every link is a site with at least CLUSTER_MIN_SITES around it
+CLUSTER_DISTANCE_KM = 2.0
+CLUSTER_MIN_SITES = 5
+
+INDEX_BACKENDS = ('sklearn', 'scipy', 'numpy')
+# Longest piece lines are split into; pieces are indexed by their midpoint
+PIECE_KM = 1.0
+# Added to search radii so rounding can't drop a candidate at the edge
+RADIUS_SLACK_KM = 0.001
+# Query/candidate pairs the NumPy index compares at once
+MAX_PAIRS = 2000000
+# Queries looked up at once
+QUERY_BATCH = 8192
+# Smallest NumPy index cell, as a chord of the unit sphere (~64 m)
+MIN_CELL = 1e-5
+# Ratio between the cell sizes of successive NumPy index levels
+LEVEL_RATIO = 2
+
+LATITUDE_COLUMNS = ('latitude', 'lat')
+LONGITUDE_COLUMNS = ('longitude', 'lon', 'lng')
+# CSV column grouping consecutive rows into one line
+LINE_COLUMNS = ('line_id', 'road_id')
+
+# Field -> dataset its distance is measured to
+DISTANCE_FIELDS = {'grid_distance_km': 'substations', 'road_distance_km': 'roads'}
+
+# Cell offsets of a cell and its 26 neighbours
+OFFSETS = np.array([(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)], dtype=np.int64)
+
+
+def _column(frame, names, path):
+    columns = {column.lower(): column for column in frame.columns}
+    for name in names:
+        if name in columns:
+            return columns[name]
+    raise ValueError(f"{path}: needs one of the columns {', '.join(names)}")
+
+
+def _geojson_geometries(data):
+    if data.get('type') == 'FeatureCollection':
+        for feature in data.get('features', []):
+            yield from _geojson_geometries(feature)
+    elif data.get('type') == 'Feature':
+        if data.get('geometry'):
+            yield from _geojson_geometries(data['geometry'])
+    elif data.get('type') == 'GeometryCollection':
+        for geometry in data.get('geometries', []):
+            yield from _geojson_geometries(geometry)
+    else:
+        yield data
+
+
+def _read_geojson(path):
+    with open(path) as f:
+        data = json.load(f)
+    lines = []
+    for geometry in _geojson_geometries(data):
+        kind, coordinates = geometry.get('type'), geometry.get('coordinates')
+        # GeoJSON positions are [longitude, latitude]
+        if kind == 'Point':
+            lines.append([coordinates[1::-1]])
+        elif kind == 'MultiPoint':
+            lines.extend([position[1::-1]] for position in coordinates)
+        elif kind == 'LineString':
+            lines.append([position[1::-1] for position in coordinates])
+        elif kind == 'MultiLineString':
+            lines.extend([position[1::-1] for position in line] for line in coordinates)
+        else:
+            raise ValueError(f"{path}: unsupported geometry type {kind!r}")
+    return lines
+
+
+def _read_csv(path):
+    frame = pd.read_csv(path)
+    latitude = _column(frame, LATITUDE_COLUMNS, path)
+    longitude = _column(frame, LONGITUDE_COLUMNS, path)
+    frame = frame.dropna(subset=[latitude, longitude])
+    coordinates = frame[[latitude, longitude]].to_numpy(dtype=np.float64)
+
+    line = next((frame.columns[i] for i, name in enumerate(frame.columns.str.lower()) if name in LINE_COLUMNS), None)
+    if line is None:
+        return coordinates[:, None, :]
+    # Consecutive rows with the same id form one line
+    ids = frame[line].to_numpy()
+    return np.split(coordinates, np.flatnonzero(ids[1:] != ids[:-1]) + 1)
+
+
+def load_features(path):
+    """
+    (starts, ends) of the segments of the features in a CSV or GeoJSON
+    file, rows of (latitude, longitude). A point is a segment that starts
+    where it ends. CSV rows are points, unless a line_id or road_id
+    column groups consecutive rows into lines.
+    """
+    if str(path).lower().endswith(('.geojson', '.json')):
+        lines = _read_geojson(path)
+    else:
+        lines = _read_csv(path)
+
+    starts, ends = [], []
+    for line in lines:
+        line = np.asarray(line, dtype=np.float64).reshape(-1, 2)
+        if len(line) == 1:
+            line = np.repeat(line, 2, axis=0)
+        starts.append(line[:-1])
+        ends.append(line[1:])
+    if not starts or not sum(map(len, starts)):
+        raise ValueError(f"{path}: no features found")
+    starts, ends = np.concatenate(starts), np.concatenate(ends)
+    if np.any(np.abs(starts[:, 0]) > 90) or np.any(np.abs(starts[:, 1]) > 180) \
+            or np.any(np.abs(ends[:, 0]) > 90) or np.any(np.abs(ends[:, 1]) > 180):
+        raise ValueError(f"{path}: coordinates out of range; expected latitude/longitude in degrees")
+    return starts, ends
+
+
+def _normalized(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1)[:, None]
+
+
+def split_segments(a, b, piece_km=PIECE_KM):
+    """
+    Unit-vector segments `a` -> `b` cut into pieces of at most
+    `piece_km`, along the great circle: (piece starts, piece ends).
+    """
+    lengths = chord_to_km(np.linalg.norm(b - a, axis=1))
+    pieces = np.maximum(np.ceil(lengths / piece_km), 1).astype(np.int64)
+    segment = np.repeat(np.arange(len(a)), pieces)
+    step = np.arange(pieces.sum()) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    a, ab = a[segment], (b - a)[segment]
+    return (_normalized(a + (step / pieces[segment])[:, None] * ab),
+            _normalized(a + ((step + 1) / pieces[segment])[:, None] * ab))
+
+
+def segment_chords(queries, a, b):
+    """
+    Straight-line distance from each of `queries` to the chord a-b, all
+    unit vectors. Within 2 cm of the surface distance for 1 km pieces.
+    """
+    ab = b - a
+    length = np.square(ab).sum(axis=1)
+    t = np.clip(((queries - a) * ab).sum(axis=1) / np.where(length > 0, length, 1), 0.0, 1.0)
+    return np.sqrt(np.square(queries - a - t[:, None] * ab).sum(axis=1))
+
+
+def index_backend():
+    """The fastest spatial index installed: 'sklearn', 'scipy' or 'numpy'"""
+    for backend, module in (('sklearn', 'sklearn.neighbors'), ('scipy', 'scipy.spatial')):
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            continue
+        return backend
+    return 'numpy'
+
+
+def _cell_keys(cells, cell):
+    # One int64 per integer cell coordinate triple
+    span = int(2 / cell) + 3
+    base = 2 * span + 1
+    return ((cells[:, 0] + span) * base + cells[:, 1] + span) * base + cells[:, 2] + span
+
+
+class _GridIndex:
+    """
+    Exact NumPy fallback: the unit vectors bucketed into cubic cells at
+    several sizes, each LEVEL_RATIO times the last.
+
+    Every point within one cell width of a query lies in the 27 cells
+    around the query's cell, so a query whose best candidate there is
+    that close is answered exactly; the rest move on to the next,
+    coarser level. Radius queries use the finest level at least
+    as wide as the radius.
+    """
+
+    def __init__(self, xyz):
+        self.xyz = xyz
+        # The finest cells hold a few points each over the area covered
+        extent = np.sort(np.ptp(xyz, axis=0))
+        cell = max(2 * math.sqrt(extent[1] * extent[2] / len(xyz)), MIN_CELL)
+        self.levels = [cell]
+        while cell < 2:
+            cell *= LEVEL_RATIO
+            self.levels.append(cell)
+        self._grids = {}
+
+    def _grid(self, cell):
+        if cell not in self._grids:
+            keys = _cell_keys(np.floor(self.xyz / cell).astype(np.int64), cell)
+            order = np.argsort(keys, kind='stable')
+            unique, starts = np.unique(keys[order], return_index=True)
+            self._grids[cell] = (order, unique, starts, np.append(starts[1:], len(order)))
+        return self._grids[cell]
+
+    def candidate_pairs(self, queries, rows, cell, exclude=None):
+        """
+        Yield (rows, points, squared chords) for the query `rows` and the
+        points in the 27 cells around each, at most MAX_PAIRS at a time.
+        `exclude`, per query row, is a point index to leave out.
+        """
+        order, keys, starts, ends = self._grid(cell)
+        for first in range(0, len(rows), QUERY_BATCH):
+            batch = rows[first:first + QUERY_BATCH]
+            cells = np.floor(queries[batch] / cell).astype(np.int64)
+            wanted = _cell_keys((cells[:, None, :] + OFFSETS).reshape(-1, 3), cell)
+            position = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+            found = keys[position] == wanted
+            low = np.where(found, starts[position], 0)
+            counts = np.where(found, ends[position] - starts[position], 0)
+
+            per_row = counts.reshape(-1, len(OFFSETS)).sum(axis=1)
+            total = np.cumsum(per_row)
+            cuts = np.unique(np.searchsorted(total, np.arange(MAX_PAIRS, total[-1], MAX_PAIRS), side='right'))
+            for a, b in zip(np.r_[0, cuts], np.r_[cuts, len(batch)]):
+                if a == b:
+                    continue
+                span_low = low[a * len(OFFSETS):b * len(OFFSETS)]
+                span_counts = counts[a * len(OFFSETS):b * len(OFFSETS)]
+                owner = np.repeat(np.arange(len(span_counts)), span_counts)
+                offset = np.arange(len(owner)) - np.repeat(np.cumsum(span_counts) - span_counts, span_counts)
+                query_rows = batch[a + owner // len(OFFSETS)]
+                points = order[span_low[owner] + offset]
+                if exclude is not None:
+                    keep = points != exclude[query_rows]
+                    query_rows, points = query_rows[keep], points[keep]
+                if not len(points):
+                    continue
+                yield query_rows, points, np.square(queries[query_rows] - self.xyz[points]).sum(axis=1)
+
+    def nearest(self, queries, exclude=None):
+        """(chord, index) of the nearest point to each query"""
+        best = np.full(len(queries), np.inf)
+        index = np.full(len(queries), -1, dtype=np.int64)
+        pending = np.arange(len(queries))
+        for level, cell in enumerate(self.levels):
+            for rows, points, squared in self.candidate_pairs(queries, pending, cell, exclude):
+                # Pairs come grouped by query row
+                starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+                group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(rows)]))
+                closest = np.minimum.reduceat(squared, starts)
+                hit = np.flatnonzero(squared == closest[group])
+                first = hit[np.r_[True, group[hit][1:] != group[hit][:-1]]]
+                rows, points, squared = rows[first], points[first], squared[first]
+                better = squared < best[rows]
+                best[rows[better]] = squared[better]
+                index[rows[better]] = points[better]
+            if level == len(self.levels) - 1:
+                break
+            # The 27 cells reach past the query by a cell width plus its
+            # distance to the nearest face of its own cell
+            position = queries[pending] / cell
+            margin = cell * (1 + np.minimum(position - np.floor(position), np.ceil(position) - position).min(axis=1))
+            pending = pending[best[pending] > margin * margin]
+            if not len(pending):
+                break
+        return np.sqrt(best), index
+
+    def within(self, queries, radius, exclude=None):
+        """
+        Yield (query rows, points) pairs no more than chord `radius` apart,
+        one radius for all queries or one per query. Each query is looked
+        up at the finest level at least as wide as its radius.
+        """
+        radius = np.broadcast_to(np.asarray(radius, dtype=np.float64), (len(queries),))
+        levels = np.minimum(np.searchsorted(self.levels, radius), len(self.levels) - 1)
+        for level in np.unique(levels):
+            rows = np.flatnonzero(levels == level)
+            for rows, points, squared in self.candidate_pairs(queries, rows, self.levels[level], exclude):
+                close = squared <= np.square(radius[rows])
+                yield rows[close], points[close]
+
+
+class PointIndex:
+    """Nearest-neighbour and radius queries over locations on the sphere"""
+
+    def __init__(self, latitudes, longitudes, backend=None):
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        if not len(latitudes):
+            raise ValueError("Nothing to index")
+        self.size = len(latitudes)
+        self.latitudes, self.longitudes = latitudes, longitudes
+        self.backend = backend or index_backend()
+        if self.backend not in INDEX_BACKENDS:
+            raise ValueError(f"Unknown index backend: {self.backend}")
+        self.xyz = unit_vectors(latitudes, longitudes)
+        if self.backend == 'sklearn':
+            from sklearn.neighbors import BallTree
+
+            self.radians = np.radians(np.column_stack([latitudes, longitudes]))
+            self.tree = BallTree(self.radians, metric='haversine')
+        elif self.backend == 'scipy':
+            from scipy.spatial import cKDTree
+
+            self.tree = cKDTree(self.xyz)
+        else:
+            self.tree = _GridIndex(self.xyz)
+
+    def nearest(self, latitudes, longitudes):
+        """(distance_km, index) of the closest indexed location to each location"""
+        if self.backend == 'sklearn':
+            distance, index = self.tree.query(np.radians(np.column_stack([latitudes, longitudes])), k=1)
+            return distance[:, 0] * EARTH_RADIUS_KM, index[:, 0]
+        queries = unit_vectors(latitudes, longitudes)
+        if self.backend == 'scipy':
+            chord, index = self.tree.query(queries, k=1)
+        else:
+            chord, index = self.tree.nearest(queries)
+        return chord_to_km(chord), index
+
+    def nearest_other(self):
+        """(distance_km, index) of each indexed location's closest other location"""
+        if self.size == 1:
+            return np.array([np.inf]), np.array([-1])
+        if self.backend == 'sklearn':
+            distance, index = self.tree.query(self.radians, k=2)
+            distance = distance * EARTH_RADIUS_KM
+        elif self.backend == 'scipy':
+            chord, index = self.tree.query(self.xyz, k=2)
+            distance = chord_to_km(chord)
+        else:
+            chord, index = self.tree.nearest(self.xyz, exclude=np.arange(self.size))
+            return chord_to_km(chord), index
+        # Locations that coincide may come back in either order
+        own = index[:, 0] == np.arange(self.size)
+        return np.where(own, distance[:, 1], distance[:, 0]), np.where(own, index[:, 1], index[:, 0])
+
+    def within(self, latitudes, longitudes, radius_km):
+        """
+        Yield (location rows, indexed locations) of the pairs at most
+        `radius_km` apart, one radius for all locations or one per location.
+        """
+        radius_km = np.broadcast_to(np.asarray(radius_km, dtype=np.float64), (len(latitudes),))
+        if self.backend == 'numpy':
+            yield from self.tree.within(unit_vectors(latitudes, longitudes), km_to_chord(radius_km))
+            return
+        for start in range(0, len(latitudes), QUERY_BATCH):
+            rows = slice(start, start + QUERY_BATCH)
+            if self.backend == 'sklearn':
+                queries = np.radians(np.column_stack([latitudes[rows], longitudes[rows]]))
+                found = self.tree.query_radius(queries, radius_km[rows] / EARTH_RADIUS_KM)
+            else:
+                found = self.tree.query_ball_point(unit_vectors(latitudes[rows], longitudes[rows]),
+                                                   km_to_chord(radius_km[rows]))
+            counts = [len(points) for points in found]
+            if sum(counts):
+                yield (np.repeat(np.arange(start, start + len(found)), counts),
+                       np.concatenate([np.asarray(points, dtype=np.int64) for points in found]))
+
+    def pairs_within(self, radius_km):
+        """(i, j) index pairs, i < j, of indexed locations at most `radius_km` apart"""
+        if self.backend == 'scipy':
+            pairs = self.tree.query_pairs(float(km_to_chord(radius_km)), output_type='ndarray')
+            return pairs[:, 0].astype(np.int64), pairs[:, 1].astype(np.int64)
+        if self.backend == 'sklearn':
+            found = list(self.within(self.latitudes, self.longitudes, radius_km))
+        else:
+            found = list(self.tree.within(self.xyz, float(km_to_chord(radius_km)), exclude=np.arange(self.size)))
+        i = np.concatenate([rows for rows, _ in found] or [np.zeros(0, dtype=np.int64)])
+        j = np.concatenate([points for _, points in found] or [np.zeros(0, dtype=np.int64)])
+        lower = i < j
+        return i[lower], j[lower]
+
+
+class FeatureIndex:
+    """
+    Distance to the nearest of a set of points and lines.
+
+    Segments are cut into pieces of at most PIECE_KM and a PointIndex
+    holds the piece midpoints. The piece with the nearest midpoint gives
+    each query an upper bound on its distance; every piece that could
+    beat it has its midpoint within the bound plus half the longest
+    piece, and the exact distances to those pieces decide.
+    """
+
+    def __init__(self, starts, ends, backend=None, piece_km=PIECE_KM):
+        self.features = len(starts)
+        self.a, self.b = split_segments(unit_vectors(starts[:, 0], starts[:, 1]),
+                                        unit_vectors(ends[:, 0], ends[:, 1]), piece_km)
+        middle = _normalized(self.a + self.b)
+        self.reach_km = float(chord_to_km(np.linalg.norm(self.b - self.a, axis=1).max() / 2))
+        self.midpoints = PointIndex(np.degrees(np.arcsin(np.clip(middle[:, 2], -1, 1))),
+                                    np.degrees(np.arctan2(middle[:, 1], middle[:, 0])), backend)
+
+    def nearest(self, latitudes, longitudes):
+        """Distance in km from each location to the nearest feature"""
+        queries = unit_vectors(latitudes, longitudes)
+        _, first = self.midpoints.nearest(latitudes, longitudes)
+        best = segment_chords(queries, self.a[first], self.b[first])
+        radius = chord_to_km(best) + self.reach_km + RADIUS_SLACK_KM
+        for rows, pieces in self.midpoints.within(latitudes, longitudes, radius):
+            np.minimum.at(best, rows, segment_chords(queries[rows], self.a[pieces], self.b[pieces]))
+        return chord_to_km(best)
+
+
+def cluster_labels(size, i, j, min_sites=CLUSTER_MIN_SITES):
+    """
+    DBSCAN over `size` points linked by the (i, j) pairs within the
+    cluster distance: points with at least `min_sites` counting
+    themselves are core, linked cores share a cluster and other points
+    join the cluster of a core they link to.
+
+    Returns each point's cluster as the lowest index in it, or -1.
+    Clusters are found by label propagation with pointer jumping, a few
+    passes over the links rather than a traversal per point.
+    """
+    degree = np.bincount(i, minlength=size) + np.bincount(j, minlength=size)
+    core = degree + 1 >= min_sites
+    both = core[i] & core[j]
+    a, b = i[both], j[both]
+
+    labels = np.arange(size)
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        updated = labels.copy()
+        np.minimum.at(updated, a, low)
+        np.minimum.at(updated, b, low)
+        # A label is always a point of the same cluster with a lower index
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+
+    border = np.full(size, size)
+    for x, y in ((i, j), (j, i)):
+        link = core[y] & ~core[x]
+        np.minimum.at(border, x[link], labels[y[link]])
+    return np.where(core, labels, np.where(border < size, border, -1))
+
+
+def neighbour_features(latitudes, longitudes, radius_km=NEIGHBOUR_RADIUS_KM, cluster_km=CLUSTER_DISTANCE_KM,
+                       min_sites=CLUSTER_MIN_SITES, backend=None):
+    """
+    Per-site columns, name -> array: distance to the nearest other site,
+    other sites within `radius_km` and their density per km², and the
+    cluster (index of its first site, -1 for none) and its size.
+    """
+    index = PointIndex(latitudes, longitudes, backend)
+    nearest, _ = index.nearest_other()
+    i, j = index.pairs_within(radius_km)
+    counts = np.bincount(i, minlength=index.size) + np.bincount(j, minlength=index.size)
+
+    if cluster_km < radius_km:
+        close = chord_to_km(np.sqrt(np.square(index.xyz[i] - index.xyz[j]).sum(axis=1))) <= cluster_km
+        i, j = i[close], j[close]
+    elif cluster_km > radius_km:
+        i, j = index.pairs_within(cluster_km)
+    clusters = cluster_labels(index.size, i, j, min_sites)
+    sizes = np.bincount(clusters[clusters >= 0], minlength=index.size)
+
+    return {
+        'nearest_site_km': np.where(np.isfinite(nearest), np.round(nearest, 3), np.nan),
+        'neighbour_count': counts,
+        'neighbour_density': np.round(counts / (math.pi * radius_km ** 2), 4),
+        'cluster': clusters,
+        'cluster_size': np.where(clusters >= 0, sizes[np.maximum(clusters, 0)], 0),
+    }
+
+
+def _rescore(site_ids, model, calculator, weights, run, chunk_size):
+    created = updated = 0
+    queryset = Site.objects.filter(site_id__in=site_ids.tolist())
+    for ids, arrays in iter_site_chunks(queryset, chunk_size, model):
+        total, scores = calculator.calculate_batch(arrays, weights)
+        counts = write_results(ids, total, scores, run)
+        created += counts[0]
+        updated += counts[1]
+    return created, updated
+
+
+def update_proximity(substations=None, roads=None, radius_km=NEIGHBOUR_RADIUS_KM, cluster_km=CLUSTER_DISTANCE_KM, min_sites=CLUSTER_MIN_SITES,
+                     rescore=True, chunk_size=DEFAULT_CHUNK_SIZE, backend=None, progress=None):
+    """
+    Recompute grid_distance_km from the `substations` file and
+    road_distance_km from the `roads` file (either may be omitted), store
+    the sites whose distances changed and, unless `rescore` is False,
+    rescore them in one run. Then store every site's SiteProximity row.
+
+    Each chunk of `chunk_size` changed sites is written and rescored in
+    one transaction. `progress`, if given, is called with the running
+    summary after every chunk.
+    """
+    started = time.perf_counter()
+    site_ids, columns = result_columns(Site.objects.all(), ['latitude', 'longitude', *DISTANCE_FIELDS])
+    backend = backend or index_backend()
+    summary = {
+        'total_sites': len(site_ids),
+        'backend': backend,
+        'changed': 0,
+        'rescored': 0,
+        'run_id': None,
+        'clusters': 0,
+        'clustered_sites': 0,
+        'elapsed_seconds': 0.0,
+    }
+    if not len(site_ids):
+        return summary
+    latitudes, longitudes = columns[:, 0], columns[:, 1]
+
+    sources = {'grid_distance_km': substations, 'road_distance_km': roads}
+    distances = {}
+    for field in DISTANCE_FIELDS:
+        if sources[field] is None:
+            continue
+        index = FeatureIndex(*load_features(sources[field]), backend=backend)
+        low, high, places = NUMERIC_COLUMNS[field]
+        distances[field] = np.round(np.clip(index.nearest(latitudes, longitudes), low, high), places)
+        summary[DISTANCE_FIELDS[field]] = index.features
+
+    changed = np.zeros(len(site_ids), dtype=bool)
+    for column, field in enumerate(DISTANCE_FIELDS, start=2):
+        if field in distances:
+            changed |= np.abs(distances[field] - columns[:, column]) > 0.001
+    changed = np.flatnonzero(changed)
+
+    if len(changed):
+        model = get_scoring_model()
+        calculator = SuitabilityCalculator(model)
+        weights = get_default_weights()
+        run = start_run(weights, 'rescore', model.overrides) if rescore else None
+        summary['run_id'] = run.run_id if run else None
+        for start in range(0, len(changed), chunk_size):
+            rows = changed[start:start + chunk_size]
+            with transaction.atomic():
+                sites = Site.objects.in_bulk(site_ids[rows].tolist())
+                for row in rows:
+                    site = sites[int(site_ids[row])]
+                    for field, values in distances.items():
+                        setattr(site, field, Decimal(f'{values[row]:.2f}'))
+                bulk_upsert(Site, list(sites.values()), ['site_id'], [*distances, 'updated_at'])
+                # Bulk writes skip the save signals that invalidate it
+                invalidate_snapshot()
+                if rescore:
+                    summary['rescored'] += sum(_rescore(site_ids[rows], model, calculator, weights, run, chunk_size))
+            summary['changed'] += len(rows)
+            summary['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+            if progress is not None:
+                progress(summary)
+
+    features = neighbour_features(latitudes, longitudes, radius_km, cluster_km, min_sites, backend)
+    clusters = features['cluster']
+    for start in range(0, len(site_ids), chunk_size):
+        rows = slice(start, start + chunk_size)
+        bulk_upsert(SiteProximity, [
+            SiteProximity(
+                site_id=site_id,
+                nearest_site_km=None if np.isnan(nearest) else nearest,
+                neighbour_count=count,
+                neighbour_density=density,
+                cluster_id=int(site_ids[cluster]) if cluster >= 0 else None,
+                cluster_size=size,
+            )
+            for site_id, nearest, count, density, cluster, size in zip(
+                site_ids[rows].tolist(), features['nearest_site_km'][rows].tolist(),
+                features['neighbour_count'][rows].tolist(), features['neighbour_density'][rows].tolist(),
+                clusters[rows].tolist(), features['cluster_size'][rows].tolist(),
+            )
+        ], ['site'], ['nearest_site_km', 'neighbour_count', 'neighbour_density', 'cluster_id',
+                      'cluster_size', 'computed_at'])
+
+    summary['clusters'] = int(len(np.unique(clusters[clusters >= 0])))
+    summary['clustered_sites'] = int((clusters >= 0).sum())
+    summary['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return summary
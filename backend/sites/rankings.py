@@ -0,0 +1,82 @@
+from django.db import transaction
+
+from .db import bulk_upsert
+from .models import AnalysisResult, Site, SiteRanking
+
+# Largest top-N the leaderboard serves
+MAX_TOP_SITES = 100
+# Sites per IN (...) list when syncing
+SYNC_BATCH_SIZE = 1000
+
+RANKING_FIELDS = ['result', 'region', 'land_type', 'total_suitability_score']
+
+
+def sync_rankings(site_ids):
+    """
+    Point each site's leaderboard row at its latest result.
+
+    Called after any write that adds, changes or removes results or moves
+    a site to another region or land type; sites left without results
+    drop off the leaderboard.
+    """
+    site_ids = sorted({site_id for site_id in site_ids if site_id is not None})
+    for start in range(0, len(site_ids), SYNC_BATCH_SIZE):
+        batch = site_ids[start:start + SYNC_BATCH_SIZE]
+        rows = (
+            AnalysisResult.objects.latest_per_site()
+            .filter(site_id__in=batch)
+            .values_list('site_id', 'result_id', 'site__region', 'site__land_type', 'total_suitability_score')
+        )
+        rankings = [
+            SiteRanking(site_id=site_id, result_id=result_id, region=region,
+                        land_type=land_type, total_suitability_score=score)
+            for site_id, result_id, region, land_type, score in rows
+        ]
+        with transaction.atomic():
+            bulk_upsert(SiteRanking, rankings, ['site'], RANKING_FIELDS)
+            ranked = {ranking.site_id for ranking in rankings}
+            SiteRanking.objects.filter(site_id__in=[s for s in batch if s not in ranked]).delete()
+
+
+def rebuild_rankings():
+    """Recreate the whole leaderboard from analysis_results"""
+    with transaction.atomic():
+        SiteRanking.objects.all().delete()
+        last_id = 0
+        while True:
+            site_ids = list(
+                Site.objects.filter(site_id__gt=last_id).order_by('site_id')
+                .values_list('site_id', flat=True)[:SYNC_BATCH_SIZE * 5]
+            )
+            if not site_ids:
+                break
+            sync_rankings(site_ids)
+            last_id = site_ids[-1]
+    return SiteRanking.objects.count()
+
+
+def ranked_result_ids(region=None, land_type=None, min_score=None, max_score=None):
+    """
+    Result ids on the leaderboard, best first.
+
+    Each filter combination maps onto one of the leaderboard's
+    (..., score, result) indexes, so slicing this reads only as many
+    index entries as it returns.
+    """
+    rankings = SiteRanking.objects.all()
+    if region is not None:
+        rankings = rankings.filter(region=region)
+    if land_type is not None:
+        rankings = rankings.filter(land_type=land_type)
+    if min_score is not None:
+        rankings = rankings.filter(total_suitability_score__gte=min_score)
+    if max_score is not None:
+        rankings = rankings.filter(total_suitability_score__lte=max_score)
+    return rankings.order_by('-total_suitability_score', '-result_id').values_list('result_id', flat=True)
+
+
+def top_rankings(limit, region=None, land_type=None, min_score=None, max_score=None):
+    """Best current results, one per site, best first"""
+    result_ids = list(ranked_result_ids(region, land_type, min_score, max_score)[:limit])
+    results = AnalysisResult.objects.select_related('site', 'run').in_bulk(result_ids)
+    return [results[result_id] for result_id in result_ids if result_id in results]
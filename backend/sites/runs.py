@@ -0,0 +1,191 @@
+"""
+Analysis runs: each scoring pass's weights stored once, with a compact
+per-site score history.
+
+Results point at the run that produced them instead of carrying their
+own copy of the weights, and every scored site also gets a RunScore row
+in hundredths of a point, so old runs stay comparable after the current
+results move on.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .db import bulk_upsert
+from .models import AnalysisResult, AnalysisRun, RunScore
+from .signals import bulk_result_delete
+from .snapshot import invalidate_snapshot
+from .statistics import apply_score_changes
+from .utils import SCORE_FIELDS
+
+HISTORY_FIELDS = list(SCORE_FIELDS.values()) + ['total_suitability_score']
+# Rows per bulk write or delete
+HISTORY_BATCH_SIZE = 2000
+# Newest runs whose history compaction always keeps
+DEFAULT_KEEP_RUNS = 10
+
+
+def weights_hash(weights):
+    """SHA-256 of the weights as canonical JSON, numbers as floats"""
+    canonical = {
+        key: float(value) if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool) else value
+        for key, value in (weights or {}).items()
+    }
+    payload = json.dumps(canonical, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def start_run(weights, source, curves=None):
+    """`curves` is the scoring model's overrides of the built-in curves"""
+    return AnalysisRun.objects.create(
+        source=source, weights=weights, weights_hash=weights_hash(weights), curves=curves or {}
+    )
+
+
+def run_for_weights(weights, source, curves=None):
+    """The newest run scored with these weights and curves, or a new one"""
+    digest = weights_hash(weights)
+    run = AnalysisRun.objects.filter(weights_hash=digest).order_by('-run_id').first()
+    if run is None or run.curves != (curves or {}):
+        run = AnalysisRun.objects.create(source=source, weights=weights, weights_hash=digest, curves=curves or {})
+    return run
+
+
+def to_hundredths(values):
+    return np.rint(np.asarray(values, dtype=np.float64) * 100).astype(np.int64)
+
+
+def record_scores(run, site_ids, total, scores):
+    """
+    Add (or overwrite) the run's history rows for `site_ids`.
+
+    `total` and each array in `scores`, keyed like SCORE_FIELDS, are
+    aligned with `site_ids`.
+    """
+    totals = to_hundredths(total).tolist()
+    factors = {field: to_hundredths(scores[key]).tolist() for key, field in SCORE_FIELDS.items()}
+    rows = [
+        RunScore(
+            run=run, site_id=site_id, total_suitability_score=totals[i],
+            **{field: values[i] for field, values in factors.items()}
+        )
+        for i, site_id in enumerate(site_ids)
+    ]
+    bulk_upsert(RunScore, rows, ['run', 'site'], HISTORY_FIELDS, batch_size=HISTORY_BATCH_SIZE)
+
+
+def run_totals(run):
+    """(site_ids, total scores) of a run's history, sorted by site_id"""
+    rows = RunScore.objects.filter(run=run).order_by('site_id').values_list('site_id', 'total_suitability_score')
+    data = np.array(list(rows), dtype=np.int64).reshape(-1, 2)
+    return data[:, 0], data[:, 1] / 100
+
+
+def _ranks(values):
+    ranks = np.empty(len(values), dtype=np.float64)
+    ranks[np.argsort(values, kind='stable')] = np.arange(len(values))
+    return ranks
+
+
+def compare_runs(base, other, limit=20):
+    """How scores moved from run `base` to run `other`, biggest movers first"""
+    base_sites, base_scores = run_totals(base)
+    other_sites, other_scores = run_totals(other)
+    common, base_index, other_index = np.intersect1d(base_sites, other_sites, assume_unique=True, return_indices=True)
+    before, after = base_scores[base_index], other_scores[other_index]
+    deltas = np.round(after - before, 2)
+
+    comparison = {
+        'base': base.run_id,
+        'other': other.run_id,
+        'common_sites': len(common),
+        'only_in_base': len(base_sites) - len(common),
+        'only_in_other': len(other_sites) - len(common),
+        'mean_delta': None,
+        'mean_abs_delta': None,
+        'rank_correlation': None,
+        'fields': ['site_id', 'base_score', 'other_score', 'delta'],
+        'movers': [],
+    }
+    if not len(common):
+        return comparison
+
+    comparison['mean_delta'] = round(float(deltas.mean()), 2)
+    comparison['mean_abs_delta'] = round(float(np.abs(deltas).mean()), 2)
+    if len(common) > 1:
+        # Spearman's rho: Pearson correlation of the ranks
+        correlation = np.corrcoef(_ranks(before), _ranks(after))[0, 1]
+        comparison['rank_correlation'] = None if np.isnan(correlation) else round(float(correlation), 4)
+    movers = np.lexsort((common, -np.abs(deltas)))[:limit]
+    comparison['movers'] = [
+        [int(common[i]), float(before[i]), float(after[i]), float(deltas[i])] for i in movers
+    ]
+    return comparison
+
+
+def prune_superseded_results(dry_run=False):
+    """
+    Fold results that a newer result of the same site has replaced into
+    their run's history and delete them. Returns how many there were.
+    """
+    superseded = AnalysisResult.objects.superseded().order_by('result_id')
+    if dry_run:
+        return superseded.count()
+
+    removed = 0
+    while True:
+        rows = list(superseded.values_list(
+            'result_id', 'run_id', 'site_id', 'site__region', 'site__land_type', *HISTORY_FIELDS
+        )[:HISTORY_BATCH_SIZE])
+        if not rows:
+            break
+        with transaction.atomic():
+            RunScore.objects.bulk_create(
+                [
+                    RunScore(run_id=run_id, site_id=site_id, **dict(zip(HISTORY_FIELDS, to_hundredths(scores).tolist())))
+                    for _, run_id, site_id, _, _, *scores in rows if run_id is not None
+                ],
+                ignore_conflicts=True,
+            )
+            # Superseded results are never ranked or drawn on tiles, so
+            # only the statistics change; adjust them once for the batch
+            # instead of per deleted row
+            with bulk_result_delete():
+                AnalysisResult.objects.filter(result_id__in=[row[0] for row in rows]).delete()
+            apply_score_changes(removed=[(row[3], row[4], row[-1]) for row in rows])
+        removed += len(rows)
+    if removed:
+        invalidate_snapshot()
+    return removed
+
+
+def prune_runs(keep=DEFAULT_KEEP_RUNS, older_than_days=None, dry_run=False):
+    """
+    Drop the history of runs beyond the newest `keep`, optionally only
+    those older than `older_than_days`. Runs that current results still
+    point at are kept. Returns (runs, score rows) removed.
+    """
+    newest = list(AnalysisRun.objects.order_by('-run_id').values_list('run_id', flat=True)[:keep])
+    runs = AnalysisRun.objects.exclude(
+        Exists(AnalysisResult.objects.filter(run=OuterRef('pk')))
+    ).exclude(run_id__in=newest)
+    if older_than_days is not None:
+        runs = runs.filter(created_at__lt=timezone.now() - timedelta(days=older_than_days))
+    run_ids = list(runs.values_list('run_id', flat=True))
+    scores = RunScore.objects.filter(run_id__in=run_ids)
+    if dry_run:
+        return len(run_ids), scores.count()
+
+    removed_scores = 0
+    for start in range(0, len(run_ids), 100):
+        batch = run_ids[start:start + 100]
+        with transaction.atomic():
+            removed_scores += RunScore.objects.filter(run_id__in=batch).delete()[0]
+            AnalysisRun.objects.filter(run_id__in=batch).delete()
+    return len(run_ids), removed_scores
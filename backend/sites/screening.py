@@ -0,0 +1,234 @@
+"""
+Batch screening of hypothetical sites.
+
+POST /api/analyze/calculate/ scores one site per request; screening a
+candidate list sends them all at once, as a JSON list, NDJSON or CSV
+body, or as an uploaded file. Candidates are read in chunks, validated
+column-wise, scored in one vectorized pass per chunk and streamed back
+in input order. Invalid rows get their errors in place of scores, the
+rest of the batch is still scored. Nothing is stored.
+"""
+import csv
+import io
+import json
+
+import numpy as np
+import pandas as pd
+from rest_framework.parsers import BaseParser
+
+from .export import _Echo
+from .utils import SuitabilityCalculator
+
+SCREEN_CHUNK_SIZE = 5000
+
+# Output format -> content type
+SCREEN_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Optional input column echoed back to tell rows apart
+ID_COLUMN = 'id'
+
+
+class CandidateFile:
+    """A candidate upload that is read lazily, chunk by chunk"""
+
+    def __init__(self, kind, file):
+        self.kind = kind
+        self.file = file
+
+
+class _RequestBody(io.RawIOBase):
+    """A request body stream as raw IO, so it can be buffered as it is read"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer)) if self.stream is not None else b''
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class CSVUploadParser(BaseParser):
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return CandidateFile('csv', io.BufferedReader(_RequestBody(stream)))
+
+
+class NDJSONUploadParser(BaseParser):
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return CandidateFile('ndjson', io.BufferedReader(_RequestBody(stream)))
+
+
+def uploaded_candidates(upload):
+    """A multipart file upload as a CandidateFile, NDJSON if named so"""
+    kind = 'ndjson' if str(upload.name).lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+    return CandidateFile(kind, upload)
+
+
+def candidate_frames(source, chunk_size=SCREEN_CHUNK_SIZE):
+    """Yield DataFrames of at most `chunk_size` candidates from a list of dicts or a CandidateFile"""
+    if isinstance(source, CandidateFile):
+        if source.kind == 'ndjson':
+            # Rows are parsed as plain objects; the columns are coerced below
+            lines = []
+            for line in source.file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                lines.append(row if isinstance(row, dict) else {'__invalid__': True})
+                if len(lines) == chunk_size:
+                    yield pd.DataFrame.from_records(lines)
+                    lines = []
+            if lines:
+                yield pd.DataFrame.from_records(lines)
+        else:
+            try:
+                yield from pd.read_csv(source.file, chunksize=chunk_size, dtype=str, keep_default_na=False)
+            except pd.errors.EmptyDataError:
+                return
+    else:
+        for start in range(0, len(source), chunk_size):
+            rows = [row if isinstance(row, dict) else {'__invalid__': True} for row in source[start:start + chunk_size]]
+            yield pd.DataFrame.from_records(rows)
+
+
+def _blank(values):
+    text = values.astype('string').str.strip()
+    return (values.isna() | text.isna() | (text == '')).to_numpy(dtype=bool), text
+
+
+def validate_candidates(frame, model):
+    """
+    Check every column the scoring `model` needs, one column at a time.
+
+    Returns (arrays, errors): arrays holds a value per row for each field
+    (NaN or None where invalid) and errors maps row positions to
+    {field: [message]}.
+    """
+    from .ingest import NUMERIC_COLUMNS
+
+    n = len(frame)
+    arrays = {}
+    errors = {}
+
+    def reject(mask, field, message):
+        for i in np.flatnonzero(mask):
+            errors.setdefault(int(i), {})[field] = [message]
+
+    if '__invalid__' in frame:
+        for i in np.flatnonzero(frame['__invalid__'].eq(True).to_numpy()):
+            errors[int(i)] = {'non_field_errors': ['Expected an object of site attributes.']}
+
+    for field in model.fields:
+        categorical = field in model.category_fields
+        if field not in frame:
+            reject(np.ones(n, dtype=bool), field, 'This field is required.')
+            arrays[field] = np.full(n, None, dtype=object) if categorical else np.full(n, np.nan)
+            continue
+        missing, text = _blank(frame[field])
+        reject(missing, field, 'This field is required.')
+
+        if categorical:
+            arrays[field] = text.to_numpy(dtype=object, na_value=None)
+            continue
+
+        raw = frame[field]
+        values = pd.to_numeric(text if raw.dtype == object else raw, errors='coerce').to_numpy(dtype=np.float64)
+        invalid = ~missing & ~np.isfinite(values)
+        reject(invalid, field, 'A valid number is required.')
+        if field in NUMERIC_COLUMNS:
+            low, high, _ = NUMERIC_COLUMNS[field]
+            out_of_range = np.isfinite(values) & ((values < low) | (values > high))
+            reject(out_of_range, field, f'Ensure this value is between {low} and {high}.')
+        arrays[field] = values
+    return arrays, errors
+
+
+def screen(source, weights, model, chunk_size=SCREEN_CHUNK_SIZE):
+    """
+    Yield lists of records, one per candidate and in input order: its
+    row number, its `id` if given, and either total_score and breakdown
+    or errors.
+    """
+    calculator = SuitabilityCalculator(model)
+    offset = 0
+    for frame in candidate_frames(source, chunk_size):
+        frame = frame.reset_index(drop=True)
+        arrays, errors = validate_candidates(frame, model)
+        valid = np.ones(len(frame), dtype=bool)
+        valid[list(errors)] = False
+
+        totals, scores = calculator.calculate_batch({field: values[valid] for field, values in arrays.items()}, weights)
+        totals = totals.tolist()
+        scores = {key: values.tolist() for key, values in scores.items()}
+        ids = frame[ID_COLUMN].tolist() if ID_COLUMN in frame else None
+
+        records = []
+        scored = 0
+        for i in range(len(frame)):
+            record = {'row': offset + i}
+            if ids is not None:
+                record[ID_COLUMN] = _plain(ids[i])
+            if valid[i]:
+                record['total_score'] = totals[scored]
+                record['breakdown'] = {key: values[scored] for key, values in scores.items()}
+                scored += 1
+            else:
+                record['errors'] = errors[i]
+            records.append(record)
+        yield records
+        offset += len(frame)
+
+
+def _plain(value):
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def stream_json(chunks, weights):
+    """One JSON document, written a chunk at a time"""
+    counts = {'scored': 0, 'failed': 0}
+    yield '{"weights_used": ' + json.dumps(weights) + ', "results": ['
+    separator = ''
+    for records in chunks:
+        for record in records:
+            counts['failed' if 'errors' in record else 'scored'] += 1
+        if records:
+            yield separator + ', '.join(json.dumps(record) for record in records)
+            separator = ', '
+    yield '], ' + json.dumps(counts)[1:]
+
+
+def stream_ndjson(chunks):
+    for records in chunks:
+        yield ''.join(json.dumps(record) + '\n' for record in records)
+
+
+def stream_csv(chunks, model):
+    keys = [curve.key for curve in model.curves]
+    writer = csv.writer(_Echo())
+    yield writer.writerow(['row', ID_COLUMN, 'total_score', *keys, 'errors'])
+    for records in chunks:
+        yield ''.join(
+            writer.writerow([
+                record['row'], record.get(ID_COLUMN, ''), record.get('total_score', ''),
+                *[record.get('breakdown', {}).get(key, '') for key in keys],
+                json.dumps(record['errors']) if 'errors' in record else '',
+            ])
+            for record in records
+        )
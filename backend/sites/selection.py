@@ -0,0 +1,156 @@
+"""
+Multi-objective and budgeted site selection over stored scores.
+
+The weighted total folds every factor into one number; the Pareto front
+over chosen factor scores shows the trade-offs behind it instead, e.g.
+irradiance against grid distance. A budgeted portfolio picks sites for
+the best summed score within a total area. Both work on the latest
+result of each site, from the snapshot when it is enabled. Nothing is
+re-weighted: the stored totals already include the multipliers and
+added factors of the curves they were scored with.
+"""
+import numpy as np
+
+from .models import AnalysisResult
+from .utils import SCORE_FIELDS
+from .whatif import result_columns
+
+# Objective -> stored score it maximizes
+OBJECTIVES = {**SCORE_FIELDS, 'total': 'total_suitability_score'}
+AREA = 'site__area_sqm'
+# Candidates checked against the front at once when there are 3+ objectives
+FRONT_BLOCK = 512
+
+
+def population(fields, region=None, land_type=None, min_score=None, max_score=None, site_ids=None):
+    """(site_ids, rows x fields) of each site's latest result, filtered like the results API"""
+    from .snapshot import get_snapshot
+
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        mask = snapshot.mask(region=region, land_type=land_type, min_score=min_score,
+                             max_score=max_score, latest_only=True)
+        if site_ids:
+            mask &= np.isin(snapshot.site_ids, site_ids)
+        return snapshot.columns(mask, fields)
+
+    results = AnalysisResult.objects.latest_per_site()
+    if site_ids:
+        results = results.filter(site_id__in=site_ids)
+    if region is not None:
+        results = results.filter(site__region=region)
+    if land_type is not None:
+        results = results.filter(site__land_type=land_type)
+    if min_score is not None:
+        results = results.filter(total_suitability_score__gte=min_score)
+    if max_score is not None:
+        results = results.filter(total_suitability_score__lte=max_score)
+    return result_columns(results, fields)
+
+
+def _front_2d(points):
+    # Sweep in (-x, -y) order: a point survives if it has the best y of
+    # its x and beats every y seen at a larger x
+    x, y = points[:, 0], points[:, 1]
+    order = np.lexsort((-y, -x))
+    xs, ys = x[order], y[order]
+    starts = np.flatnonzero(np.r_[True, xs[1:] != xs[:-1]])
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(xs)]))
+    best_before = np.r_[-np.inf, np.maximum.accumulate(ys)][starts][group]
+    keep = np.zeros(len(points), dtype=bool)
+    keep[order] = (ys == ys[starts][group]) & (ys > best_before)
+    return keep
+
+
+def _dominated(front, candidates):
+    """Which candidates some row of `front` dominates"""
+    dominated = np.zeros(len(candidates), dtype=bool)
+    for start in range(0, len(front), FRONT_BLOCK):
+        block = front[start:start + FRONT_BLOCK]
+        # front rows x candidates, built one objective at a time
+        at_least = np.ones((len(block), len(candidates)), dtype=bool)
+        better = np.zeros((len(block), len(candidates)), dtype=bool)
+        for j in range(candidates.shape[1]):
+            at_least &= block[:, j, None] >= candidates[None, :, j]
+            better |= block[:, j, None] > candidates[None, :, j]
+        dominated |= (at_least & better).any(axis=0)
+    return dominated
+
+
+def pareto_front(points):
+    """
+    Boolean mask of the rows of `points` (rows x objectives, higher is
+    better) that no other row dominates. Rows with identical values
+    don't dominate each other.
+
+    Two objectives take one sort and a sweep. For more, rows are visited
+    by descending sum, so a row can only be dominated by rows before it,
+    and each block of rows is checked against the front found so far,
+    then what is left of it against itself (sort-filter skyline).
+    """
+    n, objectives = points.shape
+    if n == 0:
+        return np.zeros(0, dtype=bool)
+    if objectives == 1:
+        return points[:, 0] == points[:, 0].max()
+    if objectives == 2:
+        return _front_2d(points)
+
+    order = np.argsort(-points.sum(axis=1), kind='stable')
+    keep = np.zeros(n, dtype=bool)
+    front = points[:0]
+    for start in range(0, n, FRONT_BLOCK):
+        rows = order[start:start + FRONT_BLOCK]
+        rows = rows[~_dominated(front, points[rows])]
+        # A row dominated by one the front just removed is dominated by
+        # the front too, so only the remaining rows are compared
+        block = points[rows]
+        survivors = ~_dominated(block, block)
+        keep[rows[survivors]] = True
+        front = np.concatenate([front, block[survivors]])
+    return keep
+
+
+def budgeted_selection(values, costs, budget):
+    """
+    Pick rows for the largest sum of `values` whose `costs` fit `budget`.
+
+    The 0/1 knapsack is NP-hard, so this is the greedy by value per unit
+    of cost, topped up with whatever still fits, or the best single row
+    if that alone is worth more; never below half the optimum. Returns
+    (indexes, upper_bound), the bound being the fractional relaxation.
+    """
+    useful = np.flatnonzero((values > 0) & (costs <= budget))
+    if not len(useful):
+        return useful, 0.0
+    cost = costs[useful]
+    value = values[useful]
+    with np.errstate(divide='ignore'):
+        density = np.where(cost > 0, value / cost, np.inf)
+    order = np.lexsort((-value, -density))
+
+    spent = np.cumsum(cost[order])
+    fits = int(np.searchsorted(spent, budget, side='right'))
+    chosen = [order[:fits]]
+    upper_bound = float(value[order[:fits]].sum())
+    if fits < len(order):
+        upper_bound += (budget - (spent[fits - 1] if fits else 0.0)) / cost[order[fits]] * value[order[fits]]
+
+    # Top up from the rest, still best density first
+    remaining = budget - (spent[fits - 1] if fits else 0.0)
+    rest = order[fits:]
+    while len(rest):
+        rest = rest[cost[rest] <= remaining]
+        if not len(rest):
+            break
+        spent = np.cumsum(cost[rest])
+        taken = int(np.searchsorted(spent, remaining, side='right'))
+        chosen.append(rest[:taken])
+        remaining -= spent[taken - 1]
+        rest = rest[taken:]
+
+    chosen = np.concatenate(chosen)
+    best = int(np.argmax(value))
+    if value[best] > value[chosen].sum():
+        chosen = np.array([best])
+    return useful[chosen], upper_bound
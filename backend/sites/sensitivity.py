@@ -0,0 +1,299 @@
+"""
+Sensitivity of the rankings to the factor weights.
+
+A sweep samples weight vectors on the simplex, either a regular grid or
+Monte Carlo draws, and ranks every site under each of them from its
+factor scores under the active curves (whatif.factor_matrix), the way
+the what-if endpoint does for a handful of weight sets. Weight vectors
+are ranked a batch at a time, sized to SWEEP_MEMORY, and only running
+aggregates are kept per site: rank moments, best and worst rank, top-k
+counts and a rank histogram with exact bins near the top and log-spaced
+ones below.
+"""
+import csv
+import math
+import time
+from itertools import combinations
+
+import numpy as np
+
+from .curves import get_scoring_model
+from .models import AnalysisResult
+from .whatif import WEIGHT_KEYS, factor_keys, factor_matrix, weight_matrix, weighted_totals
+
+SWEEP_METHODS = ('monte_carlo', 'grid')
+MAX_SAMPLES = 100000
+DEFAULT_TOP_K = [10, 100]
+# Bytes of working arrays for one batch of weight vectors
+SWEEP_MEMORY = 256 * 1024 * 1024
+# Bytes per site and weight vector: totals, sort keys and order, ranks and bins
+BYTES_PER_RANK = 40
+MAX_BATCH = 256
+RANK_BINS = 32
+PERCENTILES = (5, 50, 95)
+# Smallest Dirichlet parameter, for factors the centre weights leave at 0
+MIN_ALPHA = 0.01
+
+
+def grid_size(factors, steps):
+    """Number of weight vectors simplex_grid(factors, steps) yields"""
+    return math.comb(steps + factors - 1, factors - 1)
+
+
+def simplex_grid(factors, steps):
+    """Every weight vector over `factors` factors in multiples of 1/steps that sums to 1"""
+    slots = steps + factors - 1
+    rows = []
+    for bars in combinations(range(slots), factors - 1):
+        edges = (-1, *bars, slots)
+        rows.append([edges[i + 1] - edges[i] - 1 for i in range(factors)])
+    return np.array(rows, dtype=np.float64).reshape(-1, factors) / steps
+
+
+def sample_weights(method='monte_carlo', samples=1000, steps=10, factors=None,
+                   center=None, concentration=None, seed=0, keys=WEIGHT_KEYS):
+    """
+    Weight vectors, rows in `keys` order, that sum to 1 over `factors`
+    (all by default) and leave the other weights at 0.
+
+    'grid' gives the simplex_grid of `steps`. 'monte_carlo' draws
+    `samples` vectors uniformly from the simplex or, with a
+    `concentration`, from a Dirichlet centred on the `center` weights:
+    the higher the concentration, the closer to them.
+    """
+    factors = [key for key in keys if key in (factors or keys)]
+    if method == 'grid':
+        sampled = simplex_grid(len(factors), steps)
+    else:
+        rng = np.random.default_rng(seed)
+        alpha = np.ones(len(factors))
+        if concentration is not None:
+            base = np.array([float((center or {}).get(key, 0)) for key in factors])
+            if base.sum() > 0:
+                alpha = np.maximum(concentration * base / base.sum(), MIN_ALPHA)
+        sampled = rng.dirichlet(alpha, samples)
+
+    weights = np.zeros((len(sampled), len(keys)))
+    weights[:, [keys.index(key) for key in factors]] = sampled
+    return weights
+
+
+def rank_rows(totals):
+    """
+    Weight-vectors x sites ranks (1 = best) for sites x weight-vectors
+    `totals`, ties to the lower site_id.
+
+    Totals are whole hundredths between 0 and 100, so they sort as int16
+    keys, which numpy's stable sort orders with a linear radix sort.
+    """
+    keys = (10000 - np.rint(totals.T * 100)).astype(np.int16)
+    # Rows are in site_id order and the sort is stable
+    order = np.argsort(keys, axis=1, kind='stable')
+    ranks = np.empty(order.shape, dtype=np.int32)
+    np.put_along_axis(ranks, order, np.arange(1, order.shape[1] + 1, dtype=np.int32)[None, :], axis=1)
+    return ranks
+
+
+def rank_edges(sites):
+    """Histogram bin edges over ranks 1..sites: [edges[i], edges[i + 1])"""
+    return np.unique(np.round(np.geomspace(1, sites + 1, RANK_BINS + 1)).astype(np.int64))
+
+
+def batch_size(sites, memory=SWEEP_MEMORY):
+    """Weight vectors ranked at once for `sites` sites within `memory` bytes"""
+    return int(min(MAX_BATCH, max(1, memory // (BYTES_PER_RANK * max(sites, 1)))))
+
+
+class RankStats:
+    """Per-site rank aggregates over the weight vectors added so far"""
+
+    def __init__(self, site_ids, base_ranks, top_k=DEFAULT_TOP_K):
+        sites = len(site_ids)
+        self.site_ids = site_ids
+        self.base_ranks = base_ranks
+        self.top_k = sorted(set(top_k))
+        self.samples = 0
+        self.rank_sum = np.zeros(sites)
+        self.rank_squares = np.zeros(sites)
+        self.best = np.full(sites, sites, dtype=np.int64)
+        self.worst = np.zeros(sites, dtype=np.int64)
+        self.top_counts = {k: np.zeros(sites, dtype=np.int64) for k in self.top_k}
+        self.edges = rank_edges(sites)
+        self.histogram = np.zeros((sites, len(self.edges) - 1), dtype=np.uint32)
+        # Rank -> histogram bin
+        self.rank_bins = np.searchsorted(self.edges, np.arange(sites + 1), side='right') - 1
+        # Per weight vector: share of the baseline top-k kept, and
+        # Spearman correlation with the baseline ranking
+        self.overlaps = {k: [] for k in self.top_k}
+        self.correlations = []
+
+    def add(self, ranks):
+        """Fold in a weight-vectors x sites block of ranks"""
+        count, sites = ranks.shape
+        self.samples += count
+        self.rank_sum += ranks.sum(axis=0)
+        self.rank_squares += np.square(ranks, dtype=np.float64).sum(axis=0)
+        np.minimum(self.best, ranks.min(axis=0), out=self.best)
+        np.maximum(self.worst, ranks.max(axis=0), out=self.worst)
+        for k in self.top_k:
+            in_top = ranks <= k
+            self.top_counts[k] += in_top.sum(axis=0)
+            self.overlaps[k].append((in_top & (self.base_ranks <= k)).sum(axis=1) / max(min(k, sites), 1))
+
+        bins = self.rank_bins[ranks]
+        bins += np.arange(sites, dtype=np.int64) * self.histogram.shape[1]
+        self.histogram += np.bincount(bins.ravel(), minlength=self.histogram.size).reshape(self.histogram.shape).astype(np.uint32)
+
+        if sites > 1:
+            moved = np.square(ranks - self.base_ranks, dtype=np.float64).sum(axis=1)
+            self.correlations.append(1 - 6 * moved / (sites * (sites ** 2 - 1)))
+
+    def percentile(self, q):
+        """Rank percentile per site, read off the histogram (exact where bins are one rank wide)"""
+        cumulative = self.histogram.cumsum(axis=1, dtype=np.int64)
+        target = max(q / 100 * self.samples, 1e-9)
+        index = (cumulative < target).sum(axis=1)
+        rows = np.arange(len(index))
+        before = np.where(index > 0, cumulative[rows, np.maximum(index - 1, 0)], 0)
+        count = self.histogram[rows, index]
+        width = self.edges[index + 1] - self.edges[index]
+        return self.edges[index] + (target - before) / np.maximum(count, 1) * (width - 1)
+
+    def columns(self):
+        """Per-site report columns, name -> array aligned with site_ids"""
+        mean = self.rank_sum / self.samples
+        columns = {
+            'site_id': self.site_ids,
+            'base_rank': self.base_ranks,
+            'mean_rank': np.round(mean, 2),
+            'rank_std': np.round(np.sqrt(np.maximum(self.rank_squares / self.samples - mean ** 2, 0)), 2),
+            'best_rank': self.best,
+            'worst_rank': self.worst,
+        }
+        for q in PERCENTILES:
+            columns[f'rank_p{q}'] = np.round(self.percentile(q), 1)
+        for k in self.top_k:
+            columns[f'top_{k}_probability'] = np.round(self.top_counts[k] / self.samples, 4)
+        return columns
+
+    def stability(self):
+        """How far the rankings move from the baseline over all weight vectors"""
+        summary = {}
+        for k in self.top_k:
+            overlaps = np.concatenate(self.overlaps[k])
+            summary[f'top_{k}_overlap'] = {
+                'mean': round(float(overlaps.mean()), 4),
+                'min': round(float(overlaps.min()), 4),
+            }
+        if self.correlations:
+            correlations = np.concatenate(self.correlations)
+            summary['spearman'] = {
+                'mean': round(float(correlations.mean()), 4),
+                'min': round(float(correlations.min()), 4),
+            }
+        return summary
+
+
+def sweep(site_ids, matrix, weights, base_weights, top_k=DEFAULT_TOP_K, memory=SWEEP_MEMORY, progress=None,
+          keys=WEIGHT_KEYS):
+    """
+    Rank the sites under every row of `weights` and return their RankStats.
+    `matrix` and `weights` have a column per factor in `keys` order.
+
+    `base_weights` give the baseline ranking the stability figures compare
+    against. `progress`, if given, is called with (weight vectors done,
+    total) after every batch.
+    """
+    base_ranks = rank_rows(weighted_totals(matrix, weight_matrix([base_weights], keys)))[0]
+    stats = RankStats(site_ids, base_ranks, top_k)
+    size = batch_size(len(site_ids), memory)
+    for start in range(0, len(weights), size):
+        stats.add(rank_rows(weighted_totals(matrix, weights[start:start + size])))
+        if progress is not None:
+            progress(min(start + size, len(weights)), len(weights))
+    return stats
+
+
+def sweep_population(region=None, land_type=None, site_ids=None, model=None):
+    """(site_ids, factor matrix) of the latest results to sweep over"""
+    results = AnalysisResult.objects.latest_per_site()
+    if site_ids:
+        results = results.filter(site_id__in=site_ids)
+    if region:
+        results = results.filter(site__region=region)
+    if land_type:
+        results = results.filter(site__land_type=land_type)
+    return factor_matrix(results, model)
+
+
+def write_report(stats, path):
+    """Write the per-site columns to a CSV, most stable top sites first"""
+    columns = stats.columns()
+    order = np.lexsort((columns['site_id'], columns['mean_rank']))
+    names = list(columns)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        values = [columns[name][order].tolist() for name in names]
+        writer.writerows(zip(*values))
+
+
+def write_distributions(stats, path):
+    """Store the rank histograms for rank_distribution()"""
+    with open(path, 'wb') as f:
+        np.savez(f, site_ids=stats.site_ids, edges=stats.edges, histogram=stats.histogram)
+
+
+def rank_distribution(path, site_id):
+    """A site's rank histogram from write_distributions, or None if it wasn't swept"""
+    with np.load(path) as data:
+        site_ids = data['site_ids']
+        index = np.searchsorted(site_ids, site_id)
+        if index == len(site_ids) or site_ids[index] != site_id:
+            return None
+        edges = data['edges']
+        counts = data['histogram'][index]
+    return [
+        {'rank_from': int(low), 'rank_to': int(high) - 1, 'count': int(count)}
+        for low, high, count in zip(edges[:-1], edges[1:], counts)
+        if count
+    ]
+
+
+def run_sensitivity(report_path, distributions_path, base_weights, method='monte_carlo', samples=1000,
+                    steps=10, factors=None, concentration=None, seed=0, top_k=DEFAULT_TOP_K, limit=20,
+                    region=None, land_type=None, site_ids=None, progress=None):
+    """
+    Sweep the weights for the selected sites, write the per-site report
+    and rank histograms, and return a summary with the `limit` sites of
+    best mean rank.
+    """
+    started = time.perf_counter()
+    model = get_scoring_model()
+    keys = factor_keys(model)
+    ids, matrix = sweep_population(region, land_type, site_ids, model)
+    weights = sample_weights(method, samples, steps, factors, base_weights, concentration, seed, keys)
+    if progress is not None:
+        progress(0, len(weights))
+    stats = sweep(ids, matrix, weights, base_weights, top_k, progress=progress, keys=keys)
+
+    summary = {
+        'sites': len(ids),
+        'samples': stats.samples,
+        'method': method,
+        'factors': [key for key in keys if key in (factors or keys)],
+        'base_weights': base_weights,
+        'top_k': stats.top_k,
+        'stability': stats.stability() if len(ids) else {},
+        'top_sites': [],
+    }
+    if len(ids):
+        columns = stats.columns()
+        best = np.lexsort((columns['site_id'], columns['mean_rank']))[:limit]
+        summary['top_sites'] = [
+            {name: values[i].item() for name, values in columns.items()} for i in best
+        ]
+        write_report(stats, report_path)
+        write_distributions(stats, distributions_path)
+    summary['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return summary
@@ -1,13 +1,32 @@
 from rest_framework import serializers
-from .models import Site, AnalysisResult, AnalysisParameter
-from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+from .export import EXPORT_FORMATS, parquet_available
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from .curves import BUILTIN_KIND_ERROR, DEFAULT_CURVES, Curve, get_scoring_model
+from .middleware import serializing
+from .models import Site, AnalysisResult, AnalysisParameter, AnalysisRun, ScoringCurve, Job
+from .rankings import MAX_TOP_SITES
+from .screening import SCREEN_FORMATS
+from .selection import OBJECTIVES
+from .sensitivity import DEFAULT_TOP_K, MAX_SAMPLES, SWEEP_METHODS, grid_size
+from .whatif import factor_keys
 
-class SiteSerializer(serializers.ModelSerializer):
+class TimedModelSerializer(serializers.ModelSerializer):
+    """Reports its output work as the request's serialization time (Server-Timing)"""
+
+    def to_representation(self, instance):
+        with serializing():
+            return super().to_representation(instance)
+
+class SiteSerializer(TimedModelSerializer):
+    # Annotated by Site.objects.with_current_score()
+    current_result_id = serializers.IntegerField(read_only=True, allow_null=True)
+    current_score = serializers.DecimalField(max_digits=5, decimal_places=2, read_only=True, allow_null=True)
     class Meta:
         model = Site
         fields = '__all__'
 
-class AnalysisResultSerializer(serializers.ModelSerializer):
+class AnalysisResultSerializer(TimedModelSerializer):
     site_name = serializers.CharField(source='site.site_name', read_only=True)
     latitude = serializers.DecimalField(source='site.latitude', max_digits=10, decimal_places=7, read_only=True)
     longitude = serializers.DecimalField(source='site.longitude', max_digits=10, decimal_places=7, read_only=True)
@@ -15,39 +34,187 @@ class AnalysisResultSerializer(serializers.ModelSerializer):
     area_sqm = serializers.IntegerField(source='site.area_sqm', read_only=True)
     land_type = serializers.CharField(source='site.land_type', read_only=True)
     solar_irradiance_kwh = serializers.FloatField(source='site.solar_irradiance_kwh', read_only=True)
+    # Stored once per run rather than on every result
+    parameters_snapshot = serializers.JSONField(source='run.weights', read_only=True, allow_null=True)
     class Meta:
         model = AnalysisResult
         fields = '__all__'
 
-class AnalysisParameterSerializer(serializers.ModelSerializer):
+class AnalysisRunSerializer(TimedModelSerializer):
+    # Annotated by AnalysisRunViewSet
+    site_count = serializers.IntegerField(read_only=True)
+    class Meta:
+        model = AnalysisRun
+        fields = ['run_id', 'source', 'weights', 'curves', 'created_at', 'site_count']
+
+class RunCompareSerializer(serializers.Serializer):
+    other = serializers.IntegerField()
+    limit = serializers.IntegerField(required=False, min_value=0, max_value=1000, default=20)
+
+class AnalysisParameterSerializer(TimedModelSerializer):
     class Meta:
         model = AnalysisParameter
         fields = '__all__'
 
+class ScoringCurveSerializer(TimedModelSerializer):
+    class Meta:
+        model = ScoringCurve
+        fields = '__all__'
+
+    def validate_field_name(self, value):
+        try:
+            field = Site._meta.get_field(value)
+        except FieldDoesNotExist:
+            raise serializers.ValidationError(f"Sites have no attribute '{value}'.")
+        if field.primary_key or field.is_relation:
+            raise serializers.ValidationError(f"'{value}' cannot be scored.")
+        return value
+
+    def validate(self, attrs):
+        instance = ScoringCurve(**{
+            **({field.name: getattr(self.instance, field.name) for field in ScoringCurve._meta.fields}
+               if self.instance else {}),
+            **attrs,
+        })
+        try:
+            curve = Curve(instance.factor_key, instance.spec())
+        except ValueError as error:
+            raise serializers.ValidationError(str(error))
+        if curve.key in DEFAULT_CURVES and curve.kind != 'score':
+            raise serializers.ValidationError(BUILTIN_KIND_ERROR.format(key=curve.key))
+        if not curve.categorical and isinstance(Site._meta.get_field(curve.field), (models.CharField, models.TextField)):
+            raise serializers.ValidationError(f"{curve.key}: text attributes need 'categories', not 'points'")
+        return attrs
+
 class SuitabilityCalculatorSerializer(serializers.Serializer):
     solar_irradiance_kwh = serializers.DecimalField(max_digits=10, decimal_places=2)
     area_sqm = serializers.IntegerField()
     grid_distance_km = serializers.DecimalField(max_digits=10, decimal_places=4)
     slope_degrees = serializers.DecimalField(max_digits=10, decimal_places=4)
     road_distance_km = serializers.DecimalField(max_digits=10, decimal_places=4)
+    # Only needed when a configured curve uses them
+    elevation_m = serializers.IntegerField(required=False)
+    land_type = serializers.CharField(max_length=50, required=False)
+    region = serializers.CharField(max_length=100, required=False)
 
-    solar_weight = serializers.DecimalField(max_digits=30, decimal_places=30, default=0.35)
-    area_weight = serializers.DecimalField(max_digits=30, decimal_places=30, default=0.25)
-    grid_weight = serializers.DecimalField(max_digits=30, decimal_places=30, default=0.20)
-    slope_weight = serializers.DecimalField(max_digits=30, decimal_places=30, default=0.15)
-    infra_weight = serializers.DecimalField(max_digits=30, decimal_places=30, default=0.05)
+    solar_weight = serializers.FloatField(required=False, min_value=0, max_value=1)
+    area_weight = serializers.FloatField(required=False, min_value=0, max_value=1)
+    grid_weight = serializers.FloatField(required=False, min_value=0, max_value=1)
+    slope_weight = serializers.FloatField(required=False, min_value=0, max_value=1)
+    infra_weight = serializers.FloatField(required=False, min_value=0, max_value=1)
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        ks = [ 'solar_weight','area_weight','grid_weight','slope_weight','infra_weight']
-        for key, value in data.items():
-            if value is None or key not in ks:
-                continue
-
-            try:
-                value = Decimal(str(value))
-                data[key] = str(value.quantize(Decimal("0.00"), rounding=ROUND_HALF_UP))
-            except (InvalidOperation, ValueError):
-                continue
-
-        return data
\ No newline at end of file
+class RecalculateSerializer(serializers.Serializer):
+    region = serializers.CharField(required=False)
+    land_type = serializers.CharField(required=False)
+    chunk_size = serializers.IntegerField(required=False, min_value=1, max_value=50000, default=2000)
+
+    solar_weight = serializers.FloatField(required=False, min_value=0, max_value=1)
+    area_weight = serializers.FloatField(required=False, min_value=0, max_value=1)
+    grid_weight = serializers.FloatField(required=False, min_value=0, max_value=1)
+    slope_weight = serializers.FloatField(required=False, min_value=0, max_value=1)
+    infra_weight = serializers.FloatField(required=False, min_value=0, max_value=1)
+
+
+class TopSitesSerializer(serializers.Serializer):
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=MAX_TOP_SITES, default=10)
+    region = serializers.CharField(required=False)
+    land_type = serializers.CharField(required=False)
+    min_score = serializers.DecimalField(max_digits=5, decimal_places=2, required=False)
+    max_score = serializers.DecimalField(max_digits=5, decimal_places=2, required=False)
+
+class WeightSetSerializer(serializers.Serializer):
+    solar_weight = serializers.FloatField(required=False, min_value=0, max_value=1)
+    area_weight = serializers.FloatField(required=False, min_value=0, max_value=1)
+    grid_weight = serializers.FloatField(required=False, min_value=0, max_value=1)
+    slope_weight = serializers.FloatField(required=False, min_value=0, max_value=1)
+    infra_weight = serializers.FloatField(required=False, min_value=0, max_value=1)
+
+class ScreenSerializer(WeightSetSerializer):
+    output = serializers.ChoiceField(choices=list(SCREEN_FORMATS), default='json')
+
+class WhatIfSerializer(serializers.Serializer):
+    site_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+    region = serializers.CharField(required=False)
+    land_type = serializers.CharField(required=False)
+    weight_sets = WeightSetSerializer(many=True, min_length=1, max_length=100)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=100000, default=100)
+
+
+class SelectionSerializer(serializers.Serializer):
+    site_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+    region = serializers.CharField(required=False)
+    land_type = serializers.CharField(required=False)
+    min_score = serializers.DecimalField(max_digits=5, decimal_places=2, required=False)
+    max_score = serializers.DecimalField(max_digits=5, decimal_places=2, required=False)
+
+class ParetoSerializer(SelectionSerializer):
+    objectives = serializers.ListField(
+        child=serializers.ChoiceField(choices=list(OBJECTIVES)), min_length=2, max_length=len(OBJECTIVES),
+        required=False, default=['solar', 'grid'],
+    )
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=100000, default=1000)
+
+    def validate_objectives(self, value):
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError('Objectives must be distinct.')
+        return value
+
+class PortfolioSerializer(SelectionSerializer):
+    area_budget = serializers.FloatField(min_value=1)
+    objective = serializers.ChoiceField(choices=list(OBJECTIVES), default='total')
+
+class SensitivityJobSerializer(WeightSetSerializer):
+    """A weight sweep; the *_weight fields override the baseline weights"""
+    site_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+    region = serializers.CharField(required=False)
+    land_type = serializers.CharField(required=False)
+    method = serializers.ChoiceField(choices=SWEEP_METHODS, default='monte_carlo')
+    samples = serializers.IntegerField(required=False, min_value=1, max_value=MAX_SAMPLES, default=1000)
+    steps = serializers.IntegerField(required=False, min_value=1, max_value=100, default=10)
+    # Score factors of the active scoring model, including added ones
+    factors = serializers.ListField(child=serializers.CharField(), required=False, allow_empty=False)
+    concentration = serializers.FloatField(required=False, min_value=0.01)
+    seed = serializers.IntegerField(required=False, default=0)
+    top_k = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, allow_empty=False, max_length=5,
+        default=DEFAULT_TOP_K,
+    )
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=1000, default=20)
+
+    def validate_factors(self, value):
+        keys = factor_keys(get_scoring_model())
+        unknown = sorted(set(value) - set(keys))
+        if unknown:
+            raise serializers.ValidationError(f"Unknown factors: {', '.join(unknown)}.")
+        return [key for key in keys if key in value]
+
+    def validate(self, data):
+        factors = len(data.get('factors') or factor_keys(get_scoring_model()))
+        if data['method'] == 'grid' and grid_size(factors, data['steps']) > MAX_SAMPLES:
+            raise serializers.ValidationError(
+                {'steps': [f'A grid over {factors} factors with {data["steps"]} steps exceeds {MAX_SAMPLES} samples.']}
+            )
+        return data
+
+class JobSerializer(TimedModelSerializer):
+    class Meta:
+        model = Job
+        fields = '__all__'
+
+class ExportJobSerializer(serializers.Serializer):
+    format = serializers.ChoiceField(choices=list(EXPORT_FORMATS), default='csv')
+    region = serializers.CharField(required=False)
+    land_type = serializers.CharField(required=False)
+    min_score = serializers.FloatField(required=False)
+    max_score = serializers.FloatField(required=False)
+
+    def validate_format(self, value):
+        value = EXPORT_FORMATS[value]
+        if value == 'parquet' and not parquet_available():
+            raise serializers.ValidationError('Parquet export requires pyarrow.')
+        return value
+
+class ImportJobSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    chunk_size = serializers.IntegerField(required=False, min_value=1, max_value=100000, default=10000)
+    dry_run = serializers.BooleanField(required=False, default=False)
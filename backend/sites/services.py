@@ -0,0 +1,332 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from django.db import OperationalError, connections, transaction
+from django.db.models import Max
+
+from .db import bulk_upsert, init_worker
+from .models import Site, AnalysisResult, AnalysisRun
+from .rankings import sync_rankings
+from .runs import record_scores, start_run
+from .snapshot import invalidate_snapshot
+from .statistics import apply_score_changes
+from .tiles import touch_geohashes
+from .curves import compile_curves, get_scoring_model
+from .utils import SuitabilityCalculator, FACTOR_FIELDS, SCORE_FIELDS, round_scores
+from .weights import get_default_weights
+
+DEFAULT_CHUNK_SIZE = 2000
+# Rows per bulk result write
+RESULT_BATCH_SIZE = 2000
+# Shards handed out per worker, so one slow shard doesn't leave the rest idle
+SHARDS_PER_WORKER = 4
+# Attempts at a chunk whose transaction hit a deadlock or lock timeout
+WRITE_ATTEMPTS = 3
+
+RESULT_UPDATE_FIELDS = list(SCORE_FIELDS.values()) + [
+    'total_suitability_score',
+    'run'
+]
+
+
+def iter_site_chunks(queryset=None, chunk_size=DEFAULT_CHUNK_SIZE, model=None):
+    """
+    Yield (site_ids, column arrays) for `queryset` in site_id order.
+
+    The columns are the attributes the scoring `model`'s curves use (the
+    built-in factors by default); categorical ones stay object arrays.
+    Uses keyset pagination on the primary key so every chunk is an index
+    range read, however deep into the table it is.
+    """
+    if queryset is None:
+        queryset = Site.objects.all()
+    fields = ['site_id'] + (model.fields if model is not None else list(FACTOR_FIELDS.values()))
+    categorical = model.category_fields if model is not None else set()
+    queryset = queryset.order_by('site_id')
+
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(site_id__gt=last_id).values_list(*fields)[:chunk_size])
+        if not rows:
+            return
+        columns = list(zip(*rows))
+        site_ids = np.array(columns[0], dtype=np.int64)
+        arrays = {
+            field: np.array(values, dtype=object if field in categorical else np.float64)
+            for field, values in zip(fields[1:], columns[1:])
+        }
+        yield site_ids, arrays
+        last_id = int(site_ids[-1])
+
+
+def write_results(site_ids, total, scores, run):
+    """
+    Persist one chunk of scores from `run`, updating each site's latest
+    result in place, creating results for sites that have none and
+    adding the scores to the run's history.
+
+    Returns (created, updated) counts. Callers are expected to run this
+    inside a transaction.
+    """
+    latest = dict(
+        AnalysisResult.objects
+        .filter(site_id__in=site_ids.tolist())
+        .values('site_id')
+        .annotate(latest_id=Max('result_id'))
+        .values_list('site_id', 'latest_id')
+    )
+    previous = dict(
+        AnalysisResult.objects
+        .filter(result_id__in=latest.values())
+        .values_list('result_id', 'total_suitability_score')
+    )
+    sites = {
+        site_id: (region, land_type, geohash)
+        for site_id, region, land_type, geohash in Site.objects
+        .filter(site_id__in=site_ids.tolist())
+        .values_list('site_id', 'region', 'land_type', 'geohash')
+    }
+    rounded = {key: round_scores(values, 2) for key, values in scores.items()}
+
+    to_create = []
+    to_update = []
+    added = []
+    removed = []
+    for i, site_id in enumerate(site_ids.tolist()):
+        values = {
+            field: float(rounded[key][i]) for key, field in SCORE_FIELDS.items()
+        }
+        values['total_suitability_score'] = float(total[i])
+
+        result_id = latest.get(site_id)
+        if result_id is None:
+            to_create.append(AnalysisResult(site_id=site_id, run=run, **values))
+        else:
+            to_update.append(AnalysisResult(result_id=result_id, site_id=site_id, run=run, **values))
+            removed.append((*sites[site_id][:2], previous[result_id]))
+        added.append((*sites[site_id][:2], values['total_suitability_score']))
+
+    if to_create:
+        AnalysisResult.objects.bulk_create(to_create)
+    if to_update:
+        # An upsert on the primary key: bulk_update's CASE WHEN per row and
+        # field cost several milliseconds of query building per site
+        bulk_upsert(AnalysisResult, to_update, ['result_id'], RESULT_UPDATE_FIELDS, batch_size=RESULT_BATCH_SIZE)
+    record_scores(run, site_ids.tolist(), total, rounded)
+    apply_score_changes(added, removed)
+    sync_rankings(sites)
+    touch_geohashes(geohash for _, _, geohash in sites.values())
+    invalidate_snapshot()
+    return len(to_create), len(to_update)
+
+
+def rescore_sites(queryset=None, weights=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Recalculate and store suitability scores for every site in `queryset`.
+
+    Sites are streamed in keyset-paginated chunks; each chunk is scored in
+    one vectorized pass and written in its own transaction. `progress`, if
+    given, is called with the running summary after every chunk.
+    """
+    if weights is None:
+        weights = get_default_weights()
+    if queryset is None:
+        queryset = Site.objects.all()
+
+    model = get_scoring_model()
+    calculator = SuitabilityCalculator(model)
+    run = start_run(weights, 'rescore', model.overrides)
+    summary = {
+        'run_id': run.run_id,
+        'total_sites': queryset.count(),
+        'processed': 0,
+        'created': 0,
+        'updated': 0,
+        'elapsed_seconds': 0.0,
+        'rows_per_second': 0.0,
+        'weights': weights,
+    }
+    started = time.perf_counter()
+
+    for site_ids, arrays in iter_site_chunks(queryset, chunk_size, model):
+        total, scores = calculator.calculate_batch(arrays, weights)
+        with transaction.atomic():
+            created, updated = write_results(site_ids, total, scores, run)
+
+        elapsed = time.perf_counter() - started
+        summary['processed'] += len(site_ids)
+        summary['created'] += created
+        summary['updated'] += updated
+        summary['elapsed_seconds'] = round(elapsed, 3)
+        summary['rows_per_second'] = round(summary['processed'] / elapsed, 1) if elapsed else 0.0
+        if progress is not None:
+            progress(summary)
+
+    return summary
+
+
+def shard_ranges(queryset, shards):
+    """
+    Split the site_id range of `queryset` into at most `shards`
+    [low, high] ranges (low exclusive) holding about as many sites each.
+    """
+    total = queryset.count()
+    if not total:
+        return []
+    shards = max(1, min(shards, total))
+    ids = queryset.order_by('site_id').values_list('site_id', flat=True)
+    bounds = [0] + [ids[k * total // shards - 1] for k in range(1, shards + 1)]
+    return [[low, high] for low, high in zip(bounds, bounds[1:])]
+
+
+def _write_chunk(site_ids, total, scores, run):
+    for attempt in range(1, WRITE_ATTEMPTS + 1):
+        try:
+            with transaction.atomic():
+                return write_results(site_ids, total, scores, run)
+        except OperationalError:
+            # Concurrent shards lock the same statistics rows; retry the
+            # chunk, which is safe because it overwrites results in place
+            if attempt == WRITE_ATTEMPTS:
+                raise
+            time.sleep(0.1 * attempt)
+
+
+def rescore_shard(query, low, high, weights, curves, run_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Score the sites of one shard, `query` restricted to low < site_id <= high.
+
+    Runs in a worker process with its own connection. Rerunning a shard
+    updates the same results again, so a shard cut short by a crash can
+    simply be run once more. Returns its processed/created/updated counts.
+    """
+    queryset = Site.objects.all()
+    queryset.query = query
+    queryset = queryset.filter(site_id__gt=low, site_id__lte=high)
+    model = compile_curves(curves)
+    calculator = SuitabilityCalculator(model)
+    run = AnalysisRun.objects.get(pk=run_id)
+
+    counts = {'processed': 0, 'created': 0, 'updated': 0}
+    for site_ids, arrays in iter_site_chunks(queryset, chunk_size, model):
+        total, scores = calculator.calculate_batch(arrays, weights)
+        created, updated = _write_chunk(site_ids, total, scores, run)
+        counts['processed'] += len(site_ids)
+        counts['created'] += created
+        counts['updated'] += updated
+    return counts
+
+
+def _pool_context():
+    # Forked children inherit the loaded apps and settings, test database
+    # included; platforms without fork spawn them and set Django up anew
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+
+
+def _load_shard_state(path, queryset):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    if state.get('query') != str(queryset.query):
+        raise ValueError(f"Checkpoint {path} belongs to a different set of sites")
+    return state
+
+
+def _save_shard_state(path, state):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def rescore_sites_sharded(queryset=None, weights=None, chunk_size=DEFAULT_CHUNK_SIZE, workers=2,
+                          shards=None, checkpoint_path=None, resume=False, progress=None):
+    """
+    Rescore `queryset` across `workers` processes.
+
+    The site_id range is cut into `shards` ranges of similar size (four
+    per worker by default) that a process pool scores independently, all
+    into one run. Finished shards are recorded in `checkpoint_path`, if
+    given, and `resume` picks a crashed or interrupted rescore up from
+    there with the same run, weights and curves. `progress`, if given,
+    is called with the merged summary as each shard finishes.
+    """
+    if queryset is None:
+        queryset = Site.objects.all()
+
+    state = _load_shard_state(checkpoint_path, queryset) if checkpoint_path and resume else None
+    if state is None:
+        if weights is None:
+            weights = get_default_weights()
+        model = get_scoring_model()
+        state = {
+            'query': str(queryset.query),
+            'run_id': start_run(weights, 'rescore', model.overrides).run_id,
+            'weights': weights,
+            'curves': model.specs,
+            'shards': shard_ranges(queryset, shards or workers * SHARDS_PER_WORKER),
+            'done': {},
+        }
+        if checkpoint_path:
+            _save_shard_state(checkpoint_path, state)
+
+    summary = {
+        'run_id': state['run_id'],
+        'total_sites': queryset.count(),
+        'processed': 0,
+        'created': 0,
+        'updated': 0,
+        'workers': workers,
+        'shards': len(state['shards']),
+        'shards_done': 0,
+        'elapsed_seconds': 0.0,
+        'rows_per_second': 0.0,
+        'weights': state['weights'],
+    }
+    started = time.perf_counter()
+    processed_now = 0
+
+    def finished(index, counts):
+        nonlocal processed_now
+        if index is not None:
+            state['done'][str(index)] = counts
+            processed_now += counts['processed']
+            if checkpoint_path:
+                _save_shard_state(checkpoint_path, state)
+        for key in ('processed', 'created', 'updated'):
+            summary[key] = sum(done[key] for done in state['done'].values())
+        summary['shards_done'] = len(state['done'])
+        elapsed = time.perf_counter() - started
+        summary['elapsed_seconds'] = round(elapsed, 3)
+        summary['rows_per_second'] = round(processed_now / elapsed, 1) if elapsed else 0.0
+        if progress is not None and index is not None:
+            progress(summary)
+
+    finished(None, None)
+    pending = [(index, low, high) for index, (low, high) in enumerate(state['shards']) if str(index) not in state['done']]
+    shared = (state['weights'], state['curves'], state['run_id'], chunk_size)
+
+    if workers == 1:
+        for index, low, high in pending:
+            finished(index, rescore_shard(queryset.query, low, high, *shared))
+        return summary
+
+    # Don't let forked children share the parent's connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context(), initializer=init_worker) as pool:
+        futures = {pool.submit(rescore_shard, queryset.query, low, high, *shared): index for index, low, high in pending}
+        try:
+            for future in as_completed(futures):
+                finished(futures[future], future.result())
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return summary
@@ -0,0 +1,114 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .curves import invalidate_curves
+from .models import Site, AnalysisResult, AnalysisParameter, ScoringCurve
+from .rankings import sync_rankings
+from .snapshot import invalidate_snapshot
+from .statistics import apply_score_changes, rebuild_statistics
+from .tiles import touch_geohashes
+from .weights import invalidate_weights
+
+# Set while a caller deletes results in bulk and updates what depends on them itself
+_bulk_delete = ContextVar('sites_bulk_delete', default=False)
+
+
+@contextmanager
+def bulk_result_delete():
+    """
+    Skip the per-row post_delete handling of AnalysisResult: the caller
+    adjusts the statistics, rankings, tiles and snapshot once per batch.
+    """
+    token = _bulk_delete.set(True)
+    try:
+        yield
+    finally:
+        _bulk_delete.reset(token)
+
+
+@receiver([post_save, post_delete], sender=AnalysisParameter)
+def analysis_parameter_changed(sender, **kwargs):
+    invalidate_weights()
+
+
+@receiver([post_save, post_delete], sender=ScoringCurve)
+def scoring_curve_changed(sender, **kwargs):
+    invalidate_curves()
+
+
+@receiver([post_save, post_delete], sender=Site)
+@receiver([post_save, post_delete], sender=AnalysisResult)
+def snapshot_source_changed(sender, raw=False, **kwargs):
+    if not raw and not (sender is AnalysisResult and _bulk_delete.get()):
+        invalidate_snapshot()
+
+
+def _site_info(site_id):
+    return Site.objects.filter(pk=site_id).values_list('region', 'land_type', 'geohash').first()
+
+
+@receiver(pre_save, sender=AnalysisResult)
+def remember_previous_score(sender, instance, raw=False, **kwargs):
+    instance._previous_score = None
+    if instance.pk is not None and not raw:
+        instance._previous_score = (
+            AnalysisResult.objects.filter(pk=instance.pk)
+            .values_list('site__region', 'site__land_type', 'total_suitability_score', 'site__geohash')
+            .first()
+        )
+
+
+@receiver(post_save, sender=AnalysisResult)
+def analysis_result_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_score', None)
+    region, land_type, geohash = _site_info(instance.site_id)
+    apply_score_changes(
+        added=[(region, land_type, float(instance.total_suitability_score))],
+        removed=[previous[:3]] if previous else [],
+    )
+    sync_rankings([instance.site_id])
+    touch_geohashes([geohash, previous[3] if previous else None])
+
+
+@receiver(post_delete, sender=AnalysisResult)
+def analysis_result_deleted(sender, instance, **kwargs):
+    if _bulk_delete.get():
+        return
+    info = _site_info(instance.site_id)
+    if info is not None:
+        region, land_type, geohash = info
+        apply_score_changes(removed=[(region, land_type, float(instance.total_suitability_score))])
+        sync_rankings([instance.site_id])
+        touch_geohashes([geohash])
+
+
+@receiver(pre_save, sender=Site)
+def remember_previous_site(sender, instance, raw=False, **kwargs):
+    instance._previous_site = None
+    if instance.pk is not None and not raw:
+        instance._previous_site = _site_info(instance.pk)
+
+
+@receiver(post_save, sender=Site)
+def site_saved(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_site', None)
+    if previous is None:
+        return
+    region, land_type, geohash = previous
+    # Moving a site to another region or land type moves all of its
+    # results, so recount both groups from scratch.
+    if (region, land_type) != (instance.region, instance.land_type):
+        rebuild_statistics(region, land_type)
+        rebuild_statistics(instance.region, instance.land_type)
+        sync_rankings([instance.pk])
+    touch_geohashes([geohash, instance.geohash])
+
+
+@receiver(post_delete, sender=Site)
+def site_deleted(sender, instance, **kwargs):
+    touch_geohashes([instance.geohash])
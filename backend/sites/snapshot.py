@@ -0,0 +1,221 @@
+"""
+Optional in-process columnar copy of the analysis results and their sites.
+
+With SITE_SNAPSHOT_ENABLED on, each worker keeps every result row as
+NumPy columns, region and land type dictionary encoded, and answers
+top sites, statistics, score-range listings and what-if matrices from
+memory. Writes bump a version token (see caching.bump_version); a
+worker rebuilds its snapshot on the first read after the token changes.
+"""
+import json
+import threading
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db.models import DateTimeField, DecimalField, FloatField, IntegerField, ForeignKey
+
+from .caching import bump_version, current_version
+from .models import AnalysisResult, Site
+from .payloads import renderer_for
+from .serializers import AnalysisResultSerializer
+from .statistics import HISTOGRAM_BINS, _buckets, _to_cents
+from .utils import SuitabilityCalculator
+
+VERSION_KEY = 'sites:snapshot:version'
+# Rows fetched per round trip while loading
+FETCH_SIZE = 5000
+
+SCORE = 'total_suitability_score'
+# Site attributes scoring curves can use, kept for what-if factor matrices
+SITE_ATTRIBUTES = [
+    field.name for field in Site._meta.concrete_fields
+    if not field.primary_key and not field.is_relation and not isinstance(field, DateTimeField)
+]
+REGION = 'site__region'
+LAND_TYPE = 'site__land_type'
+
+# Per-process snapshot and the version it was built at
+_local = {'version': None, 'snapshot': None}
+_lock = threading.Lock()
+
+
+def snapshot_enabled():
+    return getattr(settings, 'SITE_SNAPSHOT_ENABLED', False)
+
+
+def invalidate_snapshot():
+    """
+    Make every worker rebuild its snapshot on its next read. Cached
+    responses built from sites and results are versioned by the same
+    token, so they are dropped too.
+    """
+    bump_version(VERSION_KEY)
+
+
+def _model_field(source):
+    model, field = AnalysisResult, None
+    for name in source.split('__'):
+        field = model._meta.get_field(name)
+        model = field.related_model
+    return field
+
+
+def _encode(values):
+    """Dictionary encode a column: (int32 codes, list of distinct values)"""
+    # JSON values (e.g. a run's weights) are told apart by their text
+    keys = [json.dumps(value, sort_keys=True) if isinstance(value, (dict, list)) else value for value in values]
+    codes, _ = pd.factorize(np.array(keys, dtype=object), use_na_sentinel=False)
+    first = np.unique(codes, return_index=True)[1]
+    return codes.astype(np.int32), [values[i] for i in first]
+
+
+class SiteSnapshot:
+    """
+    Every analysis result with the site columns the results API shows,
+    plus the site attributes scoring curves can use.
+
+    Numeric columns are float64/int64 arrays; everything else is stored
+    as codes into a list of its distinct values.
+    """
+
+    def __init__(self, sources, rows, shown=None):
+        self.sources = sources
+        # The sources rows() returns; the rest are only read in bulk
+        self.shown = shown or sources
+        self.numeric = {}
+        self.encoded = {}
+        # Source -> decimal places, to hand back Decimals like the ORM does
+        self.decimal_places = {}
+        columns = list(zip(*rows)) if rows else [()] * len(sources)
+        for source, values in zip(sources, columns):
+            field = _model_field(source)
+            if isinstance(field, (DecimalField, FloatField)):
+                self.numeric[source] = np.array(values, dtype=np.float64)
+                if isinstance(field, DecimalField):
+                    self.decimal_places[source] = field.decimal_places
+            elif isinstance(field, (IntegerField, ForeignKey)) and not field.null:
+                self.numeric[source] = np.array(values, dtype=np.int64)
+            else:
+                self.encoded[source] = _encode(values)
+
+        self.size = len(rows)
+        self.result_ids = self.numeric['result_id']
+        self.site_ids = self.numeric['site']
+        self.scores = self.numeric[SCORE]
+        # Latest result of each site: the last result_id in each site run
+        order = np.lexsort((self.result_ids, self.site_ids))
+        last = np.ones(self.size, dtype=bool)
+        last[:-1] = self.site_ids[order][1:] != self.site_ids[order][:-1]
+        self.latest = np.zeros(self.size, dtype=bool)
+        self.latest[order[last]] = True
+
+    @classmethod
+    def load(cls):
+        """Read every result in one query, streamed FETCH_SIZE rows at a time"""
+        shown = renderer_for(AnalysisResultSerializer).sources
+        sources = shown + [f'site__{field}' for field in SITE_ATTRIBUTES if f'site__{field}' not in shown]
+        queryset = AnalysisResult.objects.order_by('result_id').values_list(*sources)
+        return cls(sources, list(queryset.iterator(chunk_size=FETCH_SIZE)), shown)
+
+    def mask(self, region=None, land_type=None, min_score=None, max_score=None, latest_only=False):
+        """Boolean row mask for the usual results filters"""
+        mask = np.ones(self.size, dtype=bool)
+        for source, value in ((REGION, region), (LAND_TYPE, land_type)):
+            if value is not None:
+                codes, categories = self.encoded[source]
+                mask &= codes == (categories.index(value) if value in categories else -1)
+        if min_score is not None:
+            mask &= self.scores >= float(min_score)
+        if max_score is not None:
+            mask &= self.scores <= float(max_score)
+        if latest_only:
+            mask &= self.latest
+        return mask
+
+    def ranked(self, mask, limit, after=None):
+        """
+        Up to `limit` row indexes in (-score, -result_id) order.
+
+        `after` is a (score, result_id) keyset cursor. Only rows at or
+        above the limit-th best score are sorted.
+        """
+        if after is not None:
+            score, result_id = float(after[0]), int(after[1])
+            mask = mask & ((self.scores < score) | ((self.scores == score) & (self.result_ids < result_id)))
+        candidates = np.flatnonzero(mask)
+        if limit < len(candidates):
+            scores = self.scores[candidates]
+            threshold = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+            candidates = candidates[scores >= threshold]
+        order = np.lexsort((-self.result_ids[candidates], -self.scores[candidates]))
+        return candidates[order[:limit]]
+
+    def values(self, source, indexes):
+        """A column's values at `indexes`, as the ORM would return them"""
+        if source in self.decimal_places:
+            places = self.decimal_places[source]
+            return [Decimal(f'{value:.{places}f}') for value in self.numeric[source][indexes].tolist()]
+        if source in self.numeric:
+            return self.numeric[source][indexes].tolist()
+        codes, categories = self.encoded[source]
+        return [categories[code] for code in codes[indexes]]
+
+    def rows(self, indexes):
+        """Row dicts keyed by source, as ``.values()`` would return them"""
+        rows = [{} for _ in indexes]
+        for source in self.shown:
+            values = self.values(source, indexes)
+            for row, value in zip(rows, values):
+                row[source] = value
+        return rows
+
+    def group_statistics(self, mask):
+        """The same per-group figures aggregate_groups() reads from the database"""
+        scores = self.scores[mask]
+        cents = _to_cents(scores)
+        return {
+            'result_count': len(scores),
+            'score_sum': int(cents.sum()),
+            'score_sumsq': int((cents * cents).sum()),
+            'min_score': float(scores.min()) if len(scores) else None,
+            'max_score': float(scores.max()) if len(scores) else None,
+            'histogram': np.bincount(_buckets(cents), minlength=HISTOGRAM_BINS).tolist(),
+        }
+
+    def _by_site(self, mask):
+        indexes = np.flatnonzero(mask)
+        return indexes[np.argsort(self.site_ids[indexes], kind='stable')]
+
+    def columns(self, mask, sources):
+        """(site_ids, rows x sources) of the masked rows, like whatif.result_columns()"""
+        indexes = self._by_site(mask)
+        matrix = np.column_stack([self.numeric[source][indexes].astype(np.float64) for source in sources])
+        return self.site_ids[indexes], matrix.reshape(-1, len(sources))
+
+    def factor_matrix(self, mask, model):
+        """(site_ids, sites x factors) of the masked rows under `model`, like whatif.factor_matrix()"""
+        indexes = self._by_site(mask)
+        arrays = {}
+        for field in model.fields:
+            source = f'site__{field}'
+            if field in model.category_fields:
+                arrays[field] = np.array(self.values(source, indexes), dtype=object)
+            else:
+                arrays[field] = self.numeric[source][indexes].astype(np.float64)
+        return self.site_ids[indexes], SuitabilityCalculator(model).factor_matrix(arrays)
+
+
+def get_snapshot():
+    """This worker's snapshot, rebuilt if stale, or None when disabled"""
+    if not snapshot_enabled():
+        return None
+
+    version = current_version(VERSION_KEY)
+    if _local['version'] != version:
+        with _lock:
+            if _local['version'] != version:
+                _local['snapshot'] = SiteSnapshot.load()
+                _local['version'] = version
+    return _local['snapshot']
@@ -0,0 +1,228 @@
+import math
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum, F
+from django.db.models.functions import Floor
+from django.utils import timezone
+
+from .models import AnalysisResult, ScoreStatistic
+
+# One bucket per score point; 100.00 is counted in the last bucket
+HISTOGRAM_BINS = 100
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def _to_cents(scores):
+    return np.rint(np.asarray(scores, dtype=np.float64) * 100).astype(np.int64)
+
+
+def _buckets(cents):
+    return np.minimum(cents // 100, HISTOGRAM_BINS - 1)
+
+
+def _group_filter(region, land_type):
+    return {'site__region': region, 'site__land_type': land_type}
+
+
+def apply_score_changes(added=(), removed=()):
+    """
+    Fold written and overwritten scores into the materialized statistics.
+
+    `added` and `removed` are iterables of (region, land_type, score). Call
+    this after the corresponding AnalysisResult rows have been written, in
+    the same transaction.
+    """
+    changes = {}
+    for index, rows in enumerate((added, removed)):
+        for region, land_type, score in rows:
+            changes.setdefault((region, land_type), ([], []))[index].append(float(score))
+    if not changes:
+        return
+
+    with transaction.atomic():
+        ScoreStatistic.objects.bulk_create(
+            [ScoreStatistic(region=r, land_type=l, histogram=[0] * HISTOGRAM_BINS) for r, l in changes],
+            ignore_conflicts=True,
+        )
+        stats = {
+            (stat.region, stat.land_type): stat
+            for stat in ScoreStatistic.objects.select_for_update().filter(
+                region__in={r for r, _ in changes}, land_type__in={l for _, l in changes}
+            )
+            if (stat.region, stat.land_type) in changes
+        }
+        now = timezone.now()
+
+        for (region, land_type), (added_scores, removed_scores) in changes.items():
+            stat = stats[(region, land_type)]
+            added_cents = _to_cents(added_scores)
+            removed_cents = _to_cents(removed_scores)
+
+            stat.result_count += len(added_cents) - len(removed_cents)
+            stat.score_sum += int(added_cents.sum() - removed_cents.sum())
+            stat.score_sumsq += int((added_cents ** 2).sum() - (removed_cents ** 2).sum())
+            histogram = np.array(stat.histogram or [0] * HISTOGRAM_BINS, dtype=np.int64)
+            histogram += np.bincount(_buckets(added_cents), minlength=HISTOGRAM_BINS)
+            histogram -= np.bincount(_buckets(removed_cents), minlength=HISTOGRAM_BINS)
+            stat.histogram = histogram.tolist()
+            stat.updated_at = now
+
+            old_min = None if stat.min_score is None else int(stat.min_score * 100)
+            old_max = None if stat.max_score is None else int(stat.max_score * 100)
+            extreme_removed = len(removed_cents) > 0 and (
+                old_min is None or removed_cents.min() <= old_min or removed_cents.max() >= old_max
+            )
+            if stat.result_count <= 0:
+                stat.min_score = stat.max_score = None
+            elif extreme_removed:
+                bounds = AnalysisResult.objects.filter(**_group_filter(region, land_type)).aggregate(
+                    low=Min('total_suitability_score'), high=Max('total_suitability_score')
+                )
+                stat.min_score, stat.max_score = bounds['low'], bounds['high']
+            elif len(added_cents):
+                low, high = int(added_cents.min()), int(added_cents.max())
+                stat.min_score = Decimal(min(low, old_min) if old_min is not None else low) / 100
+                stat.max_score = Decimal(max(high, old_max) if old_max is not None else high) / 100
+
+        ScoreStatistic.objects.bulk_update(
+            stats.values(),
+            ['result_count', 'score_sum', 'score_sumsq', 'min_score', 'max_score', 'histogram', 'updated_at'],
+        )
+
+
+def _group_queries(queryset):
+    totals = (
+        queryset.order_by()
+        .values(region=F('site__region'), land_type=F('site__land_type'))
+        .annotate(
+            result_count=Count('result_id'),
+            score_sum=Sum('total_suitability_score'),
+            score_sumsq=Sum(F('total_suitability_score') * F('total_suitability_score')),
+            min_score=Min('total_suitability_score'),
+            max_score=Max('total_suitability_score'),
+        )
+    )
+    buckets = (
+        queryset.order_by()
+        .values(region=F('site__region'), land_type=F('site__land_type'), bucket=Floor('total_suitability_score'))
+        .annotate(n=Count('result_id'))
+    )
+    return totals, buckets
+
+
+def _fold_groups(totals, buckets):
+    groups = {}
+    for row in totals:
+        key = (row.pop('region'), row.pop('land_type'))
+        row['score_sum'] = round(float(row['score_sum']) * 100)
+        row['score_sumsq'] = round(float(row['score_sumsq']) * 10000)
+        row['histogram'] = [0] * HISTOGRAM_BINS
+        groups[key] = row
+    for row in buckets:
+        bucket = min(int(row['bucket']), HISTOGRAM_BINS - 1)
+        groups[(row['region'], row['land_type'])]['histogram'][bucket] += row['n']
+    return groups
+
+
+def aggregate_groups(queryset):
+    """
+    Compute per-(region, land_type) statistics straight from `queryset`,
+    an AnalysisResult queryset, in two grouped queries.
+    """
+    totals, buckets = _group_queries(queryset)
+    return _fold_groups(list(totals), list(buckets))
+
+
+async def aaggregate_groups(queryset):
+    """aggregate_groups() with the async ORM"""
+    totals, buckets = _group_queries(queryset)
+    return _fold_groups([row async for row in totals], [row async for row in buckets])
+
+
+def rebuild_statistics(region=None, land_type=None):
+    """
+    Recompute the materialized statistics from analysis_results, for every
+    group or only those matching `region` / `land_type`.
+    """
+    queryset = AnalysisResult.objects.all()
+    stats = ScoreStatistic.objects.all()
+    if region is not None:
+        queryset = queryset.filter(site__region=region)
+        stats = stats.filter(region=region)
+    if land_type is not None:
+        queryset = queryset.filter(site__land_type=land_type)
+        stats = stats.filter(land_type=land_type)
+
+    with transaction.atomic():
+        groups = aggregate_groups(queryset)
+        stats.delete()
+        ScoreStatistic.objects.bulk_create([
+            ScoreStatistic(region=r, land_type=l, **values) for (r, l), values in groups.items()
+        ])
+    return len(groups)
+
+
+def _percentile(histogram, count, q, low, high):
+    target = q / 100 * count
+    cumulative = np.cumsum(histogram)
+    bucket = int(np.searchsorted(cumulative, target, side='left'))
+    before = cumulative[bucket - 1] if bucket else 0
+    in_bucket = histogram[bucket]
+    fraction = (target - before) / in_bucket if in_bucket else 0.0
+    return round(min(max(bucket + fraction, low), high), 2)
+
+
+def summarize(groups):
+    """Merge per-group statistics into the /statistics/ response payload"""
+    groups = list(groups)
+    count = sum(g['result_count'] for g in groups)
+    summary = {
+        'total_sites': count,
+        'avg_score': None,
+        'min_score': None,
+        'max_score': None,
+        'stddev_score': None,
+        'percentiles': {f'p{q}': None for q in PERCENTILES},
+    }
+    if not count:
+        return summary
+
+    total = sum(g['score_sum'] for g in groups)
+    total_sq = sum(g['score_sumsq'] for g in groups)
+    histogram = np.sum([g['histogram'] for g in groups], axis=0)
+    low = float(min(g['min_score'] for g in groups if g['min_score'] is not None))
+    high = float(max(g['max_score'] for g in groups if g['max_score'] is not None))
+
+    mean = total / count
+    variance = max(total_sq / count - mean * mean, 0.0)
+    summary.update({
+        'avg_score': round(mean / 100, 2),
+        'min_score': low,
+        'max_score': high,
+        'stddev_score': round(math.sqrt(variance) / 100, 2),
+        'percentiles': {
+            f'p{q}': _percentile(histogram, count, q, low, high) for q in PERCENTILES
+        },
+    })
+    return summary
+
+
+def _statistic_rows(region, land_type):
+    stats = ScoreStatistic.objects.filter(result_count__gt=0)
+    if region is not None:
+        stats = stats.filter(region=region)
+    if land_type is not None:
+        stats = stats.filter(land_type=land_type)
+    return stats.values('result_count', 'score_sum', 'score_sumsq', 'min_score', 'max_score', 'histogram')
+
+
+def get_statistics(region=None, land_type=None):
+    """Statistics for the results matching the filters, from the materialized groups"""
+    return summarize(_statistic_rows(region, land_type))
+
+
+async def aget_statistics(region=None, land_type=None):
+    """get_statistics() with the async ORM"""
+    return summarize([row async for row in _statistic_rows(region, land_type)])
@@ -1,3 +1,1787 @@
-from django.test import TestCase
+import csv
+import json
+import math
+import os
+import pstats
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import iscoroutinefunction
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from .caching import bump_version, check_shared_cache, current_version, reset_cache_stats, shared_cache
+from .curves import DEFAULT_CURVES, compile_curves, get_scoring_model, invalidate_curves
+from .db import bulk_upsert
+from .export import COLUMNS, export_queryset, iter_chunks
+from .geo import encode_geohash, haversine_km
+from .ingest import import_sites
+from .tiles import tile_bounds
+from .metrics import reset_metrics
+from .middleware import PerformanceMiddleware, QueryBudgetExceeded
+from .jobs import JobContext, JobCancelled, claim_next, job_file, run_worker
+from .models import Site, AnalysisResult, AnalysisParameter, AnalysisRun, IdSequence, RunScore, ScoringCurve, ScoreStatistic, SiteProximity, SiteRanking, Job
+from .proximity import FeatureIndex, PointIndex, cluster_labels, load_features, update_proximity
+from .rankings import RANKING_FIELDS, sync_rankings
+from .runs import prune_superseded_results, record_scores, run_for_weights
+from .screening import NDJSONUploadParser, candidate_frames
+from .selection import budgeted_selection, pareto_front
+from .sensitivity import grid_size, sample_weights, sweep
+from .serializers import AnalysisResultSerializer, SiteSerializer
+from .services import rescore_shard, rescore_sites, rescore_sites_sharded, shard_ranges
+from .snapshot import get_snapshot, invalidate_snapshot
+from .statistics import aggregate_groups, get_statistics, rebuild_statistics, summarize
+from .utils import SuitabilityCalculator, DEFAULT_WEIGHTS, FACTOR_FIELDS, SCORE_FIELDS
+from .views import SiteViewSet
+from .weights import WEIGHT_PARAMETERS, get_default_weights, invalidate_weights
+from .whatif import site_attributes
+
+
+def make_site(**overrides):
+    data = {
+        'site_name': 'Test Site',
+        'latitude': 11.0765,
+        'longitude': 76.9872,
+        'area_sqm': 45000,
+        'solar_irradiance_kwh': 5.8,
+        'grid_distance_km': 2.5,
+        'slope_degrees': 3.2,
+        'road_distance_km': 0.8,
+        'elevation_m': 425,
+        'land_type': 'Agricultural',
+        'region': 'Tamil Nadu',
+    }
+    data.update(overrides)
+    return Site.objects.create(**data)
+
+
+def _around(breakpoints, step=0.01):
+    values = []
+    for bp in breakpoints:
+        values += [
+            bp,
+            np.nextafter(bp, -np.inf),
+            np.nextafter(bp, np.inf),
+            bp - step,
+            bp + step,
+        ]
+    return values
+
+
+# The original hard-coded factor branches, which the built-in curves reproduce
+LEGACY_SCORES = {
+    'solar': lambda x: 100.0 if x >= 5.5 else 0.0 if x < 3.0 else ((x - 3.0) / 2.5) * 100,
+    'area': lambda x: 100.0 if x >= 50000 else 0.0 if x < 5000 else ((x - 5000) / 45000) * 100,
+    'grid': lambda x: 100.0 if x <= 1 else 0.0 if x >= 20 else 100 - ((x - 1) / 19) * 100,
+    'slope': lambda x: (
+        100.0 if x <= 5 else 0.0 if x > 20
+        else 100 - ((x - 5) / 10) * 50 if x <= 15 else 50 - ((x - 15) / 5) * 50
+    ),
+    'infrastructure': lambda x: 100.0 if x <= 0.5 else 0.0 if x >= 5 else 100 - ((x - 0.5) / 4.5) * 100,
+}
+
+
+class SuitabilityCalculatorParityTest(SimpleTestCase):
+    """The built-in curve tables must reproduce the original hard-coded branches"""
+
+    BREAKPOINTS = {
+        'solar': (_around([3.0, 5.5]) + [0.0, 4.0, 4.25, 7.5], 'calculate_solar_score'),
+        'area': (_around([5000, 50000], step=1) + [0, 27500, 12345, 100000], 'calculate_area_score'),
+        'grid': (_around([1, 20]) + [0.0, 7.3, 10.5, 55.0], 'calculate_grid_score'),
+        'slope': (_around([5, 15, 20]) + [0.0, 9.99, 17.5, 45.0], 'calculate_slope_score'),
+        'infrastructure': (_around([0.5, 5]) + [0.0, 2.75, 3.33, 12.0], 'calculate_infrastructure_score'),
+    }
+
+    def setUp(self):
+        self.calculator = SuitabilityCalculator()
+
+    def _reference_total(self, site_data, weights):
+        scores = {key: legacy(site_data[FACTOR_FIELDS[key]]) for key, legacy in LEGACY_SCORES.items()}
+        total = sum(
+            float(scores[key]) * float(weights[key])
+            for key in scores
+            if key in weights
+        )
+        return round(max(0.0, min(100.0, total)), 2), scores
+
+    def test_factor_curves_match_at_breakpoints(self):
+        for key, (values, method) in self.BREAKPOINTS.items():
+            arrays = {field: [0.0] * len(values) for field in FACTOR_FIELDS.values()}
+            arrays[FACTOR_FIELDS[key]] = values
+            _, scores = self.calculator.calculate_batch(arrays)
+
+            expected = [LEGACY_SCORES[key](float(v)) for v in values]
+            for value, got, want in zip(values, scores[key], expected):
+                self.assertEqual(float(got), want, f'{key} score differs at {value!r}')
+                self.assertEqual(getattr(self.calculator, method)(float(value)), want, f'{key} score differs at {value!r}')
+
+    def test_totals_match_legacy_rounding(self):
+        rng = np.random.default_rng(7)
+        n = 5000
+        arrays = {
+            'solar_irradiance_kwh': np.round(rng.uniform(2.0, 7.0, n), 2),
+            'area_sqm': rng.integers(0, 80000, n),
+            'grid_distance_km': np.round(rng.uniform(0.0, 25.0, n), 2),
+            'slope_degrees': np.round(rng.uniform(0.0, 25.0, n), 2),
+            'road_distance_km': np.round(rng.uniform(0.0, 6.0, n), 2),
+        }
+        for weights in (DEFAULT_WEIGHTS, {'solar': 0.5, 'area': 0.3, 'slope': 0.2}):
+            totals, _ = self.calculator.calculate_batch(arrays, weights)
+            for i in range(n):
+                site_data = {field: arrays[field][i].item() for field in arrays}
+                want, _ = self._reference_total(site_data, weights)
+                self.assertEqual(float(totals[i]), want)
+
+    def test_scalar_calculate_wraps_batch(self):
+        site_data = {
+            'solar_irradiance_kwh': 4.2,
+            'area_sqm': 30000,
+            'grid_distance_km': 3.5,
+            'slope_degrees': 16.0,
+            'road_distance_km': 1.1,
+        }
+        total, breakdown = self.calculator.calculate(site_data)
+        totals, scores = self.calculator.calculate_batch({field: [value] for field, value in site_data.items()})
+
+        self.assertEqual(total, float(totals[0]))
+        self.assertEqual(breakdown, {key: float(values[0]) for key, values in scores.items()})
+        self.assertEqual(total, self._reference_total(site_data, DEFAULT_WEIGHTS)[0])
+
+
+class RescoreSitesTest(TestCase):
+
+    def setUp(self):
+        for i in range(12):
+            make_site(site_name=f'Site {i}', solar_irradiance_kwh=3 + i * 0.37,
+                      slope_degrees=i * 1.9, area_sqm=4000 + i * 4100)
+
+    def test_matches_per_site_scoring(self):
+        summary = rescore_sites(chunk_size=5)
+        self.assertEqual(summary['processed'], 12)
+        self.assertEqual(summary['created'], 12)
+
+        bulk = {
+            r.site_id: r.total_suitability_score for r in AnalysisResult.objects.all()
+        }
+        for site in Site.objects.all():
+            site.calculate_suitability_scores()
+        per_site = {
+            r.site_id: r.total_suitability_score for r in AnalysisResult.objects.all()
+        }
+        self.assertEqual(bulk, per_site)
+
+    def test_updates_existing_results_in_place(self):
+        rescore_sites()
+        summary = rescore_sites(weights={'solar': 1.0}, chunk_size=7)
+
+        self.assertEqual(summary['updated'], 12)
+        self.assertEqual(AnalysisResult.objects.count(), 12)
+        for result in AnalysisResult.objects.all():
+            self.assertEqual(result.parameters_snapshot, {'solar': 1.0})
+
+    def test_command(self):
+        call_command('rescore', chunk_size=4, region='Tamil Nadu', stdout=StringIO())
+        self.assertEqual(AnalysisResult.objects.count(), 12)
+
+    def test_upsert_leaves_conflict_target_to_mysql(self):
+        with patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                patch.object(SiteRanking.objects, 'bulk_create') as bulk_create:
+            bulk_upsert(SiteRanking, [], ['site'], ['result'])
+        self.assertIsNone(bulk_create.call_args.kwargs['unique_fields'])
+
+    def test_shard_ranges_cover_every_site_once(self):
+        ranges = shard_ranges(Site.objects.all(), 5)
+        self.assertEqual(len(ranges), 5)
+        sizes = [Site.objects.filter(site_id__gt=low, site_id__lte=high).count() for low, high in ranges]
+        self.assertEqual(sum(sizes), 12)
+        self.assertLessEqual(max(sizes) - min(sizes), 1)
+        self.assertEqual(shard_ranges(Site.objects.none(), 4), [])
+
+    def test_sharded_matches_single_pass(self):
+        rescore_sites()
+        single = {r.site_id: r.total_suitability_score for r in AnalysisResult.objects.all()}
+
+        summary = rescore_sites_sharded(workers=1, shards=4, chunk_size=2)
+        self.assertEqual(summary['processed'], 12)
+        self.assertEqual(summary['updated'], 12)
+        self.assertEqual(summary['shards_done'], 4)
+        self.assertEqual({r.site_id: r.total_suitability_score for r in AnalysisResult.objects.all()}, single)
+        self.assertEqual(RunScore.objects.filter(run_id=summary['run_id']).count(), 12)
+
+    def test_resume_skips_finished_shards(self):
+        calls = []
+
+        def crash_after_first(*args):
+            if calls:
+                raise RuntimeError('worker died')
+            calls.append(args)
+            return rescore_shard(*args)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'rescore.json')
+            with patch('sites.services.rescore_shard', side_effect=crash_after_first):
+                with self.assertRaises(RuntimeError):
+                    rescore_sites_sharded(workers=1, shards=3, checkpoint_path=path)
+            with open(path) as f:
+                state = json.load(f)
+            self.assertEqual(list(state['done']), ['0'])
+            self.assertEqual(AnalysisResult.objects.count(), 4)
+
+            summary = rescore_sites_sharded(workers=1, checkpoint_path=path, resume=True)
+            self.assertEqual(summary['run_id'], state['run_id'])
+            self.assertEqual(summary['processed'], 12)
+            self.assertEqual(summary['shards_done'], 3)
+            self.assertEqual(AnalysisResult.objects.count(), 12)
+            self.assertEqual(AnalysisRun.objects.count(), 1)
+
+            with self.assertRaises(ValueError):
+                rescore_sites_sharded(Site.objects.filter(region='Kerala'), checkpoint_path=path, resume=True)
+
+
+class ParallelRescoreTest(TransactionTestCase):
+    """Worker processes need committed rows and a database they can open"""
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("worker processes can't open an in-memory test database")
+        for i in range(12):
+            make_site(site_name=f'Site {i}', solar_irradiance_kwh=3 + i * 0.37,
+                      slope_degrees=i * 1.9, area_sqm=4000 + i * 4100)
+
+    def test_workers_match_the_serial_path(self):
+        summary = rescore_sites_sharded(weights={'solar': 0.6, 'area': 0.4}, workers=2, shards=4, chunk_size=2)
+        self.assertEqual((summary['processed'], summary['created'], summary['shards_done']), (12, 12, 4))
+        parallel = {r.site_id: r.total_suitability_score for r in AnalysisResult.objects.all()}
+        self.assertEqual(RunScore.objects.filter(run_id=summary['run_id']).count(), 12)
+
+        summary = rescore_sites(weights={'solar': 0.6, 'area': 0.4})
+        self.assertEqual(summary['updated'], 12)
+        self.assertEqual({r.site_id: r.total_suitability_score for r in AnalysisResult.objects.all()}, parallel)
+
+
+class RecalculateEndpointTest(APITestCase):
+
+    def test_recalculate_with_filter_and_weights(self):
+        make_site(region='Karnataka')
+        make_site(region='Tamil Nadu')
+
+        response = self.client.post('/api/analyze/recalculate/', {
+            'region': 'Karnataka', 'solar_weight': 1.0, 'area_weight': 0,
+            'grid_weight': 0, 'slope_weight': 0, 'infra_weight': 0,
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['processed'], 1)
+        result = AnalysisResult.objects.get()
+        self.assertEqual(result.site.region, 'Karnataka')
+        self.assertEqual(float(result.total_suitability_score), 100.0)
+
+
+class ImportSitesTest(TestCase):
+    SAMPLE_CSV = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'solar_sites_data.csv')
+
+    def test_imports_and_scores_sample_data(self):
+        summary = import_sites(self.SAMPLE_CSV, chunk_size=16, weights=DEFAULT_WEIGHTS)
+
+        self.assertEqual(summary['imported'], 50)
+        self.assertEqual(Site.objects.count(), 50)
+        self.assertEqual(SiteRanking.objects.count(), 50)
+        calculator = SuitabilityCalculator()
+        for result in AnalysisResult.objects.select_related('site'):
+            site = result.site
+            total, _ = calculator.calculate({
+                field: float(getattr(site, field)) for field in FACTOR_FIELDS.values()
+            })
+            self.assertEqual(float(result.total_suitability_score), total)
+
+    def test_allocates_ids_from_the_sequence_without_returning_inserts(self):
+        existing = make_site(site_name='Existing')
+        with patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            import_sites(self.SAMPLE_CSV, chunk_size=16, weights=DEFAULT_WEIGHTS)
+            created = make_site(site_name='Created')
+            # A row inserted past the sequence isn't handed out again
+            Site.objects.filter(pk=created.pk).update(site_id=created.pk + 10)
+            later = make_site(site_name='Later')
+        self.assertEqual(
+            sorted(Site.objects.filter(pk__gt=existing.pk, pk__lte=existing.pk + 50).values_list('site_id', flat=True)),
+            list(range(existing.pk + 1, existing.pk + 51)),
+        )
+        self.assertEqual(created.pk, existing.pk + 51)
+        self.assertEqual(later.pk, existing.pk + 62)
+        self.assertEqual(IdSequence.objects.get(name='sites').last_id, later.pk)
+        self.assertEqual(AnalysisResult.objects.count(), 50)
+
+    def test_dry_run_writes_nothing(self):
+        summary = import_sites(self.SAMPLE_CSV, dry_run=True)
+        self.assertEqual(summary['imported'], 50)
+        self.assertEqual(Site.objects.count(), 0)
+
+    def test_rejects_invalid_rows_and_resumes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'sites.csv')
+            with open(self.SAMPLE_CSV) as src, open(path, 'w') as dst:
+                lines = src.read().splitlines()
+                lines[3] = lines[3].replace('Tamil Nadu', '')
+                lines[5] = lines[5].replace(',5.', ',abc', 1)
+                dst.write('\n'.join(lines[:21]) + '\n')
+            checkpoint = os.path.join(tmp, 'checkpoint.json')
+
+            first = import_sites(path, chunk_size=10, checkpoint_path=checkpoint)
+            self.assertEqual(first['rows_read'], 20)
+            self.assertEqual(first['rejected'], 2)
+            self.assertEqual(first['rejected_by_reason'], {
+                'invalid region': 1, 'invalid solar_irradiance_kwh': 1
+            })
+
+            resumed = import_sites(path, chunk_size=10, checkpoint_path=checkpoint, resume=True)
+            self.assertEqual(resumed['rows_read'], 20)
+            self.assertEqual(Site.objects.count(), 18)
+
+
+    def test_resumes_by_record_after_a_failed_chunk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'sites.csv')
+            with open(self.SAMPLE_CSV) as src, open(path, 'w') as dst:
+                lines = src.read().splitlines()
+                # A quoted name spanning two lines is still one record
+                lines[2] = lines[2].replace('Avinashi Industrial Zone', '"Avinashi\nIndustrial Zone"')
+                dst.write('\n'.join(lines[:21]) + '\n')
+            checkpoint = os.path.join(tmp, 'checkpoint.json')
+
+            with patch('sites.ingest.invalidate_snapshot', side_effect=[None, OSError('crashed')]):
+                with self.assertRaises(OSError):
+                    import_sites(path, chunk_size=8, checkpoint_path=checkpoint)
+            self.assertEqual(Site.objects.count(), 8)
+            run = AnalysisRun.objects.get()
+            self.assertEqual((run.checkpoint['rows_read'], run.checkpoint['imported']), (8, 8))
+
+            resumed = import_sites(path, chunk_size=8, checkpoint_path=checkpoint, resume=True)
+            self.assertEqual((resumed['rows_read'], resumed['imported'], resumed['run_id']), (20, 20, run.run_id))
+            self.assertEqual(Site.objects.count(), 20)
+            self.assertEqual(Site.objects.filter(site_name='Avinashi\nIndustrial Zone').count(), 1)
+            expected = [line.split(',')[1] for line in lines[9:21]]
+            self.assertEqual(list(Site.objects.order_by('site_id').values_list('site_name', flat=True)[8:]), expected)
+
+
+class DefaultWeightsTest(APITestCase):
+    WEIGHTS = {'solar': 0.4, 'area': 0.2, 'grid': 0.2, 'slope': 0.1, 'infrastructure': 0.1}
+
+    def setUp(self):
+        invalidate_weights()
+        for key, name in WEIGHT_PARAMETERS.items():
+            AnalysisParameter.objects.create(parameter_name=name, weight_value=self.WEIGHTS[key])
+
+    def tearDown(self):
+        invalidate_weights()
+
+    def test_cached_after_first_load(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_default_weights(), self.WEIGHTS)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_default_weights(), self.WEIGHTS)
+
+    def test_parameter_writes_are_visible_immediately(self):
+        get_default_weights()
+        param = AnalysisParameter.objects.get(parameter_name='solar_irradiance_weight')
+
+        response = self.client.patch(
+            f'/api/analysis-parameters/{param.param_id}/', {'weight_value': '0.5'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_default_weights()['solar'], 0.5)
+
+        param.is_active = False
+        param.save()
+        self.assertEqual(get_default_weights(), DEFAULT_WEIGHTS)
+
+        param.delete()
+        self.assertEqual(get_default_weights(), DEFAULT_WEIGHTS)
+
+    def test_calculate_endpoint_uses_stored_weights(self):
+        response = self.client.post('/api/analyze/calculate/', {
+            'solar_irradiance_kwh': 6, 'area_sqm': 60000, 'grid_distance_km': 0.5,
+            'slope_degrees': 2, 'road_distance_km': 0.2, 'infra_weight': 0.3,
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['weights_used'], {**self.WEIGHTS, 'infrastructure': 0.3})
+
+
+class ScoringCurveTest(APITestCase):
+
+    def setUp(self):
+        invalidate_curves()
+        invalidate_weights()
+        self.site = make_site(land_type='Residential', elevation_m=1200)
+
+    def tearDown(self):
+        invalidate_curves()
+        invalidate_weights()
+
+    def add_curve(self, **data):
+        response = self.client.post('/api/scoring-curves/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def test_land_type_multiplier(self):
+        baseline = self.site.calculate_suitability_scores(weights=DEFAULT_WEIGHTS).total_suitability_score
+        self.add_curve(factor_key='land_type', field_name='land_type', kind='multiplier',
+                       categories={'Residential': 0.5, 'Barren': 1.0})
+
+        result = self.site.calculate_suitability_scores(weights=DEFAULT_WEIGHTS)
+        self.assertAlmostEqual(float(result.total_suitability_score), float(baseline) / 2, delta=0.01)
+        self.assertEqual(result.run.curves['land_type']['categories'], {'Residential': 0.5, 'Barren': 1.0})
+
+        make_site(site_name='Barren', land_type='Barren')
+        make_site(site_name='Unlisted', land_type='Commercial')
+        rescore_sites(weights=DEFAULT_WEIGHTS)
+        totals = dict(AnalysisResult.objects.values_list('site__site_name', 'total_suitability_score'))
+        self.assertEqual((float(totals['Barren']), float(totals['Unlisted'])), (baseline, baseline))
+        self.assertEqual(float(totals['Test Site']), result.total_suitability_score)
+
+    def test_added_score_factor_uses_its_weight_parameter(self):
+        self.add_curve(factor_key='elevation', field_name='elevation_m', points=[[0, 100], [2000, 0]])
+        AnalysisParameter.objects.create(parameter_name='elevation_weight', weight_value='0.1')
+        self.assertEqual(get_default_weights()['elevation'], 0.1)
+
+        response = self.client.post('/api/analyze/calculate/', {
+            'solar_irradiance_kwh': 6, 'area_sqm': 60000, 'grid_distance_km': 0.5,
+            'slope_degrees': 2, 'road_distance_km': 0.2, 'elevation_m': 500,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['breakdown']['elevation'], response.data['total_score']), (75.0, 100.0))
+
+        response = self.client.post('/api/analyze/calculate/', {
+            'solar_irradiance_kwh': 6, 'area_sqm': 60000, 'grid_distance_km': 0.5,
+            'slope_degrees': 2, 'road_distance_km': 0.2,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_curves_are_rejected(self):
+        for data in [
+            {'factor_key': 'elevation', 'field_name': 'elevation_m', 'points': [[100, 0], [0, 100]]},
+            {'factor_key': 'elevation', 'field_name': 'altitude', 'points': [[0, 100], [1, 0]]},
+            {'factor_key': 'region', 'field_name': 'region', 'points': [[0, 100], [1, 0]]},
+            {'factor_key': 'solar', 'field_name': 'solar_irradiance_kwh', 'kind': 'multiplier', 'points': [[0, 1]]},
+        ]:
+            response = self.client.post('/api/scoring-curves/', data, format='json')
+            self.assertEqual(response.status_code, 400, data)
+
+    def test_curve_changes_are_visible_immediately(self):
+        self.assertEqual(get_scoring_model().overrides, {})
+        curve = self.add_curve(factor_key='solar', field_name='solar_irradiance_kwh', points=[[2, 0], [6, 100]])
+        get_scoring_model()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_scoring_model().overrides['solar']['points'], [[2, 0], [6, 100]])
+
+        self.client.patch(f"/api/scoring-curves/{curve['curve_id']}/", {'is_active': False}, format='json')
+        self.assertEqual(get_scoring_model().overrides, {})
+
+
+class ScreeningTest(APITestCase):
+    SITE = {
+        'solar_irradiance_kwh': 5.2, 'area_sqm': 30000, 'grid_distance_km': 3.5,
+        'slope_degrees': 16.0, 'road_distance_km': 1.1,
+    }
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def single(self, site, **weights):
+        response = self.client.post('/api/analyze/calculate/', {**site, **weights}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_list_is_scored_in_order_with_row_errors(self):
+        sites = [
+            {**self.SITE, 'id': 'a'},
+            {**self.SITE, 'id': 'b', 'area_sqm': 'lots', 'slope_degrees': None},
+            'not a site',
+            {**self.SITE, 'id': 'd', 'solar_irradiance_kwh': '6.1'},
+            {**self.SITE, 'id': 'e', 'slope_degrees': 95},
+        ]
+        body = json.loads(self.read(self.client.post('/api/analyze/calculate/', sites, format='json')))
+
+        self.assertEqual((body['scored'], body['failed']), (2, 3))
+        self.assertEqual([row['row'] for row in body['results']], [0, 1, 2, 3, 4])
+        first, bad, invalid, fourth, steep = body['results']
+        self.assertEqual(bad['errors'], {
+            'area_sqm': ['A valid number is required.'], 'slope_degrees': ['This field is required.'],
+        })
+        self.assertIn('non_field_errors', invalid['errors'])
+        self.assertEqual(list(steep['errors']), ['slope_degrees'])
+
+        expected = self.single(self.SITE)
+        self.assertEqual((first['id'], first['total_score'], first['breakdown']),
+                         ('a', expected['total_score'], expected['breakdown']))
+        self.assertEqual(fourth['total_score'], self.single({**self.SITE, 'solar_irradiance_kwh': 6.1})['total_score'])
+
+    def test_csv_and_ndjson_bodies(self):
+        rows = [dict(self.SITE, id=i, area_sqm=5000 + i * 1000) for i in range(12)]
+        rows[5]['grid_distance_km'] = ''
+        upload = StringIO()
+        writer = csv.DictWriter(upload, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+        response = self.client.generic(
+            'POST', '/api/analyze/calculate/?output=csv&area_weight=1', upload.getvalue(), content_type='text/csv',
+        )
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        result = list(csv.DictReader(StringIO(self.read(response))))
+        self.assertEqual([row['id'] for row in result], [str(i) for i in range(12)])
+        self.assertEqual(result[5]['total_score'], '')
+        self.assertIn('grid_distance_km', json.loads(result[5]['errors']))
+        self.assertEqual(float(result[3]['total_score']), self.single(rows[3], area_weight=1)['total_score'])
+
+        body = ''.join(json.dumps(row) + '\n' for row in rows)
+        response = self.client.generic(
+            'POST', '/api/analyze/calculate/?output=ndjson', body, content_type='application/x-ndjson',
+        )
+        lines = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([line['row'] for line in lines], list(range(12)))
+        self.assertEqual(lines[3]['total_score'], self.single(rows[3])['total_score'])
+
+    def test_raw_bodies_are_read_in_pieces(self):
+        class Body(BytesIO):
+            sizes = []
+
+            def read(self, size=-1):
+                self.sizes.append(size)
+                return super().read(size)
+
+        lines = [json.dumps({**self.SITE, 'id': i}) for i in range(2000)]
+        body = Body('\n'.join(lines).encode())
+        candidates = NDJSONUploadParser().parse(body)
+        frames = list(candidate_frames(candidates, chunk_size=500))
+        self.assertEqual([len(frame) for frame in frames], [500] * 4)
+        self.assertTrue(all(0 < size < len(body.getvalue()) for size in Body.sizes))
+
+    def test_file_upload_and_sites_object(self):
+        upload = StringIO('solar_irradiance_kwh,area_sqm,grid_distance_km,slope_degrees,road_distance_km\n5.2,30000,3.5,16,1.1\n')
+        upload.name = 'parcels.csv'
+        response = self.client.post('/api/analyze/calculate/', {'file': upload, 'solar_weight': '1'}, format='multipart')
+        body = json.loads(self.read(response))
+        self.assertEqual(body['weights_used']['solar'], 1.0)
+        self.assertEqual(body['results'][0]['total_score'], self.single(self.SITE, solar_weight=1)['total_score'])
+
+        response = self.client.post('/api/analyze/calculate/', {'sites': [self.SITE], 'area_weight': 2}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/analyze/calculate/', {'sites': 'nope'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ScoreStatisticsTest(APITestCase):
+
+    def assertMatchesLive(self):
+        live = summarize(aggregate_groups(AnalysisResult.objects.all()).values())
+        self.assertEqual(get_statistics(), live)
+        for region in ('Tamil Nadu', 'Karnataka'):
+            queryset = AnalysisResult.objects.filter(site__region=region)
+            self.assertEqual(get_statistics(region=region), summarize(aggregate_groups(queryset).values()))
+
+    def test_incremental_updates_match_live_aggregates(self):
+        import_sites(ImportSitesTest.SAMPLE_CSV, chunk_size=20, weights=DEFAULT_WEIGHTS)
+        self.assertMatchesLive()
+
+        rescore_sites(weights={'solar': 0.6, 'slope': 0.4})
+        self.assertMatchesLive()
+
+        site = Site.objects.order_by('site_id').first()
+        site.region = 'Karnataka'
+        site.save()
+        site.calculate_suitability_scores(weights={'area': 1.0})
+        self.assertMatchesLive()
+
+        top = AnalysisResult.objects.order_by('-total_suitability_score').first()
+        self.client.patch(f'/api/analysis-results/{top.result_id}/', {'total_suitability_score': '12.50'}, format='json')
+        AnalysisResult.objects.order_by('total_suitability_score').first().delete()
+        Site.objects.filter(region='Karnataka').first().delete()
+        self.assertMatchesLive()
+
+        fields = ('region', 'land_type', 'result_count', 'score_sum', 'score_sumsq', 'histogram')
+        before = list(ScoreStatistic.objects.filter(result_count__gt=0).values(*fields))
+        rebuild_statistics()
+        self.assertCountEqual(ScoreStatistic.objects.values(*fields), before)
+
+    def test_endpoint_filters(self):
+        make_site(region='Karnataka').calculate_suitability_scores()
+        make_site(region='Tamil Nadu', solar_irradiance_kwh=4).calculate_suitability_scores()
+        make_site(region='Tamil Nadu', land_type='Industrial').calculate_suitability_scores()
+
+        response = self.client.get('/api/analysis-results/statistics/', {'site__region': 'Tamil Nadu'})
+        self.assertEqual(response.data['total_sites'], 2)
+        self.assertIn('stddev_score', response.data)
+        self.assertEqual(set(response.data['percentiles']), {'p10', 'p25', 'p50', 'p75', 'p90'})
+
+        response = self.client.get('/api/analysis-results/statistics/', {
+            'region': 'Tamil Nadu', 'land_type': 'Industrial'
+        })
+        self.assertEqual(response.data['total_sites'], 1)
+
+        response = self.client.get('/api/analysis-results/statistics/', {'min_score': 90})
+        self.assertEqual(response.data['total_sites'], 2)
+
+
+class SpatialFilterTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = np.random.default_rng(3)
+        cls.points = []
+        for i, (lat, lon) in enumerate(zip(rng.uniform(8, 20, 150), rng.uniform(72, 82, 150))):
+            lat, lon = round(lat, 4), round(lon, 4)
+            make_site(site_name=f'Site {i}', latitude=lat, longitude=lon).calculate_suitability_scores()
+            cls.points.append((lat, lon))
+        make_site(site_name='Fiji', latitude=-17.7, longitude=179.9)
+        make_site(site_name='Samoa', latitude=-13.8, longitude=-172.1)
+
+    def _names(self, url, params):
+        response = self.client.get(url, {**params, 'limit': 1000})
+        self.assertEqual(response.status_code, 200, response.data)
+        return {row['site_name'] for row in response.data['results']}
+
+    def test_geohash_encoding(self):
+        self.assertEqual(encode_geohash(42.605, -5.603, 5), 'ezs42')
+        self.assertEqual(Site.objects.get(site_name='Fiji').geohash, encode_geohash(-17.7, 179.9))
+
+    def test_bbox_matches_brute_force(self):
+        expected = {
+            f'Site {i}' for i, (lat, lon) in enumerate(self.points)
+            if 10 <= lat <= 14.5 and 75.25 <= lon <= 78
+        }
+        params = {'bbox': '75.25,10,78,14.5'}
+        self.assertEqual(self._names('/api/sites/', params), expected)
+        self.assertEqual(self._names('/api/analysis-results/', params), expected)
+
+    def test_bbox_across_antimeridian(self):
+        self.assertEqual(self._names('/api/sites/', {'bbox': '170,-20,-170,-10'}), {'Fiji', 'Samoa'})
+
+    def test_near_matches_haversine(self):
+        def haversine(lat1, lon1, lat2, lon2):
+            lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+            a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+            return 2 * 6371.0088 * math.asin(math.sqrt(a))
+
+        expected = {
+            f'Site {i}' for i, (lat, lon) in enumerate(self.points)
+            if haversine(12.5, 77.0, lat, lon) <= 180
+        }
+        self.assertTrue(expected)
+        params = {'near': '12.5,77.0', 'radius_km': '180'}
+        self.assertEqual(self._names('/api/sites/', params), expected)
+        self.assertEqual(self._names('/api/analysis-results/', params), expected)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/sites/', {'bbox': '1,2,3'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/sites/', {'near': '12,77'}).status_code, 400)
+
+
+class TileEndpointTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(30):
+            make_site(site_name=f'Site {i}', latitude=11 + i * 0.01, longitude=77 + i * 0.01).calculate_suitability_scores()
+        make_site(site_name='Far away', latitude=-33.9, longitude=151.2).calculate_suitability_scores()
+
+    def _tile_for(self, lat, lon, z):
+        n = 2 ** z
+        x = int((lon + 180) / 360 * n)
+        y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+        return z, x, y
+
+    def test_tile_bounds(self):
+        self.assertEqual(tile_bounds(0, 0, 0)[1::2], (-180.0, 180.0))
+        self.assertAlmostEqual(tile_bounds(0, 0, 0)[2], 85.0511, places=4)
+
+    def test_clusters_at_low_zoom(self):
+        response = self.client.get('/api/tiles/0/0/0')
+        self.assertEqual(response.data['type'], 'clusters')
+        counts = [row[2] for row in response.data['data']]
+        self.assertEqual(sum(counts), 31)
+        self.assertEqual(len(counts), 2)
+
+    def test_points_at_high_zoom(self):
+        z, x, y = self._tile_for(11.05, 77.05, 12)
+        response = self.client.get(f'/api/tiles/{z}/{x}/{y}/')
+        self.assertEqual(response.data['type'], 'points')
+        self.assertEqual(response.data['fields'], ['site_id', 'latitude', 'longitude', 'score'])
+        self.assertTrue(response.data['data'])
+
+    def test_etag_and_invalidation(self):
+        url = '/api/tiles/%d/%d/%d/' % self._tile_for(11.1, 77.1, 6)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        far_url = '/api/tiles/%d/%d/%d/' % self._tile_for(-33.9, 151.2, 6)
+        far_etag = self.client.get(far_url)['ETag']
+
+        site = Site.objects.get(site_name='Site 3')
+        site.calculate_suitability_scores(weights={'area': 1.0})
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(far_url, HTTP_IF_NONE_MATCH=far_etag).status_code, 304)
+
+    def test_out_of_range_tile(self):
+        self.assertEqual(self.client.get('/api/tiles/2/4/0/').status_code, 404)
+
+
+class KeysetPaginationTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(45):
+            # Only a handful of distinct scores, so pages split ties
+            make_site(site_name=f'Site {i}', solar_irradiance_kwh=3 + (i % 4) * 0.5).calculate_suitability_scores()
+
+    def _walk(self, url, **params):
+        rows = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            rows += response.data['results']
+            if not response.data['next']:
+                return rows
+            response = self.client.get(response.data['next'])
+
+    def test_walks_results_in_score_order_without_gaps(self):
+        rows = self._walk('/api/analysis-results/', limit=7)
+        keys = [(float(r['total_suitability_score']), r['result_id']) for r in rows]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+        self.assertEqual(len({r['result_id'] for r in rows}), 45)
+
+    def test_walks_sites_by_id(self):
+        rows = self._walk('/api/sites/', limit=10)
+        self.assertEqual([r['site_id'] for r in rows], sorted(Site.objects.values_list('site_id', flat=True)))
+
+    def test_lean_payload_matches_serializer(self):
+        response = self.client.get('/api/analysis-results/', {'limit': 100})
+        expected = AnalysisResultSerializer(
+            AnalysisResult.objects.select_related('site').order_by('-total_suitability_score', '-result_id'),
+            many=True,
+        ).data
+        self.assertEqual(response.json()['results'], [dict(row) for row in expected])
+
+        response = self.client.get('/api/sites/', {'limit': 100})
+        expected = SiteSerializer(Site.objects.with_current_score().order_by('site_id'), many=True).data
+        self.assertEqual(response.json()['results'], [dict(row) for row in expected])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/sites/', {'cursor': 'bogus'}).status_code, 404)
+
+
+class CurrentScoreTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(8):
+            site = make_site(site_name=f'Site {i}', area_sqm=10000 * (i + 1))
+            if i:
+                site.calculate_suitability_scores()
+        AnalysisResult.objects.filter(site__site_name='Site 3').update(total_suitability_score=1)
+        site = Site.objects.get(site_name='Site 3')
+        cls.latest = site.calculate_suitability_scores(weights={'area': 1.0})
+        AnalysisResult.objects.create(**{
+            **{f.name: getattr(cls.latest, f.name) for f in AnalysisResult._meta.concrete_fields if f.name != 'result_id'},
+            'total_suitability_score': 42,
+        })
+
+    def test_site_list_includes_current_score_in_one_query(self):
+        with self.assertNumQueries(1):
+            rows = self.client.get('/api/sites/', {'limit': 100}).json()['results']
+        by_name = {row['site_name']: row for row in rows}
+        self.assertIsNone(by_name['Site 0']['current_score'])
+        self.assertEqual(by_name['Site 3']['current_score'], '42.00')
+        for row in rows:
+            latest = Site.objects.get(pk=row['site_id']).get_latest_score()
+            self.assertEqual(row['current_result_id'], latest and latest.result_id)
+
+    def test_detail_matches_list(self):
+        site = Site.objects.get(site_name='Site 3')
+        data = self.client.get(f'/api/sites/{site.site_id}/').json()
+        self.assertEqual(data['current_score'], '42.00')
+
+    def test_latest_per_site(self):
+        latest = AnalysisResult.objects.latest_per_site()
+        self.assertEqual(latest.count(), 7)
+        self.assertEqual(latest.get(site__site_name='Site 3').total_suitability_score, 42)
+
+
+class ExportTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(12):
+            site = make_site(site_name=f'Site {i}', region='Gujarat' if i % 3 else 'Kerala')
+            site.calculate_suitability_scores()
+            if i % 4 == 0:
+                site.calculate_suitability_scores(weights={'area': 1.0})
+
+    def _latest(self, **filters):
+        return {
+            site.site_id: site.analysisresult_set.order_by('-result_id').first()
+            for site in Site.objects.filter(**filters)
+        }
+
+    def _content(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_has_one_row_per_site_with_latest_scores(self):
+        response = self.client.get('/api/export/', {'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(StringIO(self._content(response))))
+        self.assertEqual(list(rows[0]), COLUMNS)
+        latest = self._latest()
+        self.assertEqual([int(r['site_id']) for r in rows], sorted(latest))
+        for row in rows:
+            result = latest[int(row['site_id'])]
+            self.assertEqual(row['total_suitability_score'], str(result.total_suitability_score))
+
+    def test_json_is_ndjson_and_filtered(self):
+        response = self.client.get('/api/export/', {'format': 'json', 'region': 'Kerala', 'min_score': 0})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self._content(response).splitlines()]
+        self.assertEqual({r['site_id'] for r in rows}, set(self._latest(region='Kerala')))
+        self.assertIsInstance(rows[0]['total_suitability_score'], float)
+
+    def test_chunks_cover_every_site_once(self):
+        chunks = list(iter_chunks(export_queryset(), chunk_size=5))
+        self.assertEqual([len(rows) for rows in chunks], [5, 5, 2])
+        self.assertEqual(len({row[0] for rows in chunks for row in rows}), 12)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/export/', {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/export/', {'min_score': 'high'}).status_code, 400)
+
+
+class WhatIfTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = np.random.default_rng(7)
+        for i in range(40):
+            make_site(
+                site_name=f'Site {i}',
+                region='Kerala' if i % 2 else 'Gujarat',
+                area_sqm=int(rng.integers(1000, 120000)),
+                solar_irradiance_kwh=round(float(rng.uniform(2.5, 7.0)), 2),
+                grid_distance_km=round(float(rng.uniform(0.1, 30.0)), 2),
+                slope_degrees=round(float(rng.uniform(0.0, 25.0)), 2),
+            ).calculate_suitability_scores()
+        make_site(site_name='Unscored')
+
+    def _post(self, **data):
+        return self.client.post('/api/analyze/what-if/', data, format='json')
+
+    def test_rankings_match_stored_factor_scores(self):
+        weight_sets = [{'area_weight': 1.0, 'solar_weight': 0, 'grid_weight': 0, 'slope_weight': 0, 'infra_weight': 0}, {}]
+        response = self._post(weight_sets=weight_sets, limit=1000)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_sites'], 40)
+
+        results = list(AnalysisResult.objects.all())
+        area_only = sorted(((-float(r.area_score), r.site_id) for r in results))
+        self.assertEqual(
+            response.data['rankings'][0]['data'],
+            [[site_id, -score] for score, site_id in area_only],
+        )
+        # Default weights reproduce the stored totals
+        stored = {r.site_id: float(r.total_suitability_score) for r in results}
+        for site_id, score in response.data['rankings'][1]['data']:
+            self.assertAlmostEqual(score, stored[site_id], delta=0.011)
+        self.assertEqual(response.data['rankings'][1]['weights'], get_default_weights())
+
+    def test_limit_and_filters(self):
+        kerala = set(Site.objects.filter(region='Kerala').values_list('site_id', flat=True))
+        response = self._post(weight_sets=[{}], region='Kerala', limit=5)
+        rows = response.data['rankings'][0]['data']
+        self.assertEqual(len(rows), 5)
+        self.assertTrue({site_id for site_id, _ in rows} <= kerala)
+        self.assertEqual([score for _, score in rows], sorted((score for _, score in rows), reverse=True))
+
+        picked = sorted(kerala)[:3]
+        response = self._post(weight_sets=[{}, {'slope_weight': 1}], site_ids=picked)
+        self.assertEqual(response.data['total_sites'], 3)
+        self.assertEqual(len(response.data['rankings']), 2)
+
+    def test_uses_the_active_scoring_curves(self):
+        ScoringCurve.objects.create(factor_key='steepness', field_name='slope_degrees', kind='multiplier',
+                                    points=[[0, 1.0], [25, 0.5]])
+        ScoringCurve.objects.create(factor_key='elevation', field_name='elevation_m', points=[[0, 100], [2000, 0]])
+        AnalysisParameter.objects.create(parameter_name='elevation_weight', weight_value='0.2')
+        rescore_sites()
+        stored = dict(AnalysisResult.objects.values_list('site_id', 'total_suitability_score'))
+
+        for enabled in (False, True):
+            with override_settings(SITE_SNAPSHOT_ENABLED=enabled):
+                response = self._post(weight_sets=[{}, {'solar_weight': 0, 'area_weight': 0, 'grid_weight': 0,
+                                                        'slope_weight': 0, 'infra_weight': 0}], limit=1000)
+            default, elevation_only = response.data['rankings']
+            self.assertEqual(len(default['data']), len(stored))
+            for site_id, score in default['data']:
+                self.assertAlmostEqual(score, float(stored[site_id]), delta=0.011)
+            site = Site.objects.get(pk=elevation_only['data'][0][0])
+            expected = (100 - site.elevation_m / 20) * 0.2 * (1 - float(site.slope_degrees) / 50)
+            self.assertAlmostEqual(elevation_only['data'][0][1], expected, delta=0.011)
+
+    def test_site_attributes_come_from_one_query(self):
+        model = compile_curves({**DEFAULT_CURVES, 'land': {
+            'field': 'land_type', 'kind': 'multiplier', 'categories': {'Barren': 1.0}, 'default': 0.5,
+        }})
+        with self.assertNumQueries(1):
+            site_ids, arrays = site_attributes(AnalysisResult.objects.latest_per_site(), model)
+        sites = Site.objects.in_bulk(site_ids.tolist())
+        self.assertEqual(list(arrays['land_type']), [sites[site_id].land_type for site_id in site_ids.tolist()])
+        self.assertEqual(arrays['area_sqm'].tolist(), [float(sites[site_id].area_sqm) for site_id in site_ids.tolist()])
+
+    def test_nothing_is_saved_and_bad_input_rejected(self):
+        count = AnalysisResult.objects.count()
+        self._post(weight_sets=[{'solar_weight': 1}])
+        self.assertEqual(AnalysisResult.objects.count(), count)
+        self.assertEqual(self._post(weight_sets=[]).status_code, 400)
+        self.assertEqual(self._post(weight_sets=[{'solar_weight': 2}]).status_code, 400)
+
+
+class SelectionTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = np.random.default_rng(11)
+        for i in range(30):
+            make_site(
+                site_name=f'Site {i}',
+                region='Kerala' if i % 3 else 'Gujarat',
+                area_sqm=int(rng.integers(1000, 60000)),
+                solar_irradiance_kwh=round(float(rng.uniform(2.5, 7.0)), 2),
+                grid_distance_km=round(float(rng.uniform(0.1, 30.0)), 2),
+                slope_degrees=round(float(rng.uniform(0.0, 25.0)), 2),
+            ).calculate_suitability_scores()
+
+    def setUp(self):
+        invalidate_snapshot()
+
+    def test_pareto_front_matches_pairwise_check(self):
+        rng = np.random.default_rng(5)
+        for objectives in (1, 2, 3, 4):
+            # Few distinct values, so plenty of ties and duplicates
+            points = rng.integers(0, 6, (300, objectives)).astype(float)
+            dominated = [
+                any((other >= point).all() and (other > point).any() for other in points)
+                for point in points
+            ]
+            with patch('sites.selection.FRONT_BLOCK', 7):
+                np.testing.assert_array_equal(pareto_front(points), ~np.array(dominated))
+
+    def test_budgeted_selection_bounds(self):
+        rng = np.random.default_rng(2)
+        values = rng.uniform(0, 100, 12).round(2)
+        costs = rng.integers(1000, 50000, 12).astype(float)
+        budget = 90000
+        best = max(
+            values[[i for i in range(12) if mask >> i & 1]].sum()
+            for mask in range(1 << 12)
+            if costs[[i for i in range(12) if mask >> i & 1]].sum() <= budget
+        )
+        chosen, upper_bound = budgeted_selection(values, costs, budget)
+        self.assertLessEqual(costs[chosen].sum(), budget)
+        self.assertGreaterEqual(values[chosen].sum(), best / 2)
+        self.assertGreaterEqual(upper_bound, best)
+        self.assertEqual(len(budgeted_selection(values, costs, 500)[0]), 0)
+
+    def test_pareto_endpoint(self):
+        response = self.client.post('/api/analyze/pareto/', {'objectives': ['solar', 'grid'], 'region': 'Kerala'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_sites'], 20)
+        self.assertEqual(response.data['fields'][:3], ['site_id', 'solar_irradiance_score', 'grid_distance_score'])
+
+        scores = {
+            r.site_id: (float(r.solar_irradiance_score), float(r.grid_distance_score))
+            for r in AnalysisResult.objects.filter(site__region='Kerala')
+        }
+        front = {
+            site_id for site_id, point in scores.items()
+            if not any(o[0] >= point[0] and o[1] >= point[1] and o != point for o in scores.values())
+        }
+        self.assertEqual({row[0] for row in response.data['data']}, front)
+        self.assertEqual(response.data['front_size'], len(front))
+
+        with override_settings(SITE_SNAPSHOT_ENABLED=True):
+            snapshot = self.client.post('/api/analyze/pareto/', {'objectives': ['solar', 'grid'], 'region': 'Kerala'}, format='json')
+        self.assertEqual(snapshot.data, response.data)
+
+        bad = self.client.post('/api/analyze/pareto/', {'objectives': ['solar', 'solar']}, format='json')
+        self.assertEqual(bad.status_code, 400)
+
+    def test_portfolio_endpoint(self):
+        response = self.client.post('/api/analyze/portfolio/', {'area_budget': 200000}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(response.data['area_used'], 200000)
+        areas = dict(Site.objects.values_list('site_id', 'area_sqm'))
+        self.assertEqual(sum(areas[row[0]] for row in response.data['data']), response.data['area_used'])
+        self.assertLessEqual(response.data['objective_total'], response.data['upper_bound'])
+        self.assertEqual(self.client.post('/api/analyze/portfolio/', {}, format='json').status_code, 400)
+
+
+class SensitivityTest(APITestCase):
+
+    def setUp(self):
+        self.files = tempfile.TemporaryDirectory()
+        self.addCleanup(self.files.cleanup)
+        override = override_settings(JOB_FILES_DIR=self.files.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_weight_samples_lie_on_the_simplex(self):
+        grid = sample_weights('grid', steps=4, factors=['solar', 'area', 'slope'])
+        self.assertEqual(len(grid), grid_size(3, 4))
+        self.assertEqual(len({tuple(row) for row in grid}), len(grid))
+        np.testing.assert_allclose(grid.sum(axis=1), 1)
+        self.assertFalse(grid[:, [2, 4]].any())
+
+        drawn = sample_weights(samples=500, seed=3)
+        np.testing.assert_allclose(drawn.sum(axis=1), 1)
+        centred = sample_weights(samples=500, center={'solar': 0.7, 'area': 0.3}, concentration=1000, seed=3)
+        np.testing.assert_allclose(centred.mean(axis=0), [0.7, 0.3, 0, 0, 0], atol=0.02)
+
+    def test_sweep_matches_ranking_each_weight_vector(self):
+        rng = np.random.default_rng(0)
+        matrix = rng.uniform(0, 100, (6, 5)).round(2)
+        matrix[0] = 100
+        site_ids = np.arange(1, 7)
+        weights = sample_weights('grid', steps=3)
+
+        expected = []
+        for row in weights:
+            totals = np.round(matrix @ row, 2)
+            order = sorted(range(6), key=lambda i: (-totals[i], i))
+            ranks = np.empty(6, dtype=int)
+            ranks[order] = np.arange(1, 7)
+            expected.append(ranks)
+        expected = np.array(expected).T
+
+        for memory in (1, 10 ** 6):
+            columns = sweep(site_ids, matrix, weights, {'solar': 1.0}, top_k=[2], memory=memory).columns()
+            np.testing.assert_allclose(columns['mean_rank'], expected.mean(axis=1).round(2))
+            np.testing.assert_array_equal(columns['best_rank'], expected.min(axis=1))
+            np.testing.assert_array_equal(columns['worst_rank'], expected.max(axis=1))
+            np.testing.assert_allclose(columns['top_2_probability'], (expected <= 2).mean(axis=1).round(4))
+            np.testing.assert_array_equal(
+                columns['rank_p50'], np.percentile(expected, 50, axis=1, method='inverted_cdf'),
+            )
+        self.assertEqual(columns['top_2_probability'][0], 1.0)
+
+    def test_sweep_job(self):
+        for i in range(8):
+            make_site(site_name=f'Site {i}', solar_irradiance_kwh=3 + i * 0.3, slope_degrees=i * 2.5,
+                      region='Kerala' if i % 2 else 'Gujarat')
+        rescore_sites()
+        response = self.client.post('/api/jobs/', {'kind': 'sensitivity', 'params': {
+            'samples': 50, 'factors': ['solar', 'slope'], 'top_k': [1, 3], 'limit': 2, 'area_weight': 1,
+        }}, format='json')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.data['job_id']
+        self.assertEqual(response.data['params']['base_weights']['area'], 1.0)
+        self.assertEqual(run_worker(once=True), 1)
+
+        job = Job.objects.get(pk=job_id)
+        self.assertEqual((job.status, job.processed, job.total), ('succeeded', 50, 50))
+        self.assertEqual((job.result['sites'], job.result['samples']), (8, 50))
+        self.assertEqual(job.result['factors'], ['solar', 'slope'])
+        self.assertEqual(len(job.result['top_sites']), 2)
+        self.assertIn('top_3_overlap', job.result['stability'])
+
+        response = self.client.get(f'/api/jobs/{job_id}/download/')
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(sum(float(row['top_1_probability']) for row in rows), 1.0)
+
+        site_id = int(rows[0]['site_id'])
+        response = self.client.get(f'/api/jobs/{job_id}/rank-distribution/', {'site_id': site_id})
+        self.assertEqual(sum(bin['count'] for bin in response.data['bins']), 50)
+        self.assertEqual(self.client.get(f'/api/jobs/{job_id}/rank-distribution/', {'site_id': 999999}).status_code, 404)
+
+        bad = self.client.post('/api/jobs/', {'kind': 'sensitivity', 'params': {'method': 'grid', 'steps': 100}}, format='json')
+        self.assertEqual(bad.status_code, 400)
+        self.assertIn('steps', bad.data)
+
+    def test_factors_follow_the_scoring_model(self):
+        ScoringCurve.objects.create(factor_key='elevation', field_name='elevation_m', points=[[0, 100], [2000, 0]])
+        response = self.client.post('/api/jobs/', {'kind': 'sensitivity', 'params': {
+            'samples': 10, 'factors': ['elevation', 'solar'],
+        }}, format='json')
+        self.assertEqual(response.status_code, 202, response.data)
+        self.assertEqual(response.data['params']['factors'], ['solar', 'elevation'])
+        self.assertEqual(sample_weights(samples=10, factors=['elevation'], keys=[*DEFAULT_WEIGHTS, 'elevation'])[:, 5].sum(), 10)
+
+        response = self.client.post('/api/jobs/', {'kind': 'sensitivity', 'params': {'factors': ['bogus']}}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('factors', response.data)
+
+
+class SiteSnapshotTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = np.random.default_rng(3)
+        for i in range(60):
+            make_site(
+                site_name=f'Site {i}',
+                region=['Kerala', 'Gujarat', 'Tamil Nadu'][i % 3],
+                land_type=['Barren', 'Agricultural'][i % 2],
+                area_sqm=int(rng.integers(1000, 120000)),
+                solar_irradiance_kwh=round(float(rng.uniform(2.5, 7.0)), 2),
+                grid_distance_km=round(float(rng.uniform(0.1, 30.0)), 2),
+            ).calculate_suitability_scores()
+        # A second, older result for a few sites
+        for result in AnalysisResult.objects.all()[:5]:
+            result.pk = None
+            result.save()
+
+    def setUp(self):
+        invalidate_snapshot()
+
+    def _both(self, url, params):
+        orm = self.client.get(url, params)
+        with override_settings(SITE_SNAPSHOT_ENABLED=True):
+            get_snapshot()
+            with self.assertNumQueries(0):
+                cached = self.client.get(url, params)
+        self.assertEqual(orm.status_code, 200)
+        self.assertEqual(cached.status_code, 200)
+        return orm.json(), cached.json()
+
+    def test_statistics_match(self):
+        for params in [{}, {'region': 'Kerala'}, {'site__land_type': 'Barren', 'min_score': 40, 'max_score': 70}]:
+            orm, cached = self._both('/api/analysis-results/statistics/', params)
+            self.assertEqual(orm, cached)
+
+    def test_top_sites_match(self):
+        orm, cached = self._both('/api/analysis-results/top_sites/', {'limit': 15, 'min_score': 30})
+        self.assertEqual([r['total_suitability_score'] for r in orm], [r['total_suitability_score'] for r in cached])
+        by_id = {r['result_id']: r for r in orm}
+        for row in cached:
+            if row['result_id'] in by_id:
+                self.assertEqual(row, by_id[row['result_id']])
+
+    def test_score_range_pages_match(self):
+        params = {'site__region': 'Gujarat', 'min_score': 20, 'max_score': 90, 'limit': 4}
+        orm, cached = self._both('/api/analysis-results/', params)
+        self.assertEqual(orm, cached)
+        cursor = parse_qs(urlparse(cached['next']).query)['cursor'][0]
+        orm, cached = self._both('/api/analysis-results/', {**params, 'cursor': cursor})
+        self.assertEqual(orm['results'], cached['results'])
+
+    def test_what_if_matches(self):
+        data = {'weight_sets': [{}, {'area_weight': 1}], 'region': 'Kerala', 'limit': 100}
+        orm = self.client.post('/api/analyze/what-if/', data, format='json').json()
+        with override_settings(SITE_SNAPSHOT_ENABLED=True):
+            cached = self.client.post('/api/analyze/what-if/', data, format='json').json()
+        self.assertEqual(orm, cached)
+
+    @override_settings(SITE_SNAPSHOT_ENABLED=True)
+    def test_rebuilt_after_writes(self):
+        before = get_snapshot()
+        self.assertIs(get_snapshot(), before)
+        make_site(site_name='New').calculate_suitability_scores()
+        self.assertEqual(get_snapshot().size, before.size + 1)
+        rescore_sites(Site.objects.filter(site_name='New'), weights={'area': 1.0})
+        self.assertIsNot(get_snapshot(), before)
+
+
+class AsyncReadTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(12):
+            make_site(
+                site_name=f'Site {i}',
+                region='Kerala' if i % 2 else 'Gujarat',
+                land_type=['Barren', 'Agricultural', 'Industrial'][i % 3],
+                area_sqm=4000 * (i + 1),
+            ).calculate_suitability_scores()
+
+    def _both(self, path, params=None):
+        sync = self.client.get(f'/api/{path}', params)
+        asynchronous = self.client.get(f'/api/async/{path}', params)
+        self.assertEqual(sync.status_code, asynchronous.status_code)
+        data = asynchronous.json()
+        if isinstance(data, dict) and data.get('next'):
+            data['next'] = data['next'].replace('/api/async/', '/api/')
+        return sync.json(), data
+
+    def test_endpoints_match_sync_viewsets(self):
+        site = Site.objects.first()
+        cases = [
+            ('sites/', {'region': 'Kerala', 'limit': 3}),
+            ('sites/', {'lat': 11.0765, 'lng': 76.9872, 'radius_km': 5}),
+            (f'sites/{site.pk}/', None),
+            ('analysis-results/', {'site__land_type': 'Barren', 'min_score': 10}),
+            ('analysis-results/top_sites/', {'limit': 5, 'region': 'Gujarat'}),
+            ('analysis-results/statistics/', {'site__region': 'Kerala'}),
+            ('analysis-results/statistics/', {'min_score': 20, 'max_score': 80}),
+        ]
+        for path, params in cases:
+            sync, asynchronous = self._both(path, params)
+            self.assertEqual(sync, asynchronous, path)
+
+    def test_pages_follow_cursor(self):
+        seen = []
+        url = '/api/async/analysis-results/?limit=5'
+        while url:
+            page = self.client.get(url).json()
+            seen += [row['result_id'] for row in page['results']]
+            url = page['next']
+        expected = AnalysisResult.objects.order_by('-total_suitability_score', '-result_id')
+        self.assertEqual(seen, list(expected.values_list('result_id', flat=True)))
+
+    def test_errors(self):
+        for path, params in [
+            ('sites/999999/', None),
+            ('sites/', {'cursor': 'garbage'}),
+            ('sites/', {'lat': 'x', 'lng': 1, 'radius_km': 1}),
+            ('analysis-results/top_sites/', {'limit': 500}),
+        ]:
+            sync, asynchronous = self._both(path, params)
+            self.assertEqual(sync, asynchronous, path)
+        self.assertEqual(self.client.post('/api/async/sites/').status_code, 405)
+
+    async def test_async_client(self):
+        response = await self.async_client.get('/api/async/analysis-results/top_sites/', {'limit': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+
+
+class LeaderboardTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(20):
+            site = make_site(
+                site_name=f'Site {i}',
+                region='Kerala' if i % 2 else 'Gujarat',
+                area_sqm=5000 * (i + 1),
+            )
+            site.calculate_suitability_scores()
+        # Extra results for one site; only the newest may be ranked
+        cls.rescored = Site.objects.get(site_name='Site 19')
+        best = AnalysisResult.objects.get(site=cls.rescored)
+        for score in (99, 98, 40):
+            best.pk = None
+            best.total_suitability_score = score
+            best.save()
+
+    def _top(self, **params):
+        return self.client.get('/api/analysis-results/top_sites/', params)
+
+    def _expected(self, **filters):
+        latest = AnalysisResult.objects.latest_per_site().filter(**filters)
+        return list(latest.order_by('-total_suitability_score', '-result_id').values_list('result_id', flat=True))
+
+    def test_one_row_per_site_with_latest_score(self):
+        with self.assertNumQueries(2):
+            rows = self._top(limit=100).data
+        self.assertEqual([r['result_id'] for r in rows], self._expected())
+        self.assertEqual(len({r['site'] for r in rows}), 20)
+        rescored = [r for r in rows if r['site'] == self.rescored.site_id]
+        self.assertEqual(rescored[0]['total_suitability_score'], '40.00')
+
+    def test_filters_and_bounds(self):
+        rows = self._top(limit=3, region='Kerala', min_score=30).data
+        self.assertEqual(
+            [r['result_id'] for r in rows],
+            self._expected(site__region='Kerala', total_suitability_score__gte=30)[:3],
+        )
+        self.assertEqual(len(self._top().data), 10)
+        self.assertEqual(self._top(limit=101).status_code, 400)
+        self.assertEqual(self._top(limit='all').status_code, 400)
+
+    def test_kept_in_sync_with_writes(self):
+        site = Site.objects.get(site_name='Site 4')
+        site.region = 'Kerala'
+        site.save()
+        self.assertEqual(SiteRanking.objects.get(site=site).region, 'Kerala')
+
+        AnalysisResult.objects.filter(site=self.rescored).order_by('-result_id').first().delete()
+        self.assertEqual(SiteRanking.objects.get(site=self.rescored).total_suitability_score, 98)
+
+        rescore_sites(Site.objects.filter(region='Gujarat'), weights={'area': 1.0})
+        self.assertEqual([r['result_id'] for r in self._top(limit=100).data], self._expected())
+
+        Site.objects.get(site_name='Site 0').delete()
+        self.assertEqual(SiteRanking.objects.count(), 19)
+
+        expected = sorted(SiteRanking.objects.values_list('site_id', 'result_id', 'region', 'total_suitability_score'))
+        out = StringIO()
+        call_command('rebuild_rankings', stdout=out)
+        self.assertIn('Ranked 19 sites', out.getvalue())
+        self.assertEqual(
+            sorted(SiteRanking.objects.values_list('site_id', 'result_id', 'region', 'total_suitability_score')),
+            expected,
+        )
+
+    def test_sync_upserts_without_conflict_target_on_mysql(self):
+        site = Site.objects.get(site_name='Site 3')
+        with patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                patch.object(SiteRanking.objects, 'bulk_create') as bulk_create:
+            sync_rankings([site.pk])
+        rankings = bulk_create.call_args.args[0]
+        self.assertEqual([ranking.site_id for ranking in rankings], [site.pk])
+        self.assertEqual(bulk_create.call_args.kwargs['unique_fields'], None)
+        self.assertEqual(bulk_create.call_args.kwargs['update_fields'], RANKING_FIELDS)
+
+
+class AnalysisRunTest(APITestCase):
+
+    def setUp(self):
+        for i in range(8):
+            make_site(site_name=f'Site {i}', region='Kerala' if i % 2 else 'Gujarat',
+                      solar_irradiance_kwh=3 + i * 0.4, area_sqm=5000 + i * 9000)
+
+    def test_history_upserts_without_conflict_target_on_mysql(self):
+        run = run_for_weights(DEFAULT_WEIGHTS, 'calculate')
+        site = Site.objects.first()
+        scores = {key: np.array([60.0]) for key in SCORE_FIELDS}
+        with patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                patch.object(RunScore.objects, 'bulk_create') as bulk_create:
+            record_scores(run, [site.pk], np.array([50.0]), scores)
+        self.assertEqual(bulk_create.call_args.args[0][0].total_suitability_score, 5000)
+        self.assertEqual(bulk_create.call_args.kwargs['unique_fields'], None)
+
+    def test_each_rescore_is_a_run_with_history(self):
+        first = rescore_sites(weights=DEFAULT_WEIGHTS)
+        second = rescore_sites(weights={'area': 1.0})
+        self.assertNotEqual(first['run_id'], second['run_id'])
+
+        self.assertEqual(AnalysisResult.objects.count(), 8)
+        self.assertEqual(set(AnalysisResult.objects.values_list('run_id', flat=True)), {second['run_id']})
+        self.assertEqual(RunScore.objects.filter(run_id=first['run_id']).count(), 8)
+        for result in AnalysisResult.objects.all():
+            score = RunScore.objects.get(run_id=second['run_id'], site_id=result.site_id)
+            self.assertEqual(score.total_suitability_score, round(result.total_suitability_score * 100))
+            self.assertEqual(score.area_score, round(result.area_score * 100))
+
+        row = self.client.get(f'/api/analysis-results/{result.result_id}/').json()
+        self.assertEqual((row['run'], row['parameters_snapshot']), (second['run_id'], {'area': 1.0}))
+
+        runs = self.client.get('/api/analysis-runs/').json()['results']
+        self.assertEqual([(r['run_id'], r['site_count']) for r in runs], [(second['run_id'], 8), (first['run_id'], 8)])
+
+        comparison = self.client.get(
+            f"/api/analysis-runs/{first['run_id']}/compare/", {'other': second['run_id'], 'limit': 3}
+        ).json()
+        self.assertEqual(comparison['common_sites'], 8)
+        self.assertEqual(len(comparison['movers']), 3)
+        deltas = [abs(mover[3]) for mover in comparison['movers']]
+        self.assertEqual(deltas, sorted(deltas, reverse=True))
+        site_id, before, after, delta = comparison['movers'][0]
+        self.assertEqual(after, float(AnalysisResult.objects.get(site_id=site_id).total_suitability_score))
+        self.assertAlmostEqual(after - before, delta)
+        self.assertEqual(
+            self.client.get(f"/api/analysis-runs/{first['run_id']}/compare/", {'other': 999}).status_code, 400
+        )
+
+    def test_single_site_scoring_reuses_runs_and_updates_latest(self):
+        site = Site.objects.first()
+        site.calculate_suitability_scores()
+        duplicate = AnalysisResult.objects.get(site=site)
+        duplicate.pk = None
+        duplicate.save()
+
+        result = site.calculate_suitability_scores(weights={'solar': 1.0})
+        self.assertEqual(result.pk, duplicate.pk)
+        self.assertEqual(result.parameters_snapshot, {'solar': 1.0})
+        other = Site.objects.last()
+        self.assertEqual(other.calculate_suitability_scores(weights={'solar': 1}).run_id, result.run_id)
+        self.assertEqual(AnalysisRun.objects.count(), 2)
+
+    def test_import_uses_one_run(self):
+        summary = import_sites(ImportSitesTest.SAMPLE_CSV, chunk_size=20)
+        run = AnalysisRun.objects.get()
+        self.assertEqual((summary['run_id'], run.source), (run.run_id, 'import'))
+        self.assertEqual(run.scores.count(), summary['imported'])
+
+    def test_compaction(self):
+        old = rescore_sites()['run_id']
+        for weights in ({'solar': 1.0}, {'area': 1.0}, {'grid': 1.0}):
+            rescore_sites(weights=weights)
+        # Appended results, as older imports left behind
+        for result in AnalysisResult.objects.filter(site__region='Kerala'):
+            result.pk = None
+            result.total_suitability_score = 55
+            result.save()
+
+        out = StringIO()
+        call_command('compact_runs', keep=1, dry_run=True, stdout=out)
+        self.assertIn('Would remove 4 superseded results and 3 runs (24 history rows)', out.getvalue())
+        self.assertEqual(AnalysisResult.objects.count(), 12)
+
+        call_command('compact_runs', keep=1, stdout=StringIO())
+        self.assertEqual(AnalysisResult.objects.count(), 8)
+        self.assertFalse(AnalysisResult.objects.superseded().exists())
+        self.assertFalse(AnalysisRun.objects.filter(pk=old).exists())
+        self.assertEqual(AnalysisRun.objects.count(), 1)
+        self.assertEqual(
+            get_statistics(), summarize(aggregate_groups(AnalysisResult.objects.all()).values())
+        )
+        self.assertEqual(get_statistics()['total_sites'], 8)
+
+
+    def test_pruning_adjusts_derived_data_once_per_batch(self):
+        rescore_sites()
+        for result in AnalysisResult.objects.all():
+            result.pk = None
+            result.total_suitability_score = 55
+            result.save()
+
+        with patch('sites.signals._site_info') as site_info, CaptureQueriesContext(connection) as queries:
+            self.assertEqual(prune_superseded_results(), 8)
+        site_info.assert_not_called()
+        # Not the eight or so per deleted row that the delete signals cost
+        self.assertLess(len(queries), 20)
+        self.assertEqual(
+            get_statistics(), summarize(aggregate_groups(AnalysisResult.objects.all()).values())
+        )
+
+
+class ResponseCacheTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(6):
+            make_site(site_name=f'Site {i}', area_sqm=6000 * (i + 1)).calculate_suitability_scores()
+        cls.parameter = AnalysisParameter.objects.create(parameter_name='solar_irradiance_weight', weight_value='0.35')
+
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+
+    def test_repeat_and_conditional_requests(self):
+        for url in ['/api/sites/', '/api/analysis-results/top_sites/', '/api/analysis-results/statistics/',
+                    '/api/analysis-parameters/']:
+            first = self.client.get(url, {'limit': 5})
+            self.assertEqual(first['X-Cache'], 'MISS')
+            with self.assertNumQueries(0):
+                second = self.client.get(url, {'limit': 5})
+            self.assertEqual((second['X-Cache'], second['ETag']), ('HIT', first['ETag']))
+            self.assertEqual(second.json(), first.json())
+            with self.assertNumQueries(0):
+                response = self.client.get(url, {'limit': 5}, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, 304)
+            self.assertNotEqual(self.client.get(url, {'limit': 6})['ETag'], first['ETag'])
+
+        stats = self.client.get('/api/cache-stats/').json()
+        self.assertEqual((stats['hits'], stats['misses'], stats['not_modified']), (4, 8, 4))
+        self.assertEqual(stats['hit_rate'], 0.5)
+        self.assertEqual(stats['views']['site-list']['hits'], 1)
+
+    def test_writes_invalidate(self):
+        site = Site.objects.first()
+        before = self.client.get(f'/api/sites/{site.pk}/')
+        site.site_name = 'Renamed'
+        site.save()
+        after = self.client.get(f'/api/sites/{site.pk}/', HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual((after.status_code, after.json()['site_name']), (200, 'Renamed'))
+
+        before = self.client.get('/api/analysis-results/statistics/')
+        rescore_sites(weights={'area': 1.0})
+        after = self.client.get('/api/analysis-results/statistics/')
+        self.assertEqual(after['X-Cache'], 'MISS')
+        self.assertNotEqual(after.json(), before.json())
+
+        before = self.client.get('/api/analysis-parameters/')
+        self.client.patch(f'/api/analysis-parameters/{self.parameter.pk}/', {'weight_value': '0.40'}, format='json')
+        after = self.client.get('/api/analysis-parameters/')
+        self.assertEqual(Decimal(after.json()['results'][0]['weight_value']), Decimal('0.40'))
+        self.assertNotEqual(after['ETag'], before['ETag'])
+
+    def test_shared_cache_tokens(self):
+        self.assertEqual([warning.id for warning in check_shared_cache(None)], ['sites.W001'])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            self.assertFalse(shared_cache())
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+                                                   'LOCATION': 'test_cache_table'}}):
+            self.assertTrue(shared_cache())
+            call_command('createcachetable', verbosity=0)
+            version = current_version('sites:test:version')
+            self.assertEqual(cache.get('sites:test:version'), version)
+            bump_version('sites:test:version')
+            self.assertNotEqual(current_version('sites:test:version'), version)
+            self.assertEqual(check_shared_cache(None), [])
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_disabled(self):
+        response = self.client.get('/api/sites/')
+        self.assertNotIn('ETag', response)
+        self.assertEqual(self.client.get('/api/cache-stats/').json()['hit_rate'], None)
+
+
+class PerformanceMiddlewareTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(30):
+            make_site(site_name=f'Site {i}', area_sqm=3000 * (i + 1)).calculate_suitability_scores()
+
+    def setUp(self):
+        cache.clear()
+        reset_metrics()
+        reset_cache_stats()
+
+    def test_server_timing_and_metrics(self):
+        response = self.client.get('/api/analysis-results/', {'limit': 30})
+        timing = dict(
+            (entry.split(';')[0].strip(), entry) for entry in response['Server-Timing'].split(',')
+        )
+        self.assertEqual(set(timing), {'app', 'db', 'serialize', 'render', 'total', 'cache'})
+        self.assertIn('desc="1 queries"', timing['db'])
+        self.assertGreater(float(timing['serialize'].split('dur=')[1]), 0)
+        self.assertIn('desc="MISS"', timing['cache'])
+        self.client.get('/api/analysis-results/', {'limit': 30})
+
+        metrics = self.client.get('/api/metrics').json()
+        view = metrics['views']['analysisresult-list']
+        self.assertEqual((view['requests'], view['max_queries'], view['mean_queries']), (2, 1, 0.5))
+        self.assertGreater(view['mean_serialize_ms'], 0)
+        self.assertIsNotNone(view['p99_ms'])
+        self.assertEqual(metrics['response_cache']['hits'], 1)
+
+    def test_query_budgets_hold(self):
+        site = Site.objects.first()
+        for url in ['/api/sites/', f'/api/sites/{site.pk}/', '/api/analysis-results/',
+                    '/api/analysis-results/top_sites/', '/api/analysis-results/statistics/',
+                    '/api/analysis-results/statistics/?min_score=10']:
+            cache.clear()
+            self.assertEqual(self.client.get(url, {'limit': 30}).status_code, 200, url)
+        self.assertEqual(self.client.get('/api/metrics/').json()['budget_exceeded'], 0)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_exceeding_budget_fails_strictly(self):
+        with patch.object(SiteViewSet, 'query_budgets', {'list': 0}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/sites/')
+            with override_settings(QUERY_BUDGET_STRICT=False), self.assertLogs('sites.middleware', 'WARNING'):
+                cache.clear()
+                self.assertEqual(self.client.get('/api/sites/').status_code, 200)
+        self.assertEqual(self.client.get('/api/metrics/').json()['views']['site-list']['budget_exceeded'], 2)
+
+    def test_database_cache_queries_are_not_counted(self):
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+                              'LOCATION': 'test_cache_table'}}
+        with override_settings(CACHES=caches):
+            call_command('createcachetable', verbosity=0)
+            for url in ['/api/sites/', '/api/analysis-results/', '/api/analysis-results/top_sites/',
+                        '/api/analysis-results/statistics/', '/api/analysis-parameters/']:
+                for _ in range(2):
+                    self.assertEqual(self.client.get(url).status_code, 200, url)
+        self.assertEqual(self.client.get('/api/metrics/').json()['budget_exceeded'], 0)
+
+    async def test_async_stack(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(PerformanceMiddleware(get_response)))
+        response = await self.async_client.get('/api/async/sites/', {'limit': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+    def test_sampled_profiles(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(PROFILE_SAMPLE_RATE=1.0, PROFILE_DIR=directory):
+                self.client.get('/api/analysis-results/top_sites/')
+            profiles = os.listdir(directory)
+            self.assertEqual(len(profiles), 1)
+            self.assertTrue(profiles[0].startswith('analysisresult-top-sites-'))
+            pstats.Stats(os.path.join(directory, profiles[0]))
+
+    async def test_sampled_profiles_of_async_views(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(PROFILE_SAMPLE_RATE=1.0, PROFILE_DIR=directory):
+                await self.async_client.get('/api/async/sites/', {'limit': 5})
+            profiles = os.listdir(directory)
+            self.assertEqual(len(profiles), 1)
+            stats = pstats.Stats(os.path.join(directory, profiles[0])).stats
+            # The view coroutine ran under the profiler
+            self.assertIn('async_views.py', {os.path.basename(filename) for filename, _, _ in stats})
+
+
+class JobQueueTest(APITestCase):
+
+    def setUp(self):
+        self.files = tempfile.TemporaryDirectory()
+        self.addCleanup(self.files.cleanup)
+        override = override_settings(JOB_FILES_DIR=self.files.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _run(self):
+        out = StringIO()
+        call_command('run_jobs', '--once', stdout=out)
+        return out.getvalue()
+
+    def test_rescore_and_export_jobs(self):
+        for i in range(5):
+            make_site(site_name=f'Site {i}', region='Kerala' if i % 2 else 'Gujarat')
+        response = self.client.post('/api/jobs/', {'kind': 'rescore', 'params': {'area_weight': 1}}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'queued')
+        rescore_id = response.data['job_id']
+        export_id = self.client.post(
+            '/api/jobs/', {'kind': 'export', 'params': {'format': 'json', 'region': 'Kerala'}}, format='json',
+        ).data['job_id']
+
+        self.assertIn('Ran 2 jobs', self._run())
+        job = self.client.get(f'/api/jobs/{rescore_id}/').data
+        self.assertEqual((job['status'], job['processed'], job['total']), ('succeeded', 5, 5))
+        self.assertEqual(job['result']['created'], 5)
+        self.assertEqual(job['result']['weights']['area'], 1.0)
+
+        job = self.client.get(f'/api/jobs/{export_id}/').data
+        self.assertEqual((job['status'], job['result']['rows']), ('succeeded', 2))
+        response = self.client.get(f'/api/jobs/{export_id}/download/')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual({json.loads(line)['region'] for line in lines}, {'Kerala'})
+        self.assertEqual(self.client.get(f'/api/jobs/{rescore_id}/download/').status_code, 404)
+        response.close()
+        job_file(Job.objects.get(pk=export_id), '.ndjson').unlink()
+        self.assertEqual(self.client.get(f'/api/jobs/{export_id}/download/').status_code, 404)
+
+    def test_import_job_from_upload(self):
+        with open(ImportSitesTest.SAMPLE_CSV, 'rb') as f:
+            response = self.client.post('/api/jobs/', {'kind': 'import', 'file': f, 'chunk_size': 20})
+        self.assertEqual(response.status_code, 202)
+        self._run()
+        job = Job.objects.get(pk=response.data['job_id'])
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual((job.result['imported'], job.processed), (50, 50))
+        self.assertEqual(Site.objects.count(), 50)
+
+    def test_cancel_and_failure(self):
+        queued = self.client.post('/api/jobs/', {'kind': 'export', 'params': {}}, format='json').data
+        self.assertEqual(self.client.post(f"/api/jobs/{queued['job_id']}/cancel/").data['status'], 'cancelled')
+
+        running = Job.objects.create(kind='rescore')
+        self.assertEqual(claim_next('test').pk, running.pk)
+        self.assertIsNone(claim_next('test'))
+        self.client.post(f'/api/jobs/{running.job_id}/cancel/')
+        with self.assertRaises(JobCancelled):
+            JobContext(running).progress(1, force=True)
+
+        Job.objects.create(kind='import', params={'path': os.path.join(self.files.name, 'missing.csv')})
+        self.assertEqual(run_worker(once=True), 1)
+        failed = Job.objects.get(kind='import')
+        self.assertEqual(failed.status, 'failed')
+        self.assertIn('missing.csv', failed.error)
+
+        self.assertEqual(self.client.post('/api/jobs/', {'kind': 'delete-everything'}, format='json').status_code, 400)
+
+
+class ProximityTest(TestCase):
+
+    def setUp(self):
+        # Two tight groups of four and one outlier, around 11N 77E
+        self.sites = [
+            make_site(site_name=f'Site {i}', latitude=lat, longitude=lon)
+            for i, (lat, lon) in enumerate([
+                (11.0, 77.0), (11.005, 77.0), (11.0, 77.005), (11.005, 77.005),
+                (11.2, 77.2), (11.205, 77.2), (11.2, 77.205), (11.205, 77.205),
+                (12.0, 78.0),
+            ])
+        ]
+
+    def test_numpy_index_matches_brute_force(self):
+        rng = np.random.default_rng(4)
+        latitudes, longitudes = rng.uniform(10, 14, 400), rng.uniform(75, 80, 400)
+        queries = rng.uniform(8, 16, 150), rng.uniform(73, 82, 150)
+        distances = haversine_km(latitudes[:, None], longitudes[:, None], latitudes, longitudes)
+        np.fill_diagonal(distances, np.inf)
+
+        with patch('sites.proximity.MAX_PAIRS', 40), patch('sites.proximity.QUERY_BATCH', 9):
+            index = PointIndex(latitudes, longitudes, backend='numpy')
+            nearest, _ = index.nearest(*queries)
+            np.testing.assert_allclose(
+                nearest, haversine_km(queries[0][:, None], queries[1][:, None], latitudes, longitudes).min(axis=1),
+                atol=1e-6,
+            )
+            np.testing.assert_allclose(index.nearest_other()[0], distances.min(axis=1), atol=1e-6)
+            for radius in (5, 60):
+                i, j = index.pairs_within(radius)
+                expected = np.argwhere(np.triu(distances <= radius, 1))
+                self.assertEqual(set(zip(i.tolist(), j.tolist())), set(map(tuple, expected.tolist())))
+
+    def test_distance_to_lines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'roads.geojson')
+            with open(path, 'w') as f:
+                json.dump({'type': 'FeatureCollection', 'features': [
+                    {'type': 'Feature', 'properties': {},
+                     'geometry': {'type': 'LineString', 'coordinates': [[77.0, 11.0], [77.3, 11.0], [77.3, 11.4]]}},
+                    {'type': 'Feature', 'properties': {},
+                     'geometry': {'type': 'Point', 'coordinates': [76.5, 10.5]}},
+                ]}, f)
+            starts, ends = load_features(path)
+
+        # Closest to the middle of a segment, to a vertex, and to the point
+        latitudes, longitudes = np.array([11.1, 10.9, 10.5]), np.array([77.15, 77.4, 76.49])
+        expected = [haversine_km(11.1, 77.15, 11.0, 77.15), haversine_km(10.9, 77.4, 11.0, 77.3),
+                    haversine_km(10.5, 76.49, 10.5, 76.5)]
+        for backend in ('numpy', None):
+            index = FeatureIndex(starts, ends, backend=backend, piece_km=5.0)
+            np.testing.assert_allclose(index.nearest(latitudes, longitudes), expected, atol=0.005)
+
+    def test_clusters(self):
+        # 0-1-2 chain of cores, 3 a border point of 2, 4-5 too few
+        labels = cluster_labels(6, np.array([0, 0, 1, 1, 2, 4]), np.array([1, 2, 2, 3, 3, 5]), min_sites=3)
+        np.testing.assert_array_equal(labels, [0, 0, 0, 0, -1, -1])
+
+    def test_update_proximity(self):
+        with tempfile.TemporaryDirectory() as directory:
+            substations = os.path.join(directory, 'substations.csv')
+            with open(substations, 'w') as f:
+                f.write('name,lat,lon\nNorth,11.1,77.1\nEast,12.0,78.2\n')
+            roads = os.path.join(directory, 'roads.csv')
+            with open(roads, 'w') as f:
+                f.write('road_id,latitude,longitude\n1,10.9,77.0\n1,11.3,77.0\n2,12.1,78.0\n2,12.1,78.1\n')
+            summary = update_proximity(substations, roads, radius_km=1.0, cluster_km=1.0, min_sites=4,
+                                       chunk_size=4, backend='numpy')
+
+        self.assertEqual(summary['changed'], 9)
+        self.assertEqual(summary['rescored'], 9)
+        self.assertEqual((summary['clusters'], summary['clustered_sites']), (2, 8))
+
+        site = Site.objects.get(pk=self.sites[0].pk)
+        self.assertEqual(site.grid_distance_km, Decimal(f"{haversine_km(11.0, 77.0, 11.1, 77.1):.2f}"))
+        self.assertEqual(site.road_distance_km, Decimal('0.00'))
+        outlier = Site.objects.get(pk=self.sites[8].pk)
+        self.assertEqual(outlier.road_distance_km, Decimal(f"{haversine_km(12.0, 78.0, 12.1, 78.0):.2f}"))
+
+        result = AnalysisResult.objects.get(site=site)
+        self.assertEqual(result.run_id, summary['run_id'])
+        total, _ = SuitabilityCalculator().calculate_batch(
+            {field: np.array([float(getattr(site, field))]) for field in FACTOR_FIELDS.values()},
+            get_default_weights(),
+        )
+        self.assertEqual(float(result.total_suitability_score), float(total[0]))
+
+        proximity = SiteProximity.objects.get(site=site)
+        self.assertEqual((proximity.neighbour_count, proximity.cluster_id, proximity.cluster_size),
+                         (3, self.sites[0].pk, 4))
+        self.assertIsNone(SiteProximity.objects.get(site=outlier).cluster_id)
+
+        # Nothing moved, so nothing is rewritten
+        again = update_proximity(roads=None, substations=None, backend='numpy')
+        self.assertEqual(again['changed'], 0)
+        self.assertIsNone(again['run_id'])
@@ -0,0 +1,129 @@
+import hashlib
+import math
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, FloatField, Max
+from django.db.models.functions import Cast, Substr
+
+from .caching import bump_versions, current_versions
+from .filters import bbox_q
+from .geo import bbox_prefixes, cell_size
+from .models import AnalysisResult
+
+MAX_ZOOM = 22
+# From this zoom on, tiles list individual sites unless there are too many
+POINTS_MIN_ZOOM = 12
+MAX_POINTS = 2000
+# Clusters per tile edge at low zooms
+CLUSTER_GRID = 8
+TILE_TIMEOUT = 60 * 60
+
+# Tiles are invalidated through version tokens kept per geohash prefix of
+# these lengths; a tile's ETag combines the tokens of the cells it covers.
+VERSION_PRECISIONS = (1, 2)
+
+CLUSTER_FIELDS = ['latitude', 'longitude', 'count', 'mean_score', 'max_score']
+POINT_FIELDS = ['site_id', 'latitude', 'longitude', 'score']
+
+
+def tile_bounds(z, x, y):
+    """(south, west, north, east) of a Web Mercator (slippy map) tile"""
+    n = 2 ** z
+
+    def latitude(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return latitude(y + 1), x / n * 360.0 - 180.0, latitude(y), (x + 1) / n * 360.0 - 180.0
+
+
+def _version_key(prefix):
+    return f'sites:tiles:version:{prefix}'
+
+
+def _version_prefixes(bounds):
+    prefixes = bbox_prefixes(*bounds, max_cells=16)
+    return sorted({p[:min(len(p), VERSION_PRECISIONS[-1])] for p in prefixes})
+
+
+def touch_geohashes(geohashes):
+    """Invalidate every cached tile covering any of the given site geohashes"""
+    bump_versions(sorted({
+        _version_key(geohash[:length])
+        for geohash in geohashes if geohash
+        for length in VERSION_PRECISIONS
+    }))
+
+
+def tile_etag(z, x, y):
+    """ETag for a tile, derived from the version tokens of the cells it covers"""
+    prefixes = _version_prefixes(tile_bounds(z, x, y))
+    versions = current_versions(_version_key(p) for p in prefixes)
+    digest = hashlib.sha1(f'{z}/{x}/{y}'.encode())
+    for prefix in prefixes:
+        digest.update(f'|{prefix}={versions[_version_key(prefix)]}'.encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def _cluster_precision(bounds):
+    width = (bounds[3] - bounds[1]) / CLUSTER_GRID
+    for precision in range(1, 10):
+        if cell_size(precision)[1] <= width:
+            return precision
+    return 9
+
+
+def build_tile(z, x, y):
+    bounds = tile_bounds(z, x, y)
+    results = AnalysisResult.objects.latest_per_site().filter(bbox_q(*bounds, prefix='site__'))
+
+    if z >= POINTS_MIN_ZOOM:
+        points = list(
+            results.order_by('site_id')
+            .values_list('site_id', 'site__latitude', 'site__longitude', 'total_suitability_score')
+            [:MAX_POINTS + 1]
+        )
+        if len(points) <= MAX_POINTS:
+            return {
+                'z': z, 'x': x, 'y': y,
+                'type': 'points',
+                'fields': POINT_FIELDS,
+                'data': [
+                    [site_id, round(float(lat), 6), round(float(lon), 6), float(score)]
+                    for site_id, lat, lon, score in points
+                ],
+            }
+
+    clusters = (
+        results.order_by()
+        .values(cell=Substr('site__geohash', 1, _cluster_precision(bounds)))
+        .annotate(
+            count=Count('result_id'),
+            mean_score=Avg('total_suitability_score'),
+            max_score=Max('total_suitability_score'),
+            latitude=Avg(Cast(F('site__latitude'), FloatField())),
+            longitude=Avg(Cast(F('site__longitude'), FloatField())),
+        )
+    )
+    return {
+        'z': z, 'x': x, 'y': y,
+        'type': 'clusters',
+        'fields': CLUSTER_FIELDS,
+        'data': [
+            [
+                round(row['latitude'], 6), round(row['longitude'], 6), row['count'],
+                round(float(row['mean_score']), 2), float(row['max_score']),
+            ]
+            for row in clusters
+        ],
+    }
+
+
+def get_tile(z, x, y, etag=None):
+    """Tile payload, served from the cache while none of its cells have changed"""
+    etag = etag or tile_etag(z, x, y)
+    key = f'sites:tile:{z}:{x}:{y}:' + etag.strip('"')
+    payload = cache.get(key)
+    if payload is None:
+        payload = build_tile(z, x, y)
+        cache.set(key, payload, timeout=TILE_TIMEOUT)
+    return payload
@@ -1,13 +1,27 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'sites', views.SiteViewSet)
 router.register(r'analysis-results', views.AnalysisResultViewSet)
 router.register(r'analysis-parameters', views.AnalysisParameterViewSet)
+router.register(r'analysis-runs', views.AnalysisRunViewSet)
+router.register(r'scoring-curves', views.ScoringCurveViewSet)
 router.register(r'analyze', views.SuitabilityAnalysisViewSet, basename='analyze')
+router.register(r'jobs', views.JobViewSet)
 
 urlpatterns = [
     path('api/', include(router.urls)),
-]
\ No newline at end of file
+    path('api/export/', views.export_sites, name='export'),
+    path('api/metrics/', views.MetricsView.as_view(), name='metrics'),
+    path('api/metrics', views.MetricsView.as_view()),
+    path('api/cache-stats/', views.CacheStatsView.as_view(), name='cache-stats'),
+    path('api/tiles/<int:z>/<int:x>/<int:y>/', views.TileView.as_view(), name='tile'),
+    path('api/tiles/<int:z>/<int:x>/<int:y>', views.TileView.as_view()),
+    path('api/async/sites/', async_views.site_list, name='async-site-list'),
+    path('api/async/sites/<int:pk>/', async_views.site_detail, name='async-site-detail'),
+    path('api/async/analysis-results/', async_views.result_list, name='async-result-list'),
+    path('api/async/analysis-results/top_sites/', async_views.top_sites, name='async-top-sites'),
+    path('api/async/analysis-results/statistics/', async_views.statistics, name='async-statistics'),
+]
@@ -1,70 +1,124 @@
+import numpy as np
+
+from .curves import DEFAULT_CURVES, compile_curves
+
+DEFAULT_WEIGHTS = {
+    'solar': 0.35,
+    'area': 0.25,
+    'grid': 0.20,
+    'slope': 0.15,
+    'infrastructure': 0.05
+}
+
+# Score key -> site attribute the built-in factor is computed from
+FACTOR_FIELDS = {key: curve['field'] for key, curve in DEFAULT_CURVES.items()}
+
+# Score key -> AnalysisResult field
+SCORE_FIELDS = {
+    'solar': 'solar_irradiance_score',
+    'area': 'area_score',
+    'grid': 'grid_distance_score',
+    'slope': 'slope_score',
+    'infrastructure': 'infrastructure_score'
+}
+
+
+def round_scores(values, ndigits=2):
+    """Round an array exactly like the builtin round() does for each element"""
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, ndigits)
+
+    # np.round scales by 10**ndigits before rounding, which can land on the
+    # wrong side of a tie; re-round values close to a half with the builtin.
+    scaled = values * (10 ** ndigits)
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_half.any():
+        rounded[near_half] = [round(float(v), ndigits) for v in values[near_half]]
+    return rounded
+
+
 class SuitabilityCalculator:
-    
+    """
+    Scores sites with a compiled set of factor curves (see curves.py).
+
+    Without a model the built-in DEFAULT_CURVES are used; callers that
+    should honour configured curves pass curves.get_scoring_model().
+    """
+
+    def __init__(self, model=None):
+        self.model = model if model is not None else compile_curves()
+
+    def calculate_batch(self, arrays, weights=None):
+        """
+        Score many sites at once.
+
+        `arrays` maps each site field the curves use to a sequence of
+        values (a dict of lists, dict of arrays or a DataFrame all work).
+        Returns the rounded total scores and a dict of per-factor arrays,
+        both in input order: 0-100 scores for score factors and the
+        factor itself for multipliers.
+        """
+        if weights is None:
+            weights = DEFAULT_WEIGHTS
+
+        scores = self.factor_scores(arrays)
+
+        total = None
+        for curve in self.model.scores:
+            if curve.key in weights:
+                weighted = scores[curve.key] * float(weights[curve.key])
+                total = weighted if total is None else total + weighted
+        if total is None:
+            total = np.zeros(len(scores[self.model.curves[0].key]))
+        for curve in self.model.multipliers:
+            total = total * scores[curve.key]
+        total = np.clip(total, 0.0, 100.0)
+
+        return round_scores(total, 2), scores
+
+    def factor_scores(self, arrays):
+        """Factor key -> unweighted values of every curve, for `arrays` as in calculate_batch"""
+        return {curve.key: curve(arrays[curve.field]) for curve in self.model.curves}
+
+    def factor_matrix(self, arrays):
+        """
+        Sites x score factors, each row scaled by the site's multipliers.
+
+        Multipliers scale the weighted sum, so scaling the factors first
+        gives the same totals from one matrix product per weight set.
+        """
+        scores = self.factor_scores(arrays)
+        size = len(next(iter(scores.values()))) if scores else 0
+        matrix = np.column_stack([scores[curve.key] for curve in self.model.scores]).reshape(size, -1)
+        for curve in self.model.multipliers:
+            matrix = matrix * scores[curve.key][:, None]
+        return matrix
+
+    def factor_score(self, key, value):
+        """One site's score for the factor `key`"""
+        curve = next(curve for curve in self.model.curves if curve.key == key)
+        return float(curve([value])[0])
+
     def calculate_solar_score(self, solar_irradiance_kwh):
-        if solar_irradiance_kwh >= 5.5:
-            return 100.0
-        elif solar_irradiance_kwh < 3.0:
-            return 0.0
-        else:
-            return ((solar_irradiance_kwh - 3.0) / 2.5) * 100
+        return self.factor_score('solar', solar_irradiance_kwh)
 
     def calculate_area_score(self, area_sqm):
-        if area_sqm >= 50000:
-            return 100.0
-        elif area_sqm < 5000:
-            return 0.0
-        else:
-            return ((area_sqm - 5000) / 45000) * 100
+        return self.factor_score('area', area_sqm)
 
     def calculate_grid_score(self, grid_distance_km):
-        if grid_distance_km <= 1:
-            return 100.0
-        elif grid_distance_km >= 20:
-            return 0.0
-        else:
-            return 100 - ((grid_distance_km - 1) / 19) * 100
+        return self.factor_score('grid', grid_distance_km)
 
     def calculate_slope_score(self, slope_degrees):
-        if slope_degrees <= 5:
-            return 100.0
-        elif slope_degrees > 20:
-            return 0.0
-        elif slope_degrees <= 15:
-            return 100 - ((slope_degrees - 5) / 10) * 50
-        else:
-            return 50 - ((slope_degrees - 15) / 5) * 50
+        return self.factor_score('slope', slope_degrees)
 
     def calculate_infrastructure_score(self, road_distance_km):
-        if road_distance_km <= 0.5:
-            return 100.0
-        elif road_distance_km >= 5:
-            return 0.0
-        else:
-            return 100 - ((road_distance_km - 0.5) / 4.5) * 100
+        return self.factor_score('infrastructure', road_distance_km)
 
     def calculate(self, site_data, weights=None):
-        if weights is None:
-            weights = {
-                'solar': 0.35,
-                'area': 0.25,
-                'grid': 0.20,
-                'slope': 0.15,
-                'infrastructure': 0.05
-            }
-        
-        scores = {
-            'solar': self.calculate_solar_score(site_data['solar_irradiance_kwh']),
-            'area': self.calculate_area_score(site_data['area_sqm']),
-            'grid': self.calculate_grid_score(site_data['grid_distance_km']),
-            'slope': self.calculate_slope_score(site_data['slope_degrees']),
-            'infrastructure': self.calculate_infrastructure_score(site_data['road_distance_km'])
-        }
-        
-        total = sum(
-            float(scores[key]) * float(weights[key])
-            for key in scores
-            if key in weights
-        )
-        total = max(0.0, min(100.0, total))
-        
-        return round(total, 2), scores
\ No newline at end of file
+        missing = [field for field in self.model.fields if field not in site_data]
+        if missing:
+            raise ValueError(f"Missing site attributes: {', '.join(missing)}")
+        arrays = {field: [site_data[field]] for field in self.model.fields}
+        total, scores = self.calculate_batch(arrays, weights)
+
+        return float(total[0]), {key: float(values[0]) for key, values in scores.items()}
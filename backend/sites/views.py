@@ -1,30 +1,147 @@
+import uuid
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+import numpy as np
+
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Site, AnalysisResult, AnalysisParameter
+from .caching import ConditionalCacheMixin, cache_stats, etag_matches
+from .curves import VERSION_KEY as CURVES_VERSION_KEY, get_scoring_model
+from .export import CONTENT_TYPES, EXPORT_FORMATS, STREAMERS, export_queryset, iter_chunks, parquet_available
+from .filters import SpatialFilterBackend
+from .pagination import SiteKeysetPagination, ResultKeysetPagination
+from .payloads import renderer_for
+from .metrics import metrics_snapshot
+from .jobs import cancel, enqueue, job_file, job_files_dir
+from .models import Site, AnalysisResult, AnalysisParameter, AnalysisRun, RunScore, ScoringCurve, Job
 from .serializers import (
     SiteSerializer, 
     AnalysisResultSerializer, 
     AnalysisParameterSerializer,
-    SuitabilityCalculatorSerializer
+    AnalysisRunSerializer,
+    ScoringCurveSerializer,
+    RunCompareSerializer,
+    ScreenSerializer,
+    SuitabilityCalculatorSerializer,
+    RecalculateSerializer,
+    TopSitesSerializer,
+    JobSerializer,
+    ExportJobSerializer,
+    ImportJobSerializer,
+    SensitivityJobSerializer,
+    ParetoSerializer,
+    PortfolioSerializer,
+    WhatIfSerializer
+)
+from .rankings import top_rankings
+from .runs import compare_runs
+from .screening import (
+    SCREEN_FORMATS, CandidateFile, CSVUploadParser, NDJSONUploadParser, screen, stream_csv, stream_json,
+    stream_ndjson, uploaded_candidates,
 )
+from .selection import AREA, OBJECTIVES, budgeted_selection, pareto_front, population
+from .sensitivity import rank_distribution
+from .services import rescore_sites
+from .snapshot import VERSION_KEY as SITES_VERSION_KEY, get_snapshot
+from .statistics import aggregate_groups, get_statistics, summarize
+from .tiles import MAX_ZOOM, get_tile, tile_etag
 from .utils import SuitabilityCalculator
+from .weights import VERSION_KEY as WEIGHTS_VERSION_KEY, get_default_weights
+from .whatif import factor_keys, factor_matrix, rank_weight_sets
+
+# Weight key -> request field overriding it
+WEIGHT_FIELDS = {
+    'solar': 'solar_weight',
+    'area': 'area_weight',
+    'grid': 'grid_weight',
+    'slope': 'slope_weight',
+    'infrastructure': 'infra_weight'
+}
+
+
+def request_weights(data):
+    """Default weights with any weights supplied in the request applied"""
+    weights = get_default_weights()
+    for key, field in WEIGHT_FIELDS.items():
+        if data.get(field) is not None:
+            weights[key] = float(data[field])
+    return weights
+
+
+def top_sites_serializer(params):
+    """TopSitesSerializer bound to query params, accepting site__ aliases"""
+    return TopSitesSerializer(data={
+        **{key: params[key] for key in ('limit', 'min_score', 'max_score') if key in params},
+        **{key: params.get(f'site__{key}', params.get(key)) for key in ('region', 'land_type')
+           if f'site__{key}' in params or key in params},
+    })
+
+
+def selection_filters(data):
+    """Population filters of a SelectionSerializer's validated data"""
+    return {key: data.get(key) for key in ('region', 'land_type', 'min_score', 'max_score', 'site_ids')}
+
 
-class SiteViewSet(viewsets.ModelViewSet):
-    queryset = Site.objects.all()
+def group_params(params):
+    """(region, land_type) filters, accepting site__ aliases"""
+    return (
+        params.get('site__region', params.get('region')),
+        params.get('site__land_type', params.get('land_type')),
+    )
+
+
+class LeanListMixin:
+    """
+    Render list pages from ``.values()`` rows rather than model and
+    serializer instances; the payload is identical either way.
+    """
+    lean_list = True
+
+    def list(self, request, *args, **kwargs):
+        if not self.lean_list:
+            return super().list(request, *args, **kwargs)
+
+        renderer = renderer_for(self.get_serializer_class())
+        queryset = renderer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(renderer.render(page))
+        return Response(renderer.render(queryset))
+
+class SiteViewSet(ConditionalCacheMixin, LeanListMixin, viewsets.ModelViewSet):
+    queryset = Site.objects.with_current_score()
+    cache_version_keys = (SITES_VERSION_KEY,)
+    query_budgets = {'list': 1, 'retrieve': 1}
     serializer_class = SiteSerializer
-    filter_backends = [DjangoFilterBackend]
+    pagination_class = SiteKeysetPagination
+    filter_backends = [DjangoFilterBackend, SpatialFilterBackend]
     filterset_fields = ['region', 'land_type']
 
-class AnalysisResultViewSet(viewsets.ModelViewSet):
+class AnalysisResultViewSet(ConditionalCacheMixin, LeanListMixin, viewsets.ModelViewSet):
     queryset = AnalysisResult.objects.all()
+    cache_version_keys = (SITES_VERSION_KEY,)
+    cached_actions = ('list', 'retrieve', 'top_sites', 'statistics')
+    query_budgets = {'list': 1, 'retrieve': 1, 'top_sites': 2, 'statistics': 2}
     serializer_class = AnalysisResultSerializer
-    filter_backends = [DjangoFilterBackend]
+    pagination_class = ResultKeysetPagination
+    filter_backends = [DjangoFilterBackend, SpatialFilterBackend]
     filterset_fields = ['site__region', 'site__land_type']
+    spatial_field_prefix = 'site__'
+
+    # Query parameters the in-memory snapshot can answer on its own
+    snapshot_params = {'site__region', 'site__land_type', 'min_score', 'max_score', 'limit', 'cursor'}
 
     def get_queryset(self):
-        queryset = AnalysisResult.objects.select_related('site').all()
+        queryset = AnalysisResult.objects.select_related('site', 'run').all()
         
         # Filter by score range
         min_score = self.request.query_params.get('min_score')
@@ -37,46 +154,125 @@ class AnalysisResultViewSet(viewsets.ModelViewSet):
             
         return queryset
 
+    def get_snapshot(self, extra_params=()):
+        """The site snapshot, if enabled and able to serve this request"""
+        if not set(self.request.query_params) <= self.snapshot_params | set(extra_params):
+            return None
+        return get_snapshot()
+
+    def snapshot_mask(self, snapshot):
+        params = self.request.query_params
+        return snapshot.mask(
+            region=params.get('site__region', params.get('region')),
+            land_type=params.get('site__land_type', params.get('land_type')),
+            min_score=params.get('min_score'),
+            max_score=params.get('max_score'),
+        )
+
+    def list(self, request, *args, **kwargs):
+        snapshot = self.get_snapshot()
+        if snapshot is None or not self.lean_list or getattr(self.paginator, 'ordering', None) != ResultKeysetPagination.ordering:
+            return super().list(request, *args, **kwargs)
+
+        mask = self.snapshot_mask(snapshot)
+        page = self.paginator.paginate_fetch(
+            lambda after, count: snapshot.rows(snapshot.ranked(mask, count, after)), request
+        )
+        return self.get_paginated_response(renderer_for(self.get_serializer_class()).render(page))
+
     @action(detail=False, methods=['get'])
     def top_sites(self, request):
-        limit = int(request.query_params.get('limit', 10))
-        queryset = self.get_queryset().order_by('-total_suitability_score')[:limit]
-        serializer = self.get_serializer(queryset, many=True)
+        """Best current result of each site, at most MAX_TOP_SITES of them"""
+        serializer = top_sites_serializer(request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        snapshot = self.get_snapshot(extra_params={'region', 'land_type'})
+        if snapshot is not None:
+            mask = snapshot.mask(
+                region=data.get('region'), land_type=data.get('land_type'),
+                min_score=data.get('min_score'), max_score=data.get('max_score'), latest_only=True,
+            )
+            rows = snapshot.rows(snapshot.ranked(mask, data['limit']))
+            return Response(renderer_for(self.get_serializer_class()).render(rows))
+
+        results = top_rankings(
+            data['limit'], region=data.get('region'), land_type=data.get('land_type'),
+            min_score=data.get('min_score'), max_score=data.get('max_score'),
+        )
+        serializer = self.get_serializer(results, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def statistics(self, request):
-        from django.db.models import Avg, Max, Min, StdDev, Count
-        
-        stats = AnalysisResult.objects.aggregate(
-            total_sites=Count('result_id'),
-            avg_score=Avg('total_suitability_score'),
-            min_score=Min('total_suitability_score'),
-            max_score=Max('total_suitability_score'),
-        )
-        
-        return Response(stats)
+        params = request.query_params
+        region, land_type = group_params(params)
+
+        snapshot = self.get_snapshot(extra_params={'region', 'land_type'})
+        if snapshot is not None:
+            return Response(summarize([snapshot.group_statistics(self.snapshot_mask(snapshot))]))
+
+        if 'min_score' in params or 'max_score' in params:
+            # Score ranges cut across the materialized groups
+            queryset = self.get_queryset()
+            if region is not None:
+                queryset = queryset.filter(site__region=region)
+            if land_type is not None:
+                queryset = queryset.filter(site__land_type=land_type)
+            return Response(summarize(aggregate_groups(queryset).values()))
+
+        return Response(get_statistics(region, land_type))
+
+class AnalysisRunViewSet(viewsets.ReadOnlyModelViewSet):
+    """Scoring runs, newest first, with the number of sites each one scored"""
+    # Counted per run on the (run, site) index, only for the runs returned
+    queryset = AnalysisRun.objects.annotate(site_count=Coalesce(Subquery(
+        RunScore.objects.filter(run=OuterRef('pk')).order_by().values('run').annotate(n=Count('*')).values('n')
+    ), 0)).order_by('-run_id')
+    serializer_class = AnalysisRunSerializer
+    query_budgets = {'list': 2, 'retrieve': 1, 'compare': 4}
 
-class AnalysisParameterViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'])
+    def compare(self, request, pk=None):
+        """Score changes from this run to ?other=<run_id>"""
+        serializer = RunCompareSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        base = self.get_object()
+        other = AnalysisRun.objects.filter(pk=serializer.validated_data['other']).first()
+        if other is None:
+            return Response({'other': ['No such run.']}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(compare_runs(base, other, serializer.validated_data['limit']))
+
+class AnalysisParameterViewSet(ConditionalCacheMixin, viewsets.ModelViewSet):
     queryset = AnalysisParameter.objects.all()
+    cache_version_keys = (WEIGHTS_VERSION_KEY,)
+    query_budgets = {'list': 2, 'retrieve': 1}
     serializer_class = AnalysisParameterSerializer
 
+class ScoringCurveViewSet(ConditionalCacheMixin, viewsets.ModelViewSet):
+    queryset = ScoringCurve.objects.all()
+    cache_version_keys = (CURVES_VERSION_KEY,)
+    query_budgets = {'list': 2, 'retrieve': 1}
+    serializer_class = ScoringCurveSerializer
+
 class SuitabilityAnalysisViewSet(viewsets.ViewSet):
     
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], parser_classes=[
+        JSONParser, FormParser, MultiPartParser, CSVUploadParser, NDJSONUploadParser,
+    ])
     def calculate(self, request):
-        serializer = SuitabilityCalculatorSerializer(data=request.data)
+        data = request.data
+        if isinstance(data, (list, CandidateFile)) or 'sites' in data or 'file' in request.FILES:
+            return self.screen(request)
+
+        serializer = SuitabilityCalculatorSerializer(data=data)
         if serializer.is_valid():
-            calculator = SuitabilityCalculator()
+            calculator = SuitabilityCalculator(get_scoring_model())
             data = serializer.validated_data
             
-            weights = {
-                'solar': data.get('solar_weight', 0.35),
-                'area': data.get('area_weight', 0.25),
-                'grid': data.get('grid_weight', 0.20),
-                'slope': data.get('slope_weight', 0.15),
-                'infrastructure': data.get('infra_weight', 0.05)
-            }
+            weights = request_weights(data)
             
             site_data = {
                 'solar_irradiance_kwh': data['solar_irradiance_kwh'],
@@ -85,8 +281,15 @@ class SuitabilityAnalysisViewSet(viewsets.ViewSet):
                 'slope_degrees': data['slope_degrees'],
                 'road_distance_km': data['road_distance_km']
             }
+            # Attributes only configured curves use
+            site_data.update({
+                field: data[field] for field in ('elevation_m', 'land_type', 'region') if field in data
+            })
             
-            total_score, breakdown = calculator.calculate(site_data, weights)
+            try:
+                total_score, breakdown = calculator.calculate(site_data, weights)
+            except ValueError as error:
+                return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
             
             return Response({
                 'total_score': total_score,
@@ -94,4 +297,313 @@ class SuitabilityAnalysisViewSet(viewsets.ViewSet):
                 'weights_used': weights
             })
         
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def screen(self, request):
+        """
+        Score a batch of candidate sites: a JSON list, {"sites": [...]},
+        a CSV or NDJSON body, or a multipart `file` upload. Weights and
+        `output` (json, ndjson or csv) come from the query string, or
+        the JSON object / form fields alongside the candidates.
+        """
+        data = request.data
+        params = request.query_params.dict()
+        if isinstance(data, (list, CandidateFile)):
+            source = data
+        elif 'file' in request.FILES:
+            source = uploaded_candidates(request.FILES['file'])
+            params.update({key: value for key, value in data.dict().items() if key != 'file'})
+        else:
+            source = data['sites']
+            if not isinstance(source, list):
+                return Response({'sites': ['Expected a list of sites.']}, status=status.HTTP_400_BAD_REQUEST)
+            params.update({key: value for key, value in data.items() if key != 'sites'})
+
+        serializer = ScreenSerializer(data=params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        weights = request_weights(serializer.validated_data)
+        model = get_scoring_model()
+        output = serializer.validated_data['output']
+
+        chunks = screen(source, weights, model)
+        if output == 'csv':
+            content = stream_csv(chunks, model)
+        elif output == 'ndjson':
+            content = stream_ndjson(chunks)
+        else:
+            content = stream_json(chunks, weights)
+        return StreamingHttpResponse(content, content_type=SCREEN_FORMATS[output])
+
+    @action(detail=False, methods=['post'])
+    def recalculate(self, request):
+        serializer = RecalculateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        weights = request_weights(data)
+
+        queryset = Site.objects.all()
+        if 'region' in data:
+            queryset = queryset.filter(region=data['region'])
+        if 'land_type' in data:
+            queryset = queryset.filter(land_type=data['land_type'])
+
+        summary = rescore_sites(queryset, weights, chunk_size=data['chunk_size'])
+        return Response(summary)
+
+    @action(detail=False, methods=['post'], url_path='what-if')
+    def what_if(self, request):
+        """Rank sites under several weight sets with the active scoring curves"""
+        serializer = WhatIfSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        model = get_scoring_model()
+        snapshot = get_snapshot()
+        if snapshot is not None:
+            mask = snapshot.mask(region=data.get('region'), land_type=data.get('land_type'), latest_only=True)
+            if 'site_ids' in data:
+                mask &= np.isin(snapshot.site_ids, data['site_ids'])
+            site_ids, matrix = snapshot.factor_matrix(mask, model)
+        else:
+            results = AnalysisResult.objects.latest_per_site()
+            if 'site_ids' in data:
+                results = results.filter(site_id__in=data['site_ids'])
+            if 'region' in data:
+                results = results.filter(site__region=data['region'])
+            if 'land_type' in data:
+                results = results.filter(site__land_type=data['land_type'])
+            site_ids, matrix = factor_matrix(results, model)
+
+        weight_sets = [request_weights(weights) for weights in data['weight_sets']]
+        return Response({
+            'total_sites': len(site_ids),
+            'fields': ['site_id', 'score'],
+            'rankings': rank_weight_sets(site_ids, matrix, weight_sets, data['limit'], factor_keys(model)),
+        })
+
+    @action(detail=False, methods=['post'])
+    def pareto(self, request):
+        """Sites no other site beats on every chosen factor score"""
+        serializer = ParetoSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        objectives = data['objectives']
+        fields = [OBJECTIVES[key] for key in objectives]
+        extra = [field for field in (OBJECTIVES['total'], AREA) if field not in fields]
+        site_ids, columns = population(fields + extra, **selection_filters(data))
+
+        front = np.flatnonzero(pareto_front(columns[:, :len(fields)]))
+        front = front[np.lexsort((site_ids[front], *(-columns[front, i] for i in reversed(range(len(fields))))))]
+        rows = front[:data['limit']]
+        return Response({
+            'total_sites': len(site_ids),
+            'objectives': objectives,
+            'front_size': len(front),
+            'fields': ['site_id', *fields, *extra],
+            'data': [[int(site_id), *values] for site_id, values in zip(site_ids[rows].tolist(), columns[rows].tolist())],
+        })
+
+    @action(detail=False, methods=['post'])
+    def portfolio(self, request):
+        """The sites with the best summed score whose area fits `area_budget`"""
+        serializer = PortfolioSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        field = OBJECTIVES[data['objective']]
+        site_ids, columns = population([field, AREA], **selection_filters(data))
+        values, areas = columns[:, 0], columns[:, 1]
+        chosen, upper_bound = budgeted_selection(values, areas, data['area_budget'])
+        chosen = chosen[np.lexsort((site_ids[chosen], -values[chosen]))]
+
+        total = round(float(values[chosen].sum()), 2)
+        return Response({
+            'total_sites': len(site_ids),
+            'objective': data['objective'],
+            'area_budget': data['area_budget'],
+            'selected': len(chosen),
+            'area_used': float(areas[chosen].sum()),
+            'objective_total': total,
+            'upper_bound': round(upper_bound, 2),
+            'gap': round(1 - total / upper_bound, 4) if upper_bound else 0.0,
+            'fields': ['site_id', field, 'area_sqm'],
+            'data': [
+                [site_id, value, int(area)]
+                for site_id, value, area in zip(site_ids[chosen].tolist(), values[chosen].tolist(), areas[chosen].tolist())
+            ],
+        })
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Queue long-running rescores, imports, exports and weight sensitivity
+    sweeps for the job worker (``manage.py run_jobs``) and follow their
+    progress.
+    """
+    queryset = Job.objects.order_by('-job_id')
+    serializer_class = JobSerializer
+    query_budgets = {'list': 2, 'retrieve': 1}
+
+    # Job kind -> serializer for its parameters
+    params_serializers = {
+        'rescore': RecalculateSerializer,
+        'import': ImportJobSerializer,
+        'export': ExportJobSerializer,
+        'sensitivity': SensitivityJobSerializer,
+    }
+
+    def create(self, request):
+        kind = request.data.get('kind')
+        if kind not in self.params_serializers:
+            return Response(
+                {'kind': [f'Choose one of: {", ".join(self.params_serializers)}.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        data = request.data.get('params')
+        serializer = self.params_serializers[kind](data=data if isinstance(data, dict) else request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        if kind == 'rescore':
+            params = {
+                'region': data.get('region'),
+                'land_type': data.get('land_type'),
+                'chunk_size': data['chunk_size'],
+                'weights': request_weights(data),
+            }
+        elif kind == 'import':
+            upload = data['file']
+            path = job_files_dir() / f'upload_{uuid.uuid4().hex}{Path(upload.name).suffix.lower()}'
+            with open(path, 'wb') as f:
+                for chunk in upload.chunks():
+                    f.write(chunk)
+            params = {
+                'path': str(path),
+                'filename': upload.name,
+                'chunk_size': data['chunk_size'],
+                'dry_run': data['dry_run'],
+            }
+        elif kind == 'sensitivity':
+            params = {key: value for key, value in data.items() if key not in WEIGHT_FIELDS.values()}
+            params['base_weights'] = request_weights(data)
+        else:
+            params = dict(data)
+
+        job = enqueue(kind, params)
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        return Response(self.get_serializer(cancel(self.get_object())).data)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """The file written by a finished export job, or a sensitivity sweep's per-site report"""
+        job = self.get_object()
+        if job.kind not in ('export', 'sensitivity') or job.status != 'succeeded':
+            raise Http404
+        if job.kind == 'sensitivity':
+            path = job_file(job, '.csv')
+            filename, content_type = f'solar_sensitivity_job_{job.job_id}.csv', 'text/csv'
+        else:
+            export_format = job.params['format']
+            extension = 'json' if export_format == 'ndjson' else export_format
+            path = job_file(job, f'.{export_format}')
+            filename, content_type = f'solar_sites_job_{job.job_id}.{extension}', CONTENT_TYPES[export_format]
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            # Cleaned up since the job finished
+            raise Http404
+        return FileResponse(file, as_attachment=True, filename=filename, content_type=content_type)
+
+    @action(detail=True, methods=['get'], url_path='rank-distribution')
+    def rank_distribution(self, request, pk=None):
+        """A site's rank histogram over a finished sensitivity sweep (?site_id=)"""
+        job = self.get_object()
+        if job.kind != 'sensitivity' or job.status != 'succeeded' or not job_file(job, '.npz').exists():
+            raise Http404
+        try:
+            site_id = int(request.query_params['site_id'])
+        except (KeyError, ValueError):
+            return Response({'site_id': ['A valid integer is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        bins = rank_distribution(job_file(job, '.npz'), site_id)
+        if bins is None:
+            raise Http404
+        return Response({'site_id': site_id, 'samples': job.result['samples'], 'bins': bins})
+
+
+class TileView(APIView):
+    """Clustered (low zoom) or per-site (high zoom) markers for one map tile"""
+
+    def get(self, request, z, x, y):
+        if z > MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+            raise Http404
+
+        etag = tile_etag(z, x, y)
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        return Response(get_tile(z, x, y, etag), headers=headers)
+
+
+
+class MetricsView(APIView):
+    """Per-view latency, query and render figures recorded by this worker"""
+
+    def get(self, request):
+        return Response(metrics_snapshot())
+
+
+class CacheStatsView(APIView):
+    """Response cache hits, misses and 304s served by this worker"""
+
+    def get(self, request):
+        return Response(cache_stats())
+
+
+@require_GET
+def export_sites(request):
+    """
+    Stream every site with its latest result as CSV, NDJSON or Parquet.
+
+    A plain Django view: DRF would treat ``?format=`` as a renderer
+    override. Accepts the region/land_type/min_score/max_score filters
+    of the analysis results endpoint.
+    """
+    params = request.GET
+    export_format = EXPORT_FORMATS.get(params.get('format', 'csv'))
+    if export_format is None:
+        return JsonResponse({'format': [f'Choose one of: {", ".join(EXPORT_FORMATS)}.']}, status=400)
+    if export_format == 'parquet' and not parquet_available():
+        return JsonResponse({'format': ['Parquet export requires pyarrow.']}, status=400)
+
+    scores = {}
+    for name in ('min_score', 'max_score'):
+        if name in params:
+            try:
+                scores[name] = Decimal(params[name])
+            except InvalidOperation:
+                return JsonResponse({name: ['A valid number is required.']}, status=400)
+
+    queryset = export_queryset(
+        region=params.get('site__region', params.get('region')),
+        land_type=params.get('site__land_type', params.get('land_type')),
+        **scores,
+    )
+    extension = 'json' if export_format == 'ndjson' else export_format
+    response = StreamingHttpResponse(
+        STREAMERS[export_format](iter_chunks(queryset)),
+        content_type=CONTENT_TYPES[export_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="solar_sites.{extension}"'
+    return response
@@ -0,0 +1,75 @@
+from django.core.cache import cache
+
+from .caching import bump_version, current_version
+from .utils import DEFAULT_WEIGHTS
+
+# Weight key -> AnalysisParameter.parameter_name
+WEIGHT_PARAMETERS = {
+    'solar': 'solar_irradiance_weight',
+    'area': 'area_weight',
+    'grid': 'grid_distance_weight',
+    'slope': 'slope_weight',
+    'infrastructure': 'infrastructure_weight'
+}
+
+EXTRA_WEIGHT_SUFFIX = '_weight'
+
+VERSION_KEY = 'sites:weights:version'
+WEIGHTS_TIMEOUT = 60 * 60 * 24
+
+# Per-process copy of the weights for the version it was loaded at
+_local = {'version': None, 'weights': None}
+
+
+def _cache_key(version):
+    return f'sites:weights:{version}'
+
+
+def _load_weights():
+    from .models import AnalysisParameter
+
+    values = dict(
+        AnalysisParameter.objects
+        .filter(parameter_name__endswith=EXTRA_WEIGHT_SUFFIX, is_active=True)
+        .values_list('parameter_name', 'weight_value')
+    )
+    if all(name in values for name in WEIGHT_PARAMETERS.values()):
+        weights = {key: float(values[name]) for key, name in WEIGHT_PARAMETERS.items()}
+    else:
+        weights = dict(DEFAULT_WEIGHTS)
+    # Weights of score factors added as ScoringCurve rows, e.g. elevation_weight
+    builtin = set(WEIGHT_PARAMETERS.values())
+    for name, value in values.items():
+        if name not in builtin:
+            weights[name.removesuffix(EXTRA_WEIGHT_SUFFIX)] = float(value)
+    return weights
+
+
+def get_default_weights():
+    """
+    Return the active default weights as a fresh dict.
+
+    The weights are read from AnalysisParameter in a single query and kept
+    both in this process and in Django's cache under a version token, so
+    repeated calls cost one cache lookup and no database queries. When any
+    of the five parameters is missing or inactive the built-in defaults
+    are used, as before. Any other active `<factor>_weight` parameter
+    weights the configured score curve of that factor.
+    """
+    version = current_version(VERSION_KEY)
+    if _local['version'] != version:
+        weights = cache.get(_cache_key(version))
+        if weights is None:
+            weights = _load_weights()
+            cache.set(_cache_key(version), weights, timeout=WEIGHTS_TIMEOUT)
+        _local['version'] = version
+        _local['weights'] = weights
+
+    return dict(_local['weights'])
+
+
+def invalidate_weights():
+    """Drop cached weights everywhere; called whenever a parameter changes"""
+    bump_version(VERSION_KEY)
+    _local['version'] = None
+    _local['weights'] = None
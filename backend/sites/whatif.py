@@ -0,0 +1,133 @@
+import numpy as np
+from django.db import connections
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from .curves import get_scoring_model
+from .models import AnalysisResult
+from .utils import SCORE_FIELDS, SuitabilityCalculator, round_scores
+
+# The built-in factors; factor_keys() gives those of a scoring model
+WEIGHT_KEYS = list(SCORE_FIELDS)
+
+
+def factor_keys(model):
+    """Keys of the model's score factors, the columns of its factor matrix"""
+    return [curve.key for curve in model.scores]
+
+
+def _fetch_rows(results, columns):
+    """Rows of (site_id, *columns) of `results`, sorted by site_id, straight from the cursor"""
+    query = results.order_by('site_id').values_list('site_id', *columns).query
+    sql, params = query.sql_with_params()
+    with connections[results.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def result_columns(results, fields):
+    """
+    (site_ids, matrix) of `fields` of `results`, rows x fields as floats,
+    sorted by site_id.
+
+    Values are cast to floats in the database and the rows are fetched
+    straight from the cursor, so nothing is built per row beyond the
+    driver's tuples.
+    """
+    rows = _fetch_rows(results, [Cast(field, FloatField()) for field in fields])
+    data = np.array(rows, dtype=np.float64).reshape(-1, len(fields) + 1)
+    return data[:, 0].astype(np.int64), data[:, 1:]
+
+
+def site_attributes(results, model):
+    """
+    (site_ids, field -> array) of the site attributes the model's curves
+    use, for each of `results`, sorted by site_id. Categorical attributes
+    stay object arrays.
+    """
+    numeric = [field for field in model.fields if field not in model.category_fields]
+    if len(numeric) == len(model.fields):
+        site_ids, matrix = result_columns(results, [f'site__{field}' for field in numeric])
+        return site_ids, dict(zip(numeric, matrix.T))
+
+    # Every column comes from one query, so a write between two reads
+    # can't pair one site's attributes with another's
+    categorical = [field for field in model.fields if field in model.category_fields]
+    rows = _fetch_rows(results, [Cast(f'site__{field}', FloatField()) for field in numeric]
+                       + [f'site__{field}' for field in categorical])
+    columns = list(zip(*rows)) or [()] * (len(model.fields) + 1)
+    arrays = {field: np.array(values, dtype=np.float64) for field, values in zip(numeric, columns[1:])}
+    for field, values in zip(categorical, columns[1 + len(numeric):]):
+        arrays[field] = np.array(values, dtype=object)
+    return np.array(columns[0], dtype=np.int64), arrays
+
+
+def factor_matrix(results=None, model=None):
+    """
+    Factor scores of the sites of `results` (each site's latest result by
+    default) under the active scoring model, computed from their
+    attributes so configured curves, multipliers and added factors all
+    count.
+
+    Returns (site_ids, matrix) where matrix is sites x factors in
+    factor_keys(model) order, sorted by site_id; see
+    SuitabilityCalculator.factor_matrix.
+    """
+    if model is None:
+        model = get_scoring_model()
+    if results is None:
+        results = AnalysisResult.objects.latest_per_site()
+    site_ids, arrays = site_attributes(results, model)
+    return site_ids, SuitabilityCalculator(model).factor_matrix(arrays)
+
+
+def weight_matrix(weight_sets, keys=WEIGHT_KEYS):
+    """Weight sets x factors, in `keys` order"""
+    return np.array(
+        [[float(weights.get(key, 0)) for key in keys] for weights in weight_sets],
+        dtype=np.float64,
+    ).reshape(-1, len(keys))
+
+
+def weighted_totals(matrix, weights):
+    """
+    Sites x weight-sets totals for a weight-sets x factors array: one
+    matrix product, clipped and rounded the way
+    SuitabilityCalculator.calculate_batch does it.
+    """
+    return round_scores(np.clip(matrix @ weights.T, 0.0, 100.0), 2)
+
+
+def what_if_totals(matrix, weight_sets, keys=WEIGHT_KEYS):
+    """Total scores of every site under every weight set, without saving"""
+    return weighted_totals(matrix, weight_matrix(weight_sets, keys))
+
+
+def top_ranked(site_ids, totals, limit):
+    """
+    Indexes of the `limit` best scores, best first, ties by site_id.
+
+    Only the candidates at or above the limit-th best score are sorted,
+    so ranking 100k sites for a short list stays linear.
+    """
+    if limit < len(totals):
+        threshold = np.partition(totals, len(totals) - limit)[len(totals) - limit]
+        candidates = np.flatnonzero(totals >= threshold)
+    else:
+        candidates = np.arange(len(totals))
+    order = np.lexsort((site_ids[candidates], -totals[candidates]))
+    return candidates[order[:limit]]
+
+
+def rank_weight_sets(site_ids, matrix, weight_sets, limit, keys=WEIGHT_KEYS):
+    """Ranked [site_id, score] rows for each weight set, `matrix` columns in `keys` order"""
+    totals = what_if_totals(matrix, weight_sets, keys)
+    rankings = []
+    for column, weights in enumerate(weight_sets):
+        scores = totals[:, column]
+        best = top_ranked(site_ids, scores, limit)
+        rankings.append({
+            'weights': weights,
+            'data': [[int(site_id), float(score)] for site_id, score in zip(site_ids[best], scores[best])],
+        })
+    return rankings
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "sites.middleware.PerformanceMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -142,4 +144,47 @@ REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
     "PAGE_SIZE": 20,
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"]
-}
\ No newline at end of file
+}
+# Cache for version tokens, weights, tiles and API responses. locmem is
+# private to each worker process, so deployments running several workers
+# should share a file or database cache (run `manage.py createcachetable`
+# for the latter) or point CACHE_BACKEND at memcached/redis; otherwise a
+# write in one worker leaves the others serving their stale copies.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+}
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS.get(CACHE_BACKEND, CACHE_BACKEND),
+        'LOCATION': os.getenv('CACHE_LOCATION', {
+            'file': str(BASE_DIR / 'cache'),
+            'db': 'django_cache',
+        }.get(CACHE_BACKEND, 'solar-analyzer')),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '5000'))},
+    }
+}
+
+# Serve repeated GETs of sites, results, top sites, statistics and
+# parameters from the cache, with ETags for conditional requests
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', '300'))
+
+# Server-Timing headers and the /api/metrics/ registry
+PERFORMANCE_METRICS_ENABLED = os.getenv('PERFORMANCE_METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Share of requests to run under cProfile, written to PROFILE_DIR
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', str(BASE_DIR / 'profiles'))
+# Fail requests to views that exceed their query_budgets instead of
+# only logging them; on by default under `manage.py test` or pytest only
+TESTING = (len(sys.argv) > 1 and sys.argv[1] == 'test') or 'pytest' in sys.modules
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', str(TESTING)).lower() in ('1', 'true', 'yes')
+
+# Keep a per-worker in-memory copy of sites and scores for read-heavy
+# endpoints (top sites, statistics, score-range listings, what-if)
+SITE_SNAPSHOT_ENABLED = os.getenv('SITE_SNAPSHOT_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+# Uploads for import jobs and files written by export jobs
+JOB_FILES_DIR = os.getenv('JOB_FILES_DIR', str(BASE_DIR / 'job_files'))
@@ -13,6 +13,8 @@ export interface Site {
   region: string
   created_at: string
   updated_at: string
+  current_result_id: number | null
+  current_score: number | null
 }
 
 export interface AnalysisResult {
@@ -30,6 +32,7 @@ export interface AnalysisResult {
   total_suitability_score: number
   analysis_timestamp: string
   parameters_snapshot: any
+  run: number | null
   land_type: string
   area_sqm: number
 }
@@ -64,4 +67,6 @@ export interface Statistics {
   avg_score: number
   min_score: number
   max_score: number
+  stddev_score: number
+  percentiles: Record<'p10' | 'p25' | 'p50' | 'p75' | 'p90', number>
 }